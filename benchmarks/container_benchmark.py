@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Benchmark loading and saving a synthetic sequence with the annotation
+containers.
+
+    python benchmarks/container_benchmark.py --frames 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sloth.annotations.container import AnnotationContainerFactory
+from sloth.conf import config
+
+
+def syntheticSequence(n_frames, n_boxes=3):
+    return [{'class': 'image',
+             'filename': '..\\cam0\\frame%06d.jpg' % i,
+             'annotations': [{'class': 'Vehicle', 'ID': i % 50 + k,
+                              'x': 10.5 + k, 'y': 20.25, 'width': 64, 'height': 48,
+                              'Occ': 0, 'IV': 0, 'FM': 0, 'SV': 0, 'CM': 0, 'scale': 'small'}
+                             for k in range(n_boxes)]}
+            for i in range(n_frames)]
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--boxes', type=int, default=3, help="annotations per frame")
+    parser.add_argument('--formats', default='json,msgpack',
+                        help="comma separated file extensions of the containers to compare")
+    args = parser.parse_args()
+
+    factory = AnnotationContainerFactory(config.CONTAINERS)
+    annotations = syntheticSequence(args.frames, args.boxes)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print("%d frames, %d annotations per frame" % (args.frames, args.boxes))
+        print("%-10s %10s %10s %12s %10s" % ("format", "save [s]", "load [s]", "1st frame [s]", "size [MB]"))
+        for ext in args.formats.split(','):
+            filename = os.path.join(tmpdir, 'bench.' + ext)
+            t_save, _ = timed(factory.create(filename).save, annotations, filename)
+            t_load, loaded = timed(factory.create(filename).load, filename)
+            assert loaded == annotations
+            t_first, _ = timed(lambda: next(factory.create(filename).iterate(filename)))
+            print("%-10s %10.2f %10.2f %12.4f %10.1f" % (ext, t_save, t_load, t_first,
+                                                          os.path.getsize(filename) / 1e6))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Benchmark the memory used by the annotation model per annotation (box),
+with all file and annotation items loaded.
+
+    python benchmarks/model_memory_benchmark.py --frames 20000 --boxes 5
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sloth.annotations.model import AnnotationModel
+from container_benchmark import syntheticSequence
+
+
+def countItems(item):
+    items, rows = 0, item.rowCount() - len(item.children())
+    for child in item.children():
+        items += 1
+        i, r = countItems(child)
+        items += i
+        rows += r
+    return items, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--boxes', type=int, default=5, help="annotations per frame")
+    args = parser.parse_args()
+
+    # every frame is decoded on its own, like frames read from different
+    # shards or files, so the keys are not shared between frames
+    encoded = [json.dumps(fi) for fi in syntheticSequence(args.frames, args.boxes)]
+    n_boxes = args.frames * args.boxes
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    model = AnnotationModel([json.loads(fi) for fi in encoded])
+    items, rows = countItems(model.root())
+    elapsed = time.time() - start
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%d frames, %d annotations per frame" % (args.frames, args.boxes))
+    print("%d model items, %d key/value rows, %.1f s" % (items, rows, elapsed))
+    print("%.1f MB, %d bytes per box" % (used / 1e6, used / n_boxes))
+    model.deleteLater()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Benchmark how the time to materialize all items of the annotation model
+scales with the number of frames.
+
+    python benchmarks/model_scaling_benchmark.py --frames 1000,10000,50000,200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sloth.annotations.model import AnnotationModel
+from container_benchmark import syntheticSequence
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', default='1000,10000,50000,200000',
+                        help="comma separated numbers of frames")
+    parser.add_argument('--boxes', type=int, default=3, help="annotations per frame")
+    args = parser.parse_args()
+
+    print("%d annotations per frame" % args.boxes)
+    print("%10s %10s %10s %14s %12s" % ("frames", "model [s]", "files [s]", "annotations [s]", "us/frame"))
+    for n_frames in [int(n) for n in args.frames.split(',')]:
+        annotations = syntheticSequence(n_frames, args.boxes)
+        t_model, model = timed(AnnotationModel, annotations)
+        # creates all file items, like numFiles() and the background loader
+        t_files, _ = timed(model.root().children)
+        # creates all annotation items
+        t_anns, n_anns = timed(model.root().numAnnotations)
+        assert n_anns == n_frames * args.boxes
+        total = t_model + t_files + t_anns
+        print("%10d %10.2f %10.2f %14.2f %12.1f" % (n_frames, t_model, t_files, t_anns, total * 1e6 / n_frames))
+        model.deleteLater()
+
+
+if __name__ == '__main__':
+    main()
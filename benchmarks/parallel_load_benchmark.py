@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Benchmark loading the annotation files of several camera views one after
+another against loading them in parallel worker processes (see
+AnnotationContainerFactory.loadAll() and LOAD_WORKERS), for different
+file sizes.
+
+    python benchmarks/parallel_load_benchmark.py --views 4 --frames 1000,20000,100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sloth.annotations.container import AnnotationContainerFactory
+from sloth.conf import config
+from container_benchmark import syntheticSequence, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--views', type=int, default=4)
+    parser.add_argument('--frames', default='1000,20000,100000',
+                        help="comma separated numbers of frames per view")
+    parser.add_argument('--boxes', type=int, default=3, help="annotations per frame")
+    parser.add_argument('--format', default='json', help="file extension of the container")
+    args = parser.parse_args()
+
+    factory = AnnotationContainerFactory(config.CONTAINERS)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print("%d views, %d annotations per frame, %d CPUs" % (args.views, args.boxes, os.cpu_count()))
+        print("%10s %10s %15s %13s %8s" % ("frames", "size [MB]", "sequential [s]", "parallel [s]", "speedup"))
+        for n_frames in [int(n) for n in args.frames.split(',')]:
+            annotations = syntheticSequence(n_frames, args.boxes)
+            filenames = [os.path.join(tmpdir, 'view%d_%d.%s' % (i, n_frames, args.format))
+                         for i in range(args.views)]
+            for filename in filenames:
+                factory.create(filename).save(annotations, filename)
+            t_seq, _ = timed(factory.loadAll, filenames, 1)
+            t_par, loaded = timed(factory.loadAll, filenames, args.views)
+            assert all(anns == annotations for _, anns in loaded)
+            size = sum(os.path.getsize(f) for f in filenames) / 1e6
+            print("%10d %10.1f %15.2f %13.2f %8.2f" % (n_frames, size, t_seq, t_par, t_seq / t_par))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
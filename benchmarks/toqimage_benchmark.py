@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Benchmark converting numpy images of different formats into QImages and
+QPixmaps.
+
+    python benchmarks/toqimage_benchmark.py --width 1920 --height 1200
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QPixmap
+
+from sloth.utils import toQImage, toQPixmap
+
+
+def someImages(width, height):
+    rgb = np.random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    return [
+        ('rgb', rgb),
+        ('rgba', np.random.randint(0, 256, (height, width, 4)).astype(np.uint8)),
+        ('gray', rgb[:, :, 0].copy()),
+        ('gray16', np.random.randint(0, 65536, (height, width)).astype(np.uint16)),
+        ('rgb16', np.random.randint(0, 65536, (height, width, 3)).astype(np.uint16)),
+        ('rgb strided', rgb[:, ::2]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    conversions = [
+        ('toQImage', lambda im: toQImage(im)),
+        ('toQImage copy', lambda im: toQImage(im, copy=True)),
+        ('QPixmap(QImage)', lambda im: QPixmap(toQImage(im))),
+        ('QPixmap(copy)', lambda im: QPixmap(toQImage(im, copy=True))),
+        ('toQPixmap', lambda im: toQPixmap(im)),
+    ]
+    print("%dx%d, milliseconds per image" % (args.width, args.height))
+    print("%-12s" % "format" + "".join("%18s" % name for name, _ in conversions))
+    for name, im in someImages(args.width, args.height):
+        times = [min(timeit.repeat(lambda: convert(im), number=1, repeat=args.repeat)) * 1000
+                 for _, convert in conversions]
+        print("%-12s" % name + "".join("%18.3f" % t for t in times))
+
+
+if __name__ == '__main__':
+    main()
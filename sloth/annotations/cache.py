@@ -0,0 +1,180 @@
+"""
+Sidecar cache of parsed annotation files.
+
+Parsing large annotation files (e.g. JSON) is expensive, while the files
+themselves rarely change between two sessions.  The ModelCache stores the
+parsed annotation list together with some derived statistics in Msgpack
+format in a cache directory, keyed by the path, modification time, size and
+content hash of the annotation file.
+"""
+import os
+import hashlib
+import logging
+import time
+import msgpack
+from sloth.core.utils import process_pool_executor
+
+LOG = logging.getLogger(__name__)
+
+
+def fileStatistics(annotations):
+    """
+    Compute the statistics stored along with the annotations in the cache.
+
+    Returns
+    =======
+    A dict with the number of files and annotations, the number of
+    annotations per file (frame), the list of [class, count] pairs and the
+    list of [class, ID, count] triples of the annotations.
+    """
+    boxes_per_frame = []
+    class_counts = {}
+    id_counts = {}
+    for item in annotations:
+        anns = list(item.get('annotations', []))
+        for frame in item.get('frames', []):
+            anns.extend(frame.get('annotations', []))
+        boxes_per_frame.append(len(anns))
+        for ann in anns:
+            label_class = ann.get('class')
+            class_counts[label_class] = class_counts.get(label_class, 0) + 1
+            try:
+                key = ann['class'], int(ann['ID'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            id_counts[key] = id_counts.get(key, 0) + 1
+    return {
+        'files': len(annotations),
+        'annotations': sum(boxes_per_frame),
+        'boxes_per_frame': boxes_per_frame,
+        'class_counts': [[label_class, count] for label_class, count in class_counts.items()],
+        'id_counts': [[label_class, idx, count] for (label_class, idx), count in id_counts.items()],
+    }
+
+
+def _rebuild(cache_dir, container, filename):
+    """
+    Parse the annotation file and store it in the cache in ``cache_dir``, in
+    a worker process.
+    """
+    cache = ModelCache(cache_dir)
+    key = cache.fileKey(filename)
+    annotations = container.parseFromFile(filename)
+    if cache.fileKey(filename) != key:
+        # modified while parsing, the next load will try again
+        return False
+    cache.store(filename, annotations, key)
+    return True
+
+
+class ModelCache:
+    """
+    Cache of parsed annotation files in ``cache_dir``.  Each annotation file
+    is cached in one file, which starts with the key of the annotation file
+    (path, modification time, size and content hash), followed by the
+    statistics (see fileStatistics()) and the annotations.
+    """
+
+    VERSION = 2
+
+    def __init__(self, cache_dir):
+        self._cache_dir = os.path.expanduser(cache_dir)
+        self._executor = None
+        self._pending = {}
+
+    def cacheFilename(self, filename):
+        name = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, name + '.msgpack')
+
+    def fileKey(self, filename):
+        """
+        Returns the key identifying the current contents of the annotation
+        file.
+        """
+        st = os.stat(filename)
+        return [os.path.abspath(filename), st.st_mtime_ns, st.st_size, self.contentHash(filename)]
+
+    def contentHash(self, filename):
+        h = hashlib.blake2b(digest_size=16)
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _header(self, filename):
+        st = os.stat(filename)
+        return [self.VERSION, os.path.abspath(filename), st.st_mtime_ns, st.st_size]
+
+    def load(self, filename):
+        """
+        Returns the cached (annotations, statistics) of the annotation file,
+        or None if the file is not cached or was modified since.
+        """
+        cache_file = self.cacheFilename(filename)
+        if not os.path.exists(cache_file):
+            return None
+        start = time.time()
+        try:
+            with open(cache_file, 'rb') as f:
+                unpacker = msgpack.Unpacker(f, raw=False, max_buffer_size=0)
+                key = unpacker.unpack()
+                # compare path, mtime and size first, the hash needs to read the file
+                if key[:4] != self._header(filename) or key[4] != self.contentHash(filename):
+                    return None
+                statistics = unpacker.unpack()
+                annotations = unpacker.unpack()
+        except Exception as e:
+            LOG.warning("Could not read cache file %s of %s (%s)" % (cache_file, filename, e))
+            return None
+        LOG.info("Loaded %s from cache in %.2fs" % (filename, time.time() - start))
+        return annotations, statistics
+
+    def store(self, filename, annotations, key=None):
+        """
+        Store the annotations of the annotation file in the cache.  ``key``
+        is the fileKey() of the file at the time the annotations were read.
+        """
+        if key is None:
+            key = self.fileKey(filename)
+        cache_file = self.cacheFilename(filename)
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        tmpname = "%s.%d.tmp" % (cache_file, os.getpid())
+        try:
+            packer = msgpack.Packer(use_bin_type=True)
+            with open(tmpname, 'wb') as f:
+                f.write(packer.pack([self.VERSION] + list(key)))
+                f.write(packer.pack(fileStatistics(annotations)))
+                f.write(packer.pack(annotations))
+            os.replace(tmpname, cache_file)
+        finally:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def rebuild(self, container, filename):
+        """
+        Parse the annotation file with the container and store it in the
+        cache in a background process.
+        """
+        future = self._pending.get(filename)
+        if future is not None and not future.done():
+            return
+        if self._executor is None:
+            self._executor = process_pool_executor(1)
+        try:
+            future = self._executor.submit(_rebuild, self._cache_dir, container, filename)
+        except Exception as e:
+            LOG.warning("Could not rebuild the cache of %s (%s)" % (filename, e))
+            self._executor = None
+            return
+        future.add_done_callback(lambda f: self._onRebuilt(filename, f))
+        self._pending[filename] = future
+
+    def _onRebuilt(self, filename, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            LOG.warning("Could not rebuild the cache of %s (%s)" % (filename, error))
+        else:
+            LOG.info("Rebuilt the cache of %s" % filename)
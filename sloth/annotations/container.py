@@ -1,10 +1,24 @@
 import os
+import bz2
 import fnmatch
+import gzip
+import io
+import lzma
+import mmap
+import queue
+import shutil
+import sqlite3
+import struct
+import threading
 import time
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 from sloth.core.exceptions import \
     ImproperlyConfigured, NotImplementedException, InvalidArgumentException
-from sloth.core.utils import import_callable
+from sloth.core.utils import import_callable, process_pool_executor, replace_file
+from sloth.annotations.imagecache import ImageCache
+from sloth.annotations.manifest import ImageManifest
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -21,6 +35,14 @@ try:
     import yaml
 except ImportError:
     pass
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 try:
     import okapy
     import okapy.videoio as okv
@@ -34,7 +56,286 @@ except ImportError:
     except:
         raise RuntimeError("Could neither find PIL nor okapy.  Sloth needs one of them for loading images.")
 import msgpack
-from sys import platform
+
+
+def _localpath(filename):
+    """
+    Convert the path separators in ``filename`` to the ones of the
+    current platform.
+    """
+    return filename.replace('\\', '/').replace('/', os.sep)
+
+
+class _ThreadedWriter(io.BufferedIOBase):
+    """
+    Binary file object which passes the written data on to ``fileobj`` in
+    a worker thread, so that compressing the data does not block the
+    thread serializing it.
+    """
+
+    def __init__(self, fileobj, max_pending=64):
+        io.BufferedIOBase.__init__(self)
+        self._fileobj = fileobj
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="ThreadedWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            if self._error is None:
+                try:
+                    self._fileobj.write(data)
+                except Exception as e:
+                    self._error = e
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        data = bytes(data)
+        self._queue.put(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._fileobj.close()
+        finally:
+            io.BufferedIOBase.close(self)
+        if self._error is not None:
+            raise self._error
+
+
+def _openGzip(filename, mode):
+    # the default level 9 is much slower for hardly smaller files
+    return gzip.open(filename, mode, compresslevel=6)
+
+
+def _openZstd(filename, mode):
+    if zstandard is None:
+        raise ImproperlyConfigured("The python module zstandard is needed for %s" % filename)
+    if 'r' in mode:
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb')))
+    return zstandard.ZstdCompressor().stream_writer(open(filename, 'wb'))
+
+
+def _openLz4(filename, mode):
+    if lz4 is None:
+        raise ImproperlyConfigured("The python module lz4 is needed for %s" % filename)
+    return lz4.frame.open(filename, mode)
+
+
+# Maps the extensions of compressed files to functions opening them in binary
+# mode ('rb' or 'wb')
+COMPRESSIONS = {
+    '.gz': _openGzip,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.zst': _openZstd,
+    '.lz4': _openLz4,
+}
+
+
+def _openFile(filename, mode="r"):
+    """
+    Open ``filename`` like open(), but transparently decompress/compress
+    files whose extension is in COMPRESSIONS.  Compressed files are
+    decoded as a stream, and compressed in a worker thread when written.
+    """
+    ext = os.path.splitext(filename)[1]
+    if ext not in COMPRESSIONS:
+        return open(filename, mode)
+    binary_mode = ('r' if 'r' in mode else 'w') + 'b'
+    f = COMPRESSIONS[ext](filename, binary_mode)
+    if 'w' in mode:
+        f = _ThreadedWriter(f)
+    if 'b' not in mode:
+        f = io.TextIOWrapper(f, encoding='utf-8')
+    return f
+
+
+def _iterJsonList(f, chunk_size=1 << 16):
+    """
+    Decode a JSON document consisting of a single top-level list from the
+    file object ``f`` and yield its elements one by one, reading the file in
+    chunks of ``chunk_size`` characters.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = 0
+    eof = False
+
+    def skip(buf, pos, chars):
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        return pos
+
+    # Find the opening bracket of the list
+    while True:
+        pos = skip(buf, pos, ' \t\r\n')
+        if pos < len(buf) or eof:
+            break
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError("Expected a JSON list in %s" % getattr(f, 'name', f))
+    pos += 1
+
+    while True:
+        pos = skip(buf, pos, ' \t\r\n,')
+        if pos < len(buf):
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # A value might have been decoded from a truncated record
+                # (e.g. "2." of "2.5"), so only accept it if it is followed
+                # by a list delimiter.
+                end = skip(buf, end, ' \t\r\n')
+                if end < len(buf) and buf[end] in ',]':
+                    yield item
+                    pos = end
+                    continue
+                if eof:
+                    raise ValueError("Invalid JSON list in %s" % getattr(f, 'name', f))
+            except ValueError:
+                if eof:
+                    raise
+        elif eof:
+            raise ValueError("Unexpected end of JSON list in %s" % getattr(f, 'name', f))
+
+        # Need more data: drop the consumed part of the buffer and read on
+        buf = buf[pos:]
+        pos = 0
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+
+
+def _childList(item):
+    """
+    Returns the list of child items (frames or annotations) of a file,
+    frame or annotation dict.
+    """
+    if 'frames' in item:
+        return item['frames']
+    return item.setdefault('annotations', [])
+
+
+def _replayEdits(annotations, edits):
+    """
+    Apply the edit records of an AnnotationModel journal (see
+    RootModelItem.startJournal()) to the list of annotation dicts.
+    """
+    for edit in edits:
+        item = None
+        for row in edit['path']:
+            children = annotations if item is None else _childList(item)
+            item = children[row]
+        op = edit['op']
+        if op == 'set':
+            item[edit['key']] = edit['value']
+        elif op == 'del':
+            item.pop(edit['key'], None)
+        else:
+            children = annotations if item is None else _childList(item)
+            if op == 'insert':
+                children.insert(edit['row'], edit['item'])
+            elif op == 'remove':
+                del children[edit['row']]
+            elif op == 'clear':
+                del children[:]
+            else:
+                raise ValueError("Unknown journal operation %s" % op)
+
+
+def _mmapNpz(filename):
+    """
+    Memory-map the arrays of an uncompressed .npz file (as written by
+    numpy.savez) and return them as dict of read-only arrays.  numpy.load
+    ignores mmap_mode for .npz files, so the location of each array is
+    looked up in the zip file directly.  Compressed members are read
+    normally.
+    """
+    arrays = {}
+    with zipfile.ZipFile(filename) as zf:
+        infos = zf.infolist()
+    with open(filename, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for info in infos:
+            name = info.filename
+            if name.endswith('.npy'):
+                name = name[:-4]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zipfile.ZipFile(filename) as zf, zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # skip the local file header, whose name/extra field lengths
+            # may differ from the ones in the central directory
+            name_len, extra_len = struct.unpack('<HH', buf[info.header_offset + 26:info.header_offset + 30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[name] = np.ndarray(shape, dtype, buffer=buf, offset=f.tell(),
+                                      order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _classCounts(items):
+    """
+    Returns the list of [class, count] pairs of the annotations of the file
+    items.
+    """
+    counts = {}
+    for item in items:
+        anns = list(item.get('annotations', []))
+        for frame in item.get('frames', []):
+            anns.extend(frame.get('annotations', []))
+        for ann in anns:
+            label_class = ann.get('class')
+            counts[label_class] = counts.get(label_class, 0) + 1
+    return [[label_class, count] for label_class, count in counts.items()]
+
+
+def _maxIDs(items):
+    """
+    Returns the maximum ID per annotation class of the annotations of the
+    file items.
+    """
+    max_ids = {}
+    for item in items:
+        anns = list(item.get('annotations', []))
+        for frame in item.get('frames', []):
+            anns.extend(frame.get('annotations', []))
+        for ann in anns:
+            try:
+                label_class, idx = ann['class'], int(ann['ID'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if idx > max_ids.get(label_class, idx - 1):
+                max_ids[label_class] = idx
+    return max_ids
+
+
+def _parseFromFile(container, filename):
+    """
+    Parse the annotation file in a worker process.
+    """
+    return container.parseFromFile(filename)
 
 
 class AnnotationContainerFactory:
@@ -72,16 +373,83 @@ class AnnotationContainerFactory:
         for pattern, container in self._containers:
             if fnmatch.fnmatch(filename, pattern):
                 return container(*args, **kwargs)
+        # compressed variant of a registered pattern, e.g. *.json.gz
+        base, ext = os.path.splitext(filename)
+        if ext in COMPRESSIONS:
+            for pattern, container in self._containers:
+                if fnmatch.fnmatch(base, pattern) and getattr(container, 'compressible', False):
+                    return container(*args, **kwargs)
         raise ImproperlyConfigured(
             "No container registered for filename %s" % filename
         )
 
+    def loadAll(self, filenames, max_workers=None):
+        """
+        Create a container for each of the filenames and load the
+        annotations from all of them.  The files are parsed in parallel
+        worker processes if ``max_workers`` is larger than 1.
+
+        Parameters
+        ==========
+        filenames: list of str
+            Filenames of the annotation files to load.
+        max_workers: int
+            Maximum number of worker processes, defaults to the number
+            of files.
+
+        Returns
+        =======
+        A list of (container, annotations) tuples in the order of filenames.
+        """
+        containers = [self.create(filename) for filename in filenames]
+        if max_workers is None:
+            max_workers = len(filenames)
+        max_workers = min(max_workers, len(filenames))
+
+        if max_workers > 1:
+            start = time.time()
+            try:
+                with process_pool_executor(max_workers) as executor:
+                    annotations = list(executor.map(_parseFromFile, containers, filenames))
+                for container, filename in zip(containers, filenames):
+                    container._filename = filename
+                LOG.info("Loaded %d annotation files in %.2fs using %d processes" %
+                         (len(filenames), time.time() - start, max_workers))
+                return list(zip(containers, annotations))
+            except (BrokenProcessPool, pickle.PicklingError) as e:
+                LOG.warning("Parallel loading failed (%s), loading files sequentially." % e)
+
+        return [(container, container.load(filename))
+                for container, filename in zip(containers, filenames)]
+
 
 class AnnotationContainer:
     """
     Annotation Container base class.
     """
 
+    # Whether the container can save the edits of a model with
+    # appendEdits() instead of rewriting the whole file
+    journaled = False
+
+    # Whether the container can save single file items with saveRows()
+    # instead of rewriting the whole file
+    partial = False
+
+    # Whether the container reads and writes its files with _openFile(), so
+    # that compressed variants (e.g. *.json.gz) can be used
+    compressible = False
+
+    # Whether the parsed annotations can be cached by the ModelCache, i.e.
+    # parseFromFile() only depends on the contents of the file
+    cacheable = False
+
+    # Decoded images, shared by all containers
+    image_cache = ImageCache()
+
+    # The image files of the current sequence, see LabelTool.loadAnnotations()
+    image_manifest = ImageManifest()
+
     def __init__(self):
         self.clear()
 
@@ -89,6 +457,10 @@ class AnnotationContainer:
         """The current filename."""
         return self._filename
 
+    def setFilename(self, filename):
+        """Set the current filename, e.g. if the annotations were loaded from a cache."""
+        self._filename = filename
+
     def clear(self):
         # TODO Why isn't this used? Annotations are passed as parameters instead. Let's have encapsulation.
         self._annotations = []
@@ -109,6 +481,25 @@ class AnnotationContainer:
         print('=== Loaded the fucking annotations from %s in %.2fs' % (filename, diff))
         return ann
 
+    def iterate(self, filename):
+        """
+        Load the annotations lazily.  Returns an iterator that yields one
+        file item after the other, so that the first item is available as
+        soon as its own record has been read.
+        """
+        if not filename:
+            raise InvalidArgumentException("filename cannot be empty")
+        self._filename = filename
+        return self.iterFromFile(filename)
+
+    def iterFromFile(self, filename):
+        """
+        Read the annotations from disk item by item.  The default
+        implementation parses the whole file with parseFromFile(); containers
+        which can decode their format incrementally should overwrite this.
+        """
+        return iter(self.parseFromFile(filename))
+
     def parseFromFile(self, filename):
         """
         Read the annotations from disk. Must be implemented in the subclass.
@@ -121,11 +512,34 @@ class AnnotationContainer:
 
     def save(self, annotations, filename=""):
         """
-        Save the annotations.
+        Save the annotations.  The annotations are written to a temporary
+        file first, which then replaces the target file.  Thus the target
+        is never left half-written, even if the application crashes.
+
+        On Windows the target cannot be replaced while it is still open or
+        memory-mapped, e.g. by an unfinished iterate() of NpzContainer.
+        Such handles need to be closed before saving; the replacement is
+        retried for a moment (see replace_file()) before saving fails with
+        PermissionError.
         """
         if not filename:
             filename = self.filename()
-        self.serializeToFile(filename, annotations)
+        # keep the extension(s), serializeToFile() might depend on them
+        tmpname = os.path.join(os.path.dirname(filename),
+                               ".tmp%d-%s" % (os.getpid(), os.path.basename(filename)))
+        try:
+            self.serializeToFile(tmpname, annotations)
+            fd = os.open(tmpname, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            if os.path.exists(filename):
+                shutil.copymode(filename, tmpname)
+            replace_file(tmpname, filename)
+        finally:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
         self._filename = filename
 
     def serializeToFile(self, filename, annotations):
@@ -144,6 +558,7 @@ class AnnotationContainer:
         the filename is given relative to the label file's
         directory.
         """
+        filename = _localpath(filename)
         if self.filename() is not None:
             basedir = os.path.dirname(self.filename())
             fullpath = os.path.join(basedir, filename)
@@ -151,22 +566,107 @@ class AnnotationContainer:
             fullpath = filename
         return fullpath
 
-    def loadImage(self, filename):
+    def _fileExists(self, fullpath):
+        # the manifest of the sequence saves a stat per frame
+        exists = self.image_manifest.exists(os.path.abspath(fullpath))
+        if exists is None:
+            exists = os.path.exists(fullpath)
+        return exists
+
+    def _imagePath(self, filename):
+        # the key of the image in the image cache
+        return os.path.abspath(self._fullpath(filename))
+
+    def isImageCached(self, filename, reduce=1):
+        """
+        Whether loadImage() would return the image from the image cache.
+        """
+        fullpath = self._imagePath(filename)
+        return fullpath in self.image_cache or (fullpath, reduce) in self.image_cache
+
+    def canDraft(self, filename):
+        """
+        Whether loadImage() decodes the image at a reduced resolution much
+        faster than at full resolution, i.e. whether the image is a JPEG.
+        """
+        return _use_pil and os.path.splitext(filename)[1].lower() in ('.jpg', '.jpeg')
+
+    def prefetchImage(self, filename, reduce=1):
+        """
+        Load the image into the image cache, unless it is cached already.
+        Returns True if the image was loaded.
+        """
+        if self.isImageCached(filename, reduce):
+            return False
+        return self.loadImage(filename, reduce) is not None
+
+    def loadImage(self, filename, reduce=1):
         """
         Load and return the image referenced to by the filename.  In the
         default implementation this will try to load the image from a path
         relative to the label file's directory.
+
+        If ``reduce`` is a power of two larger than 1, the image may be
+        returned at a resolution reduced by up to this factor, e.g. for
+        display.  Only JPEG images are reduced (see canDraft()), as they
+        are decoded at the reduced resolution, which is much faster.  Other
+        images would be decoded at full resolution first, so they are
+        returned (and cached) at full resolution.  The full resolution of
+        the image can be looked up with imageSize().
+
+        Decoded images are kept in the shared ``image_cache``, so the
+        returned array is read-only.
         """
-        fullpath = self._fullpath(filename)
-        if not os.path.exists(fullpath):
+        fullpath = self._imagePath(filename)
+        # the full resolution image is as good as a reduced one
+        key = fullpath
+        if reduce > 1 and fullpath not in self.image_cache:
+            key = (fullpath, reduce)
+        image = self.image_cache.get(key)
+        if image is not None:
+            return image
+        if not self._fileExists(fullpath):
             LOG.warn("Image file %s does not exist." % fullpath)
             return None
 
         if _use_pil:
-            im = Image.open(fullpath)
-            return np.asarray(im)
+            with Image.open(fullpath) as im:
+                size = im.size
+                if reduce > 1:
+                    # does nothing unless the image is a JPEG
+                    im.draft(im.mode, (size[0] // reduce, size[1] // reduce))
+                image = np.asarray(im)
+        else:
+            image = okapy.loadImage(fullpath)
+            size = image.shape[1], image.shape[0]
+        if image.shape[1] == size[0]:
+            key = fullpath
         else:
-            return okapy.loadImage(fullpath)
+            key = (fullpath, reduce)
+        self.image_cache.setImageSize(fullpath, size)
+        self.image_cache.put(key, image)
+        return image
+
+    def imageSize(self, filename):
+        """
+        Returns the full resolution (width, height) of the image referenced
+        to by the filename, or None if the image file does not exist.
+        """
+        fullpath = self._imagePath(filename)
+        size = self.image_cache.imageSize(fullpath) or self.image_manifest.imageSize(fullpath)
+        if size is not None:
+            return size
+        if not self._fileExists(fullpath):
+            return None
+        if _use_pil:
+            # only reads the header
+            with Image.open(fullpath) as im:
+                size = im.size
+        else:
+            image = self.loadImage(filename)
+            size = image.shape[1], image.shape[0]
+        self.image_cache.setImageSize(fullpath, size)
+        return size
 
     def loadFrame(self, filename, frame_number):
         """
@@ -175,7 +675,7 @@ class AnnotationContainer:
         the video from a path relative to the label files directory.
         """
         fullpath = str(self._fullpath(filename))
-        if not os.path.exists(fullpath) and not os.path.exists(fullpath.split('%')[0]):
+        if not self._fileExists(fullpath) and not self._fileExists(fullpath.split('%')[0]):
             LOG.warn("Video file %s does not exist." % fullpath)
             return None
 
@@ -200,19 +700,22 @@ class PickleContainer(AnnotationContainer):
     Simple container which pickles the annotations to disk.
     """
 
+    compressible = True
+    cacheable = True
+
     def parseFromFile(self, fname):
         """
         Overwritten to read pickle files.
         """
-        f = open(fname, "rb")
+        f = _openFile(fname, "rb")
         return pickle.load(f)
 
     def serializeToFile(self, fname, annotations):
         """
         Overwritten to write pickle files.
         """
-        f = open(fname, "wb")
-        pickle.dump(annotations, f)
+        with _openFile(fname, "wb") as f:
+            pickle.dump(annotations, f)
 
 
 class OkapiAnnotationContainer(AnnotationContainer):
@@ -307,50 +810,780 @@ class JsonContainer(AnnotationContainer):
     Simple container which writes the annotations to disk in JSON format.
     """
 
+    compressible = True
+    cacheable = True
+
     def parseFromFile(self, fname):
-        f = open(fname, "r")
-        f = json.load(f)
-        # make sure that windows path be save load
-        if platform == 'linux' or platform == 'darwin':
-            print('=== You are under Linux system or masOS.')
-            for ann_per_frame in f:
-                ann_per_frame['filename'] = ann_per_frame['filename'].replace('\\', '/')
-        elif platform.lower().startswith('win'):
-            print('=== You are under Windows system.')
-            for ann_per_frame in f:
-                ann_per_frame['filename'] = ann_per_frame['filename'].replace('/', '\\')
-        return f
+        """
+        Overwritten to read JSON files.
+        """
+        with _openFile(fname, "r") as f:
+            return json.load(f)
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to decode the top-level JSON list incrementally.
+        """
+        with _openFile(fname, "r") as f:
+            for item in _iterJsonList(f):
+                yield item
 
     def serializeToFile(self, fname, annotations):
         """
         Overwritten to write JSON files.
         """
-        f = open(fname, "w")
-        json.dump(annotations, f, indent=4, separators=(',', ': '), sort_keys=True)
-        f.write("\n")
+        with _openFile(fname, "w") as f:
+            if not isinstance(annotations, list) or not annotations:
+                f.write(json.dumps(annotations, indent=4, separators=(',', ': '), sort_keys=True))
+                f.write("\n")
+                return
+            # Write one file item after the other, so that a compressing
+            # writer can work on the previous items in the meantime.  The
+            # output is the same as for the whole list.
+            for i, item in enumerate(annotations):
+                f.write(",\n    " if i else "[\n    ")
+                f.write(json.dumps(item, indent=4, separators=(',', ': '), sort_keys=True).replace("\n", "\n    "))
+            f.write("\n]\n")
+
+
+class CompactJsonContainer(JsonContainer):
+    """
+    JSON container which writes the annotations without indentation and
+    key sorting.  The files are considerably smaller and faster to write,
+    but less readable.
+    """
+
+    def serializeToFile(self, fname, annotations):
+        """
+        Overwritten to write compact JSON files.
+        """
+        with _openFile(fname, "w") as f:
+            if not isinstance(annotations, list):
+                f.write(json.dumps(annotations, separators=(',', ':')))
+                f.write("\n")
+                return
+            f.write("[")
+            for i, item in enumerate(annotations):
+                if i:
+                    f.write(",")
+                f.write(json.dumps(item, separators=(',', ':')))
+            f.write("]\n")
+
+
+class JsonJournalContainer(JsonContainer):
+    """
+    JSON container which saves the edits made since the last full save to an
+    append-only journal next to the annotation file (``<filename>.journal``,
+    one JSON record per line).  Saving a few edits is therefore independent
+    of the size of the annotation file.  The journal is replayed on load
+    and merged into the annotation file once it gets too long.
+    """
+
+    journaled = True
+    cacheable = False
+
+    # Number of journal records after which the journal is merged into the
+    # annotation file
+    COMPACT_THRESHOLD = 10000
+
+    def __init__(self):
+        JsonContainer.__init__(self)
+        self._journal_count = 0
+
+    def journalFilename(self, fname):
+        return fname + ".journal"
+
+    def _baseStamp(self, fname):
+        st = os.stat(fname)
+        return [st.st_size, st.st_mtime_ns]
+
+    def readJournal(self, fname):
+        """
+        Returns the edit records of the journal of ``fname``.  A journal
+        which does not belong to the current annotation file (e.g. because
+        the file was replaced after the journal was written) is moved aside.
+        """
+        jname = self.journalFilename(fname)
+        if not os.path.exists(jname):
+            return []
+
+        edits = []
+        with open(jname, "r") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('base') != self._baseStamp(fname):
+                LOG.warning("Journal %s does not match %s, ignoring it." % (jname, fname))
+                f.close()
+                os.replace(jname, jname + ".stale")
+                return []
+            for lineno, line in enumerate(f, 2):
+                try:
+                    edits.append(json.loads(line))
+                except ValueError:
+                    # only the last record can be incomplete after a crash
+                    LOG.warning("Ignoring incomplete journal record in %s:%d" % (jname, lineno))
+                    break
+        return edits
+
+    def parseFromFile(self, fname):
+        """
+        Overwritten to replay the journal.
+        """
+        annotations = JsonContainer.parseFromFile(self, fname)
+        edits = self.readJournal(fname)
+        _replayEdits(annotations, edits)
+        self._journal_count = len(edits)
+        return annotations
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to replay the journal.  The file is only decoded
+        incrementally if the journal is empty.
+        """
+        if os.path.exists(self.journalFilename(fname)):
+            return iter(self.parseFromFile(fname))
+        self._journal_count = 0
+        return JsonContainer.iterFromFile(self, fname)
+
+    def appendEdits(self, edits, filename=""):
+        """
+        Append the edit records of an AnnotationModel journal to the journal
+        file.  The journal is compacted if it exceeds COMPACT_THRESHOLD
+        records.
+        """
+        if not filename:
+            filename = self.filename()
+        jname = self.journalFilename(filename)
+        with open(jname, "a") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({'base': self._baseStamp(filename)}) + "\n")
+            for edit in edits:
+                f.write(json.dumps(edit, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._filename = filename
+        self._journal_count += len(edits)
+        if self._journal_count > self.COMPACT_THRESHOLD:
+            self.compact(filename)
+
+    def compact(self, filename=""):
+        """
+        Merge the journal into the annotation file.
+        """
+        if not filename:
+            filename = self.filename()
+        start = time.time()
+        self.save(self.parseFromFile(filename), filename)
+        LOG.info("Compacted journal of %s in %.2fs" % (filename, time.time() - start))
+
+    def save(self, annotations, filename=""):
+        """
+        Overwritten to remove the journal once the annotations were saved.
+        """
+        if not filename:
+            filename = self.filename()
+        JsonContainer.save(self, annotations, filename)
+        jname = self.journalFilename(filename)
+        if os.path.exists(jname):
+            os.remove(jname)
+        self._journal_count = 0
+
+
+class NpzContainer(AnnotationContainer):
+    """
+    Container which stores the annotations column-wise in an uncompressed
+    NumPy .npz file: one array per annotation key (ID, x, y, width, ...)
+    holding the values of all annotations, and an offsets index which
+    tells which annotations belong to which frame.  The file is
+    memory-mapped when opened, so that frames are only decoded when they
+    are fetched by the model.
+
+    Values which are neither numbers, booleans nor strings (and file items
+    whose annotations are not a list of dicts) are stored as JSON, so that
+    any annotations written by JsonContainer can be stored.
+    """
+
+    VERSION = 1
+
+    # Number of frames decoded at once
+    BLOCK_SIZE = 256
+
+    # kinds of the values in a column
+    MISSING, INT, FLOAT, BOOL, STRING = range(5)
+
+    def parseFromFile(self, fname):
+        """
+        Overwritten to read .npz files.
+        """
+        return list(self.iterFromFile(fname))
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to decode the frames from the memory-mapped file one
+        after another.  The file stays mapped until the iterator is
+        exhausted or closed, which is required before the file can be
+        replaced on Windows (see AnnotationContainer.save()).
+        """
+        arrays = _mmapNpz(fname)
+        header = json.loads(arrays['header'].tobytes().decode('utf-8'))
+        if header.get('version') != self.VERSION:
+            raise ValueError("Unsupported npz annotation file version in %s" % fname)
+        strings = header['strings']
+        decoders = {self.INT: int, self.FLOAT: float, self.BOOL: bool,
+                    self.STRING: lambda v: strings[int(v)]}
+        columns = [(key, arrays['value_%d' % i], arrays['kind_%d' % i])
+                   for i, key in enumerate(header['columns'])]
+        frame_offsets = arrays['frame_offsets']
+        frame_data = arrays['frame_data']
+        frame_data_offsets = arrays['frame_data_offsets']
+        frame_flags = arrays['frame_flags']
+        extra_data = arrays['extra_data']
+        extra_offsets = arrays['extra_offsets']
+
+        # decode blocks of frames at once, slicing the arrays for each
+        # frame separately is considerably slower
+        n_frames = len(frame_flags)
+        for first in range(0, n_frames, self.BLOCK_SIZE):
+            last = min(first + self.BLOCK_SIZE, n_frames)
+            offsets = frame_data_offsets[first:last + 1].tolist()
+            data = frame_data[offsets[0]:offsets[-1]].tobytes()
+            items = json.loads(b'[' + b','.join(data[a - offsets[0]:b - offsets[0]]
+                                                for a, b in zip(offsets[:-1], offsets[1:])) + b']')
+
+            ann_offsets = frame_offsets[first:last + 1].tolist()
+            a, b = ann_offsets[0], ann_offsets[-1]
+            annotations = [{} for _ in range(b - a)]
+            for key, values, kinds in columns:
+                for ann, kind, value in zip(annotations, kinds[a:b].tolist(), values[a:b].tolist()):
+                    if kind:
+                        ann[key] = decoders[kind](value)
+            offsets = extra_offsets[a:b + 1].tolist()
+            if offsets[0] != offsets[-1]:
+                for ann, start, end in zip(annotations, offsets[:-1], offsets[1:]):
+                    if start != end:
+                        ann.update(json.loads(extra_data[start:end].tobytes().decode('utf-8')))
+
+            for item, flag, start, end in zip(items, frame_flags[first:last].tolist(),
+                                              ann_offsets[:-1], ann_offsets[1:]):
+                if flag:
+                    item['annotations'] = annotations[start - a:end - a]
+                yield item
+
+    def _encodeValue(self, value, strings):
+        if isinstance(value, bool):
+            return self.BOOL, float(value)
+        if isinstance(value, int):
+            # only integers which survive the conversion to float64
+            if abs(value) <= 2 ** 53:
+                return self.INT, float(value)
+        elif isinstance(value, float):
+            return self.FLOAT, value
+        elif isinstance(value, str):
+            return self.STRING, float(strings.setdefault(value, len(strings)))
+        return self.MISSING, None
+
+    def serializeToFile(self, fname, annotations):
+        """
+        Overwritten to write .npz files.
+        """
+        strings = {}
+        columns = {}
+        frame_offsets = [0]
+        frame_data = []
+        frame_flags = []
+        extras = []
+
+        n = 0
+        for item in annotations:
+            anns = item.get('annotations') if isinstance(item, dict) else None
+            columnar = isinstance(anns, list) and all(isinstance(ann, dict) for ann in anns)
+            if columnar:
+                item = dict(item)
+                del item['annotations']
+                for ann in anns:
+                    extra = {}
+                    for key, value in ann.items():
+                        kind, encoded = self._encodeValue(value, strings)
+                        if kind == self.MISSING:
+                            extra[key] = value
+                        else:
+                            rows, values, kinds = columns.setdefault(key, ([], [], []))
+                            rows.append(n)
+                            values.append(encoded)
+                            kinds.append(kind)
+                    extras.append(json.dumps(extra, separators=(',', ':')).encode('utf-8') if extra else b'')
+                    n += 1
+            frame_offsets.append(n)
+            frame_data.append(json.dumps(item, separators=(',', ':')).encode('utf-8'))
+            frame_flags.append(columnar)
+
+        def blob(chunks):
+            offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+            np.cumsum([len(c) for c in chunks], out=offsets[1:])
+            return np.frombuffer(b''.join(chunks), dtype=np.uint8), offsets
+
+        string_list = sorted(strings, key=strings.get)
+        header = {'version': self.VERSION, 'columns': list(columns), 'strings': string_list}
+        arrays = {
+            'header': np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8),
+            'frame_offsets': np.array(frame_offsets, dtype=np.int64),
+            'frame_flags': np.array(frame_flags, dtype=np.uint8),
+        }
+        arrays['frame_data'], arrays['frame_data_offsets'] = blob(frame_data)
+        arrays['extra_data'], arrays['extra_offsets'] = blob(extras)
+        for i, (rows, values, kinds) in enumerate(columns.values()):
+            arrays['value_%d' % i] = np.zeros(n, dtype=np.float64)
+            arrays['value_%d' % i][rows] = values
+            arrays['kind_%d' % i] = np.zeros(n, dtype=np.uint8)
+            arrays['kind_%d' % i][rows] = kinds
+
+        # write to a file object, numpy.savez would append .npz to the name
+        with open(fname, "wb") as f:
+            np.savez(f, **arrays)
+
+
+class SqliteContainer(AnnotationContainer):
+    """
+    Container which stores the annotations in a SQLite database with one
+    row per file item (frame) and one row per annotation (box).  The class
+    and ID of the annotations are stored in indexed columns, so that max-ID
+    queries and ID renames do not need to read the annotations.  Frames are
+    read from the database in batches as the model fetches them, and saving
+    only writes the rows of modified frames (see saveRows()).
+    """
+
+    partial = True
+
+    # Number of frames read at once
+    BATCH_SIZE = 256
+
+    SCHEMA = """
+        CREATE TABLE frames (
+            frame INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            has_annotations INTEGER NOT NULL
+        );
+        CREATE TABLE boxes (
+            frame INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            class TEXT,
+            ID INTEGER,
+            data TEXT NOT NULL
+        );
+    """
+    INDEXES = """
+        CREATE UNIQUE INDEX boxes_frame ON boxes (frame, position);
+        CREATE INDEX boxes_class_id ON boxes (class, ID);
+        CREATE INDEX boxes_id ON boxes (ID, frame);
+    """
+
+    def _connect(self, fname):
+        # sqlite3.connect would silently create a missing database
+        if not os.path.exists(fname):
+            raise IOError("No such file: %s" % fname)
+        return sqlite3.connect(fname, check_same_thread=False)
+
+    def _encodeItem(self, frame, item):
+        """
+        Split a file item into its frame row and box rows.
+        """
+        anns = item.get('annotations') if isinstance(item, dict) else None
+        if not isinstance(anns, list) or not all(isinstance(ann, dict) for ann in anns):
+            return (frame, json.dumps(item, sort_keys=True), 0), []
+        data = dict(item)
+        del data['annotations']
+        boxes = []
+        for position, ann in enumerate(anns):
+            ann = dict(ann)
+            label_class = ann.pop('class') if isinstance(ann.get('class'), str) else None
+            ann_id = ann.get('ID')
+            if isinstance(ann_id, int) and not isinstance(ann_id, bool) and -2 ** 63 <= ann_id < 2 ** 63:
+                del ann['ID']
+            else:
+                ann_id = None
+            boxes.append((frame, position, label_class, ann_id, json.dumps(ann, sort_keys=True)))
+        return (frame, json.dumps(data, sort_keys=True), 1), boxes
+
+    def parseFromFile(self, fname):
+        """
+        Overwritten to read SQLite files.
+        """
+        return list(self.iterFromFile(fname))
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to read the frames batch by batch.  No transaction is
+        kept open between the batches, so that the file can be saved
+        while it is read.
+        """
+        conn = self._connect(fname)
+        try:
+            first = 0
+            while True:
+                frames = conn.execute("SELECT frame, data, has_annotations FROM frames "
+                                      "WHERE frame >= ? ORDER BY frame LIMIT ?",
+                                      (first, self.BATCH_SIZE)).fetchall()
+                if not frames:
+                    return
+                last = frames[-1][0]
+                boxes = {}
+                for frame, label_class, ann_id, data in conn.execute(
+                        "SELECT frame, class, ID, data FROM boxes WHERE frame BETWEEN ? AND ? "
+                        "ORDER BY frame, position", (first, last)):
+                    ann = json.loads(data)
+                    if label_class is not None:
+                        ann['class'] = label_class
+                    if ann_id is not None:
+                        ann['ID'] = ann_id
+                    boxes.setdefault(frame, []).append(ann)
+
+                for frame, data, has_annotations in frames:
+                    item = json.loads(data)
+                    if has_annotations:
+                        item['annotations'] = boxes.get(frame, [])
+                    yield item
+                first = last + 1
+        finally:
+            conn.close()
+
+    def serializeToFile(self, fname, annotations):
+        """
+        Overwritten to write SQLite files.
+        """
+        if os.path.exists(fname):
+            os.remove(fname)
+        conn = sqlite3.connect(fname)
+        try:
+            with conn:
+                conn.executescript(self.SCHEMA)
+                for frame, item in enumerate(annotations):
+                    frame_row, boxes = self._encodeItem(frame, item)
+                    conn.execute("INSERT INTO frames VALUES (?, ?, ?)", frame_row)
+                    conn.executemany("INSERT INTO boxes VALUES (?, ?, ?, ?, ?)", boxes)
+                # creating the indexes afterwards is faster
+                conn.executescript(self.INDEXES)
+        finally:
+            conn.close()
+
+    def saveRows(self, rows, filename=""):
+        """
+        Save single file items into an existing file.  Only the rows of
+        frames and boxes which differ from the ones in the file are written.
+
+        Parameters
+        ==========
+        rows: dict
+            Maps the row (frame number) of the file items to the file
+            items.
+        """
+        if not filename:
+            filename = self.filename()
+        conn = self._connect(filename)
+        try:
+            with conn:
+                for frame, item in sorted(rows.items()):
+                    frame_row, boxes = self._encodeItem(frame, item)
+                    cursor = conn.execute("UPDATE frames SET data = ?, has_annotations = ? WHERE frame = ? "
+                                          "AND (data != ? OR has_annotations != ?)",
+                                          (frame_row[1], frame_row[2], frame, frame_row[1], frame_row[2]))
+                    if cursor.rowcount == 0 and conn.execute("SELECT 1 FROM frames WHERE frame = ?",
+                                                             (frame,)).fetchone() is None:
+                        raise InvalidArgumentException("Frame %d does not exist in %s" % (frame, filename))
+
+                    old = conn.execute("SELECT frame, position, class, ID, data FROM boxes "
+                                       "WHERE frame = ? ORDER BY position", (frame,)).fetchall()
+                    for new_box, old_box in zip(boxes, old):
+                        if new_box != old_box:
+                            conn.execute("UPDATE boxes SET class = ?, ID = ?, data = ? "
+                                         "WHERE frame = ? AND position = ?", new_box[2:] + new_box[:2])
+                    conn.executemany("INSERT INTO boxes VALUES (?, ?, ?, ?, ?)", boxes[len(old):])
+                    conn.execute("DELETE FROM boxes WHERE frame = ? AND position >= ?", (frame, len(boxes)))
+        finally:
+            conn.close()
+        self._filename = filename
+
+    def maxID(self, label_class, first_frame=0, filename=""):
+        """
+        Returns the maximum ID of the annotations of class ``label_class`` in
+        the frames starting at ``first_frame`` stored in the file, or 0.
+        """
+        conn = self._connect(filename or self.filename())
+        try:
+            max_id, = conn.execute("SELECT MAX(ID) FROM boxes WHERE class = ? AND frame >= ?",
+                                   (label_class, first_frame)).fetchone()
+        finally:
+            conn.close()
+        return max_id or 0
+
+    def renameID(self, id_orig, id_new, first_frame=0, last_frame=None, filename=""):
+        """
+        Change the ID ``id_orig`` of all annotations in the frames from
+        ``first_frame`` up to (excluding) ``last_frame`` to ``id_new``
+        directly in the file.  Returns the number of changed annotations.
+        """
+        if last_frame is None:
+            last_frame = 2 ** 63 - 1
+        conn = self._connect(filename or self.filename())
+        try:
+            with conn:
+                cursor = conn.execute("UPDATE boxes SET ID = ? WHERE ID = ? AND frame >= ? AND frame < ?",
+                                      (id_new, id_orig, first_frame, last_frame))
+        finally:
+            conn.close()
+        return cursor.rowcount
+
+
+class ShardedSource:
+    """
+    Random access to the file items of a sharded annotation file.  The
+    shards are only read when they are needed, see RootModelItem.
+    """
+
+    def __init__(self, container, filename, manifest):
+        self._container = container
+        self._basedir = os.path.dirname(filename)
+        self._manifest = manifest
+
+    def __len__(self):
+        return self._manifest['frames']
+
+    def __iter__(self):
+        for k in range(self.numShards()):
+            for item in self.loadShard(k):
+                yield item
+
+    def shardSize(self):
+        return self._manifest['shard_size']
+
+    def numShards(self):
+        return len(self._manifest['shards'])
+
+    def maxIDs(self, k):
+        """Returns the maximum ID per class in shard ``k`` without reading it."""
+        return self._manifest['shards'][k]['max_ids']
+
+    def classCounts(self, k):
+        """
+        Returns a dict mapping the label classes to their number of
+        annotations in shard ``k`` without reading it, or None if the
+        manifest does not record them.
+        """
+        counts = self._manifest['shards'][k].get('class_counts')
+        if counts is None:
+            return None
+        return dict((label_class, count) for label_class, count in counts)
+
+    def loadShard(self, k):
+        shard = self._manifest['shards'][k]
+        return self._container.loadShard(os.path.join(self._basedir, shard['file']))
+
+
+class ShardedJsonContainer(AnnotationContainer):
+    """
+    Container which splits the annotations into shards of SHARD_SIZE file
+    items (one labeling stamp), each stored as JSON file in the directory
+    ``<filename>.d``.  The file itself is a small JSON manifest listing the
+    shards.  Opening a file only reads the manifest; the shards are read
+    when their frames are accessed, and saving only rewrites the shards
+    containing modified frames (see saveRows()).
+    """
+
+    partial = True
+
+    VERSION = 1
+    SHARD_SIZE = 400
+    SHARD_EXTENSION = '.json'
+
+    def __init__(self):
+        AnnotationContainer.__init__(self)
+        self._shard_container = JsonContainer()
+
+    def shardFilename(self, fname, k):
+        """Returns the shard filename relative to the manifest."""
+        return os.path.join(os.path.basename(fname) + '.d', 'shard-%05d%s' % (k, self.SHARD_EXTENSION))
+
+    def loadShard(self, fname):
+        return self._shard_container.parseFromFile(fname)
+
+    def readManifest(self, fname):
+        with _openFile(fname, "r") as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or manifest.get('version') != self.VERSION:
+            raise ValueError("%s is not a sharded annotation file" % fname)
+        return manifest
+
+    def _writeShard(self, fname, manifest, k, items):
+        relname = self.shardFilename(fname, k)
+        shard_file = os.path.join(os.path.dirname(fname), relname)
+        if not os.path.isdir(os.path.dirname(shard_file)):
+            os.makedirs(os.path.dirname(shard_file))
+        self._shard_container.save(items, shard_file)
+        shard = {'file': relname.replace(os.sep, '/'), 'frames': len(items), 'max_ids': _maxIDs(items),
+                 'class_counts': _classCounts(items)}
+        if k < len(manifest['shards']):
+            manifest['shards'][k] = shard
+        else:
+            manifest['shards'].append(shard)
+
+    def _writeManifest(self, fname, manifest):
+        manifest['frames'] = sum(shard['frames'] for shard in manifest['shards'])
+        JsonContainer().save(manifest, fname)
+
+    def parseFromFile(self, fname):
+        """
+        Overwritten to read all shards.
+        """
+        return list(self.iterFromFile(fname))
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to return a ShardedSource, which reads the shards on
+        demand.
+        """
+        return ShardedSource(self, fname, self.readManifest(fname))
+
+    def save(self, annotations, filename=""):
+        """
+        Overwritten to write all shards and the manifest.  Each shard and
+        the manifest are replaced atomically.
+        """
+        if not filename:
+            filename = self.filename()
+        try:
+            old_shards = self.readManifest(filename)['shards']
+        except (IOError, OSError, ValueError):
+            old_shards = []
+        manifest = {'version': self.VERSION, 'shard_size': self.SHARD_SIZE, 'shards': []}
+        for k, first in enumerate(range(0, len(annotations), self.SHARD_SIZE)):
+            self._writeShard(filename, manifest, k, annotations[first:first + self.SHARD_SIZE])
+        self._writeManifest(filename, manifest)
+        # remove the shards which are not referenced anymore
+        basedir = os.path.dirname(filename)
+        for shard in old_shards[len(manifest['shards']):]:
+            if os.path.exists(os.path.join(basedir, shard['file'])):
+                os.remove(os.path.join(basedir, shard['file']))
+        self._filename = filename
+
+    def _updateShards(self, changes, filename, func):
+        """
+        Call ``func(items, first_frame)`` for the file items of each shard
+        in ``changes`` and rewrite these shards.
+        """
+        manifest = self.readManifest(filename)
+        basedir = os.path.dirname(filename)
+        modified = False
+        for k in sorted(changes):
+            if not 0 <= k < len(manifest['shards']):
+                raise InvalidArgumentException("Shard %d does not exist in %s" % (k, filename))
+            items = self.loadShard(os.path.join(basedir, manifest['shards'][k]['file']))
+            if func(items, k * manifest['shard_size']):
+                self._writeShard(filename, manifest, k, items)
+                modified = True
+        if modified:
+            self._writeManifest(filename, manifest)
+
+    def saveRows(self, rows, filename=""):
+        """
+        Save single file items into an existing file.  Only the shards
+        containing the file items are rewritten.
+
+        Parameters
+        ==========
+        rows: dict
+            Maps the row (frame number) of the file items to the file
+            items.
+        """
+        if not filename:
+            filename = self.filename()
+        shard_size = self.readManifest(filename)['shard_size']
+        changes = {}
+        for row in rows:
+            changes.setdefault(row // shard_size, []).append(row)
+
+        def replace(items, first):
+            for row in changes[first // shard_size]:
+                if not row - first < len(items):
+                    raise InvalidArgumentException("Frame %d does not exist in %s" % (row, filename))
+                items[row - first] = rows[row]
+            return True
+
+        self._updateShards(changes, filename, replace)
+        self._filename = filename
+
+    def renameID(self, id_orig, id_new, first_frame=0, last_frame=None, filename=""):
+        """
+        Change the ID ``id_orig`` of all annotations in the frames from
+        ``first_frame`` up to (excluding) ``last_frame`` to ``id_new``
+        directly in the file.  Only the affected shards are rewritten.
+        Returns the number of changed annotations.
+        """
+        filename = filename or self.filename()
+        manifest = self.readManifest(filename)
+        if last_frame is None:
+            last_frame = manifest['frames']
+        shard_size = manifest['shard_size']
+        changed = [0]
+
+        def rename(items, first):
+            n = changed[0]
+            for row in range(max(first, first_frame), min(first + len(items), last_frame)):
+                for ann in items[row - first].get('annotations', []):
+                    if ann.get('ID') == id_orig:
+                        ann['ID'] = id_new
+                        changed[0] += 1
+            return changed[0] > n
+
+        # shards whose max IDs show that they cannot contain the ID are skipped
+        shards = [k for k in range(first_frame // shard_size, (max(last_frame, 1) - 1) // shard_size + 1)
+                  if k < len(manifest['shards']) and
+                  any(max_id >= id_orig for max_id in manifest['shards'][k]['max_ids'].values())]
+        self._updateShards(shards, filename, rename)
+        return changed[0]
 
 
 class MsgpackContainer(AnnotationContainer):
     """
-    Simple container which writes the annotations to disk in Msgpack format.
+    Container which writes the annotations to disk in Msgpack format.  The
+    file items are packed and unpacked one at a time, so that large files
+    can be read incrementally and written without packing the whole
+    annotation list in memory.
     """
 
+    compressible = True
+    cacheable = True
+
     def parseFromFile(self, fname):
         """
         Overwritten to read Msgpack files.
         """
-        import msgpack
-        f = open(fname, "r")
-        return msgpack.load(f)
+        return list(self.iterFromFile(fname))
+
+    def iterFromFile(self, fname):
+        """
+        Overwritten to unpack the file items of the top-level array one by
+        one.
+        """
+        with _openFile(fname, "rb") as f:
+            unpacker = msgpack.Unpacker(f, raw=False)
+            try:
+                n = unpacker.read_array_header()
+            except (ValueError, msgpack.OutOfData):
+                raise ValueError("Expected a Msgpack array in %s" % fname)
+            for i in range(n):
+                yield unpacker.unpack()
 
     def serializeToFile(self, fname, annotations):
         """
         Overwritten to write Msgpack files.
         """
         # TODO make all image filenames relative to the label file
-        import msgpack
-        f = open(fname, "w")
-        msgpack.dump(annotations, f)
+        packer = msgpack.Packer(use_bin_type=True)
+        with _openFile(fname, "wb") as f:
+            f.write(packer.pack_array_header(len(annotations)))
+            for item in annotations:
+                f.write(packer.pack(item))
 
 
 class YamlContainer(AnnotationContainer):
@@ -358,19 +1591,22 @@ class YamlContainer(AnnotationContainer):
     Simple container which writes the annotations to disk in YAML format.
     """
 
+    compressible = True
+    cacheable = True
+
     def parseFromFile(self, fname):
         """
         Overwritten to read YAML files.
         """
-        f = open(fname, "r")
+        f = _openFile(fname, "r")
         return yaml.load(f)
 
     def serializeToFile(self, fname, annotations):
         """
         Overwritten to write YAML files.
         """
-        f = open(fname, "w")
-        yaml.dump(annotations, f)
+        with _openFile(fname, "w") as f:
+            yaml.dump(annotations, f)
 
 
 class FileNameListContainer(AnnotationContainer):
@@ -0,0 +1,180 @@
+"""
+In-memory cache of decoded images.
+
+Decoding a camera frame is much more expensive than drawing it, and when
+labeling, the same few frames are shown over and over again (e.g. when
+stepping back and forth between two frames).  The ImageCache keeps the most
+recently used decoded images up to a memory budget, and the ImagePrefetcher
+decodes the images which will be needed next in the background.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """
+    Thread-safe LRU cache of decoded images (numpy arrays), keyed by the full
+    path of the image file (or the path and the reduction factor for images
+    decoded at a reduced resolution).  The least recently used images are
+    evicted when the total size of the cached images exceeds the budget.
+
+    The cached arrays are shared between all users of the cache, so they are
+    made read-only when they are put into the cache.
+    """
+
+    def __init__(self, budget_mb=512):
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._sizes = {}
+        self._nbytes = 0
+        self._budget = 0
+        self.hits = 0
+        self.misses = 0
+        self.setBudget(budget_mb)
+
+    def budget(self):
+        """The memory budget in bytes."""
+        return self._budget
+
+    def setBudget(self, budget_mb):
+        """
+        Set the memory budget in MB, evicting images if the cache is too
+        large for the new budget.  A budget of 0 disables the cache.
+        """
+        with self._lock:
+            self._budget = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    def get(self, key):
+        """Returns the cached image of ``key``, or None."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """
+        Put the image into the cache.  Images larger than the whole budget
+        are not cached.
+        """
+        if image is None or image.nbytes > self._budget:
+            return
+        image.setflags(write=False)
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            self._images[key] = image
+            self._nbytes += image.nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._nbytes > self._budget:
+            _, image = self._images.popitem(last=False)
+            self._nbytes -= image.nbytes
+
+    def imageSize(self, path):
+        """
+        Returns the full resolution (width, height) of the image file, if it
+        is known, or None.  Unlike the images, the sizes are never evicted.
+        """
+        return self._sizes.get(path)
+
+    def setImageSize(self, path, size):
+        self._sizes[path] = tuple(size)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._images
+
+    def __len__(self):
+        return len(self._images)
+
+    def nbytes(self):
+        """The total size of the cached images in bytes."""
+        return self._nbytes
+
+    def clear(self):
+        """Remove all images and reset the hit and miss counters."""
+        with self._lock:
+            self._images.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def statistics(self):
+        """
+        Returns a dict with the number of hits and misses, the number of
+        cached images, their size and the budget in bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'images': len(self._images),
+                    'bytes': self._nbytes, 'budget': self._budget}
+
+
+class ImagePrefetcher:
+    """
+    Decodes images into the image cache in a pool of worker threads (the
+    decoders release the GIL), so that they are cached when they are shown.
+    Submitting new work cancels the work that was submitted before and has
+    not started yet.
+    """
+
+    def __init__(self, workers=2):
+        self._workers = workers
+        self._executor = None
+        self._futures = []
+        self._generation = 0
+
+    def prefetch(self, jobs):
+        """
+        Cancel the pending work and prefetch the images of ``jobs``, a list
+        of (container, filename, reduce) tuples in the order in which the
+        images will be needed (see AnnotationContainer.loadImage()).
+        """
+        self.cancel()
+        if not jobs:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="prefetch")
+        generation = self._generation
+        self._futures = [self._executor.submit(self._prefetch, generation, container, filename, reduce)
+                         for container, filename, reduce in jobs]
+
+    def _prefetch(self, generation, container, filename, reduce):
+        # skip work that became stale while it was queued
+        if generation != self._generation:
+            return False
+        try:
+            return container.prefetchImage(filename, reduce)
+        except Exception as e:
+            LOG.warning("Could not prefetch image %s (%s)" % (filename, e))
+            return False
+
+    def cancel(self):
+        """Cancel the work which has not started yet."""
+        self._generation += 1
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+
+    def wait(self):
+        """Wait for the submitted work to finish, e.g. in tests."""
+        for future in list(self._futures):
+            if not future.cancelled():
+                future.result()
+
+    def shutdown(self):
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
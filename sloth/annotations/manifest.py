@@ -0,0 +1,130 @@
+"""
+Manifest of the image files of a sequence.
+
+Checking whether an image file exists before loading it costs a stat,
+which is a network round trip on network file systems.  The ImageManifest
+is built once when a sequence is opened, with one directory scan per
+camera folder, and answers these questions for all frames afterwards.
+"""
+import json
+import os
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+def sequenceImages(seqinfo_filename):
+    """
+    Returns the first frame number and a list of (camera folder, image
+    filenames) tuples of the sequence described by the seqinfo.json file.
+    """
+    with open(seqinfo_filename, 'r') as f:
+        seqinfo = json.load(f)
+    seq_dir = os.path.dirname(os.path.abspath(seqinfo_filename))
+    start_frame = int(seqinfo['start_frame'])
+    end_frame = int(seqinfo['end_frame'])
+    cameras = []
+    for img_dir in seqinfo['img_dir'].split(','):
+        image_dir = os.path.join(seq_dir, img_dir)
+        cameras.append((image_dir, [os.path.join(image_dir, seqinfo['img_format'] % f_id)
+                                    for f_id in range(start_frame, end_frame + 1)]))
+    return start_frame, cameras
+
+
+def _imageHeaderSize(filename):
+    try:
+        from PIL import Image
+        with Image.open(filename) as im:
+            return im.size
+    except (ImportError, IOError, OSError):
+        return None
+
+
+class ImageManifest:
+    """
+    The files of scanned image folders, and the dimensions of the images
+    in them.  Paths in folders which were not
+    scanned are unknown to the manifest, so callers fall back to the file
+    system for them.  All paths are absolute.
+    """
+
+    def __init__(self):
+        self._dirs = {}
+        self._dimensions = {}
+
+    def scanDirectory(self, image_dir):
+        """
+        List the files in ``image_dir`` with one directory scan.  Returns
+        the set of the names of the files, or None if the folder could not
+        be scanned.  The folder is not recorded then,
+        so that its files stay unknown instead of being reported missing.
+        """
+        image_dir = os.path.abspath(image_dir)
+        files = set()
+        try:
+            for entry in os.scandir(image_dir):
+                # the file type is part of the listing on most file systems,
+                # so this needs no stat per file
+                if entry.is_file():
+                    files.add(entry.name)
+        except OSError as e:
+            LOG.warning("Could not scan image folder %s (%s)" % (image_dir, e))
+            return None
+        self._dirs[image_dir] = files
+        return files
+
+    def setDimensions(self, image_dir, size):
+        """Set the (width, height) of the images in ``image_dir``."""
+        self._dimensions[os.path.abspath(image_dir)] = tuple(size)
+
+    @classmethod
+    def fromSequence(cls, seqinfo_filename, n_cameras=None):
+        """
+        Build the manifest of the camera folders of the sequence described
+        by the seqinfo.json file.  The dimensions of the images of a camera
+        are read from the header of its first image, assuming that all
+        images of a camera have the same dimensions.
+
+        Returns
+        =======
+        The manifest and the list of the image files of the sequence which
+        do not exist.  Files in folders which could not be scanned are not
+        listed.
+        """
+        manifest = cls()
+        missing = []
+        _, cameras = sequenceImages(seqinfo_filename)
+        for image_dir, image_files in cameras[:n_cameras]:
+            # the image format may contain folders
+            image_dirs = sorted(set(os.path.dirname(f) for f in image_files))
+            for d in image_dirs:
+                manifest.scanDirectory(d)
+            existing = [f for f in image_files if manifest.exists(f)]
+            missing.extend(f for f in image_files if manifest.exists(f) is False)
+            size = _imageHeaderSize(existing[0]) if existing else None
+            if size is not None:
+                for d in image_dirs:
+                    manifest.setDimensions(d, size)
+        return manifest, missing
+
+    def exists(self, path):
+        """
+        Whether the file exists, or None if its folder was not scanned.
+        """
+        image_dir, name = os.path.split(path)
+        files = self._dirs.get(image_dir)
+        if files is None:
+            return None
+        return name in files
+
+    def imageSize(self, path):
+        """
+        The (width, height) of the image, or None if it is not known.
+        """
+        if not self.exists(path):
+            return None
+        return self._dimensions.get(os.path.dirname(path))
+
+    def clear(self):
+        self._dirs.clear()
+        self._dimensions.clear()
@@ -2,10 +2,15 @@
 The annotationmodel module contains the classes for the AnnotationModel.
 """
 import os.path
+import sys
 import time
 import logging
 import copy
-from collections import MutableMapping
+import itertools
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QCheckBox
 from PyQt5.Qt import *
@@ -20,12 +25,31 @@ LOG = logging.getLogger(__name__)
 ItemRole, DataRole, ImageRole = [Qt.UserRole + ur + 1 for ur in range(3)]
 
 
+def _internKey(key):
+    # the same few keys are used by millions of annotations
+    return sys.intern(key) if type(key) is str else key
+
+
 class ModelItem:
+    """
+    Node of the annotation tree.  The rows of an item are its key/value
+    rows (see KeyValueModelItem), which are not stored, followed by its
+    child items in ``_children``.  The ``_row`` of a child item is its
+    position in ``_children``, row() its row in the model.  Inserting and
+    deleting child items only marks the ``_row`` of the following items as
+    out of date, they are renumbered when a row is looked up.
+    """
+    # Items without further attributes are created per annotation and
+    # per key/value row, so they do without an instance dict
+    __slots__ = ('_loaded', '_model', '_parent', '_row', '_children', '_stale')
+
     def __init__(self):
         self._loaded = True
         self._model = None
         self._parent = None
         self._row = -1
+        # position of the first child item whose _row may be out of date
+        self._stale = None
         if not hasattr(self, "_children"):
             self._children = []
 
@@ -55,10 +79,24 @@ class ModelItem:
         return self.childAt(row).hasChildren()
 
     def row(self):
-        return self._row
+        parent = self._parent
+        if parent is None:
+            return self._row
+        row = parent._childIndex(self)
+        if row is None:
+            # deleted items keep their parent
+            row = self._row
+        return parent._keyRowCount() + row
+
+    def _keyRowCount(self):
+        """The number of key/value rows in front of the child items."""
+        return 0
+
+    def _keyRowAt(self, row):
+        raise IndexError("key/value row out of range")
 
     def rowCount(self):
-        return len(self._children)
+        return self._keyRowCount() + len(self._children)
 
     def childRowCount(self, pos):
         return self.childAt(pos).rowCount()
@@ -98,14 +136,20 @@ class ModelItem:
         return False
 
     def childAt(self, pos):
-        self._ensureLoaded(pos)
-        return self._children[pos]
+        n_keys = self._keyRowCount()
+        if 0 <= pos < n_keys:
+            return self._keyRowAt(pos)
+        return self._childAt(pos - n_keys)
+
+    def _childAt(self, index):
+        self._ensureLoaded(index)
+        return self._children[index]
 
     def getPreviousSibling(self, step=1):
-        return self.getSibling(self._row - step)
+        return self.getSibling(self.row() - step)
 
     def getNextSibling(self, step=1):
-        return self.getSibling(self._row + step)
+        return self.getSibling(self.row() + step)
 
     def getSibling(self, row):
         if self._parent is not None:
@@ -115,6 +159,41 @@ class ModelItem:
                 pass
         return None
 
+    def _statistics(self):
+        if self._model is None:
+            return None
+        return self._model.root().statistics()
+
+    def _dataPath(self):
+        """
+        Returns the position of this item in the saved annotations as list
+        of indices, starting at the root, or None if the item is not part
+        of a model (anymore).
+        """
+        path = []
+        item = self
+        while item._parent is not None:
+            parent = item._parent
+            row = parent._childIndex(item)
+            if row is None:
+                return None
+            path.append(row)
+            item = parent
+        if not isinstance(item, RootModelItem):
+            return None
+        path.reverse()
+        return path
+
+    def _recordEdit(self, edit):
+        if self._model is None:
+            return
+        journal = self._model.root().journal()
+        if journal is not None:
+            path = self._dataPath()
+            if path is not None:
+                edit['path'] = path
+                journal.append(edit)
+
     def _attachToModel(self, model):
         # assert self.model() is None
         # assert self.parent() is not None
@@ -130,7 +209,7 @@ class ModelItem:
             return QModelIndex()
         if column >= self._model.columnCount():
             return QModelIndex()
-        return self._model.createIndex(self._row, column, self._parent)
+        return self._model.createIndex(self.row(), column, self._parent)
 
     def addChildSorted(self, item, signalModel=True):
         self.insertChild(-1, item, signalModel=signalModel)
@@ -145,45 +224,64 @@ class ModelItem:
         if self._model is not None:
             self._children[pos]._attachToModel(self._model)
 
-    def insertChild(self, pos, item, signalModel=True):
-        if pos >= 0:
-            next_row = pos
-        else:
-            next_row = len(self._children)
-        if self._model is not None and signalModel:
-            self._model.beginInsertRows(self.index(), next_row, next_row)
-
-        item._parent = self
-        item._row = next_row
-        self._children.insert(next_row, item)
-
-        if pos >= 0:
-            for i, c in enumerate(self._children):
-                c._row = i
+    def _markStale(self, pos):
+        # the child items from pos on may have moved
+        if self._stale is None or pos < self._stale:
+            self._stale = pos
+
+    def _renumber(self):
+        children = self._children
+        for i in range(self._stale, len(children)):
+            child = children[i]
+            if isinstance(child, ModelItem):
+                child._row = i
+        self._stale = None
+
+    def _childIndex(self, item):
+        """
+        Returns the position of the child item in the child items, or None
+        if it is not a child (anymore).
+        """
+        if self._stale is not None and item._row >= self._stale:
+            self._renumber()
+        row = item._row
+        if 0 <= row < len(self._children) and self._children[row] is item:
+            return row
+        return None
 
-        if self._model is not None:
-            item._attachToModel(self._model)
-            if signalModel:
-                self._model.endInsertRows()
+    def insertChild(self, pos, item, signalModel=True):
+        self.insertChildren(pos, [item], signalModel)
 
     def appendChildren(self, items, signalModel=True):
-        # for item in items:
-        # assert isinstance(item, ModelItem)
-        # assert item.model() is None
-        # assert item.parent() is None
-
-        next_row = len(self._children)
+        self.insertChildren(-1, items, signalModel)
+
+    def insertChildren(self, pos, items, signalModel=True):
+        """
+        Insert the items in front of the child item at ``pos``, or append
+        them if ``pos`` is negative, with a single row insert signal.
+        """
+        if not items:
+            return
+        if pos < 0 or pos > len(self._children):
+            pos = len(self._children)
         if self._model is not None and signalModel:
-            self._model.beginInsertRows(self.index(), next_row, next_row + len(items) - 1)
+            first = self._keyRowCount() + pos
+            self._model.beginInsertRows(self.index(), first, first + len(items) - 1)
 
+        if pos < len(self._children):
+            self._markStale(pos)
         for i, item in enumerate(items):
             item._parent = self
-            item._row = next_row + i
-            self._children.append(item)
+            item._row = pos + i
+        self._children[pos:pos] = items
 
         if self._model is not None:
+            statistics = self._statistics()
             for item in items:
                 item._attachToModel(self._model)
+                statistics.addItem(item)
+                if hasattr(item, 'snapshot'):
+                    self._recordEdit({'op': 'insert', 'row': item._row, 'item': item.snapshot()})
             if signalModel:
                 self._model.endInsertRows()
 
@@ -194,22 +292,51 @@ class ModelItem:
             self._parent.deleteChild(self)
 
     def deleteChild(self, arg):
-        # Grandchildren are considered deleted automatically
-        if isinstance(arg, ModelItem):
-            return self.deleteChild(self._children.index(arg))
-        else:
-            if arg < 0 or arg >= len(self._children):
-                raise IndexError("child index out of range")
-            self._ensureLoaded(arg)
+        """
+        Delete the child item, given as item or as position in the child
+        items.  Grandchildren are considered deleted automatically.
+        """
+        self.deleteChildren([arg])
+
+    def deleteChildren(self, args):
+        """
+        Delete the child items, given as items or as positions in the child
+        items, with one row remove signal per contiguous range of rows.
+        """
+        positions = set()
+        for arg in args:
+            if isinstance(arg, ModelItem):
+                pos = self._childIndex(arg)
+                if pos is None:
+                    raise ValueError("item is not a child of this item")
+            else:
+                pos = arg
+                if pos < 0 or pos >= len(self._children):
+                    raise IndexError("child index out of range")
+            positions.add(pos)
+
+        ranges = []
+        for pos in sorted(positions):
+            if ranges and ranges[-1][1] == pos - 1:
+                ranges[-1][1] = pos
+            else:
+                ranges.append([pos, pos])
 
+        # from the last range on, so that the positions of the others stay valid
+        n_keys = self._keyRowCount()
+        for first, last in reversed(ranges):
+            for pos in range(first, last + 1):
+                self._ensureLoaded(pos)
             if self._model is not None:
-                self._model.beginRemoveRows(self.index(), arg, arg)
+                statistics = self._statistics()
+                for pos in range(last, first - 1, -1):
+                    statistics.removeItem(self._children[pos])
+                    self._recordEdit({'op': 'remove', 'row': pos})
+                self._model.beginRemoveRows(self.index(), n_keys + first, n_keys + last)
 
-            del self._children[arg]
-
-            # Update cached row numbers
-            for i, c in enumerate(self._children):
-                c._row = i
+            del self._children[first:last + 1]
+            if first < len(self._children):
+                self._markStale(first)
 
             if self._model is not None:
                 self._model.endRemoveRows()
@@ -217,9 +344,15 @@ class ModelItem:
     def deleteAllChildren(self):
         self._ensureAllLoaded()
         if self._model is not None:
-            self._model.beginRemoveRows(self.index(), 0, len(self._children) - 1)
+            statistics = self._statistics()
+            for child in self._children:
+                statistics.removeItem(child)
+            self._recordEdit({'op': 'clear'})
+            first = self._keyRowCount()
+            self._model.beginRemoveRows(self.index(), first, first + len(self._children) - 1)
 
         self._children = []
+        self._stale = None
 
         if self._model is not None:
             self._model.endRemoveRows()
@@ -229,38 +362,62 @@ class ModelItem:
 
 
 class KeyValueModelItem(ModelItem, MutableMapping):
+    """
+    Model item with properties.  Each property which is not hidden is shown
+    as key/value row, sorted by key.  The rows are not stored but computed
+    from the properties when they are accessed, as they are only needed if
+    the item is expanded in a view.
+    """
+    __slots__ = ('_dict', '_hidden')
+
+    # Keys which are not shown as key/value rows
+    HIDDEN = frozenset({None, 'class', 'unlabeled', 'unconfirmed'})
+    # The hidden key sets, shared by all items with the same hidden keys
+    _hidden_sets = {}
+
     def __init__(self, hidden=None, properties=None):
         ModelItem.__init__(self)
         self._dict = {}
-        self._items = {}
-        self._hidden = set(hidden or [])
-        self._hidden.update({None, 'class', 'unlabeled', 'unconfirmed'})
+        self._hidden = self._hiddenKeys(hidden)
 
         # dummy key/value so that pyqt does not convert the dict
         # into a QVariantMap while communicating with the Views
         self._dict[None] = None
         if properties is not None:
-            self._dict.update(properties)
-            items_to_add = []
-            for key in self._dict.keys():
-                if key not in self._hidden:
-                    item = KeyValueRowModelItem(key)
-                    self._items[key] = item
-                    items_to_add.append(item)
-            items_to_add.sort(key=lambda x: x.key())
-            self.appendChildren(items_to_add, False)
+            self._dict.update((_internKey(key), value) for key, value in properties.items())
 
-    def addChildSorted(self, item, signalModel=True):
-        if isinstance(item, KeyValueRowModelItem):
-            next_row = 0
-            for child in self._children:
-                if not isinstance(child, KeyValueRowModelItem) or child.key() > item.key():
-                    break
-                next_row += 1
+    @classmethod
+    def _hiddenKeys(cls, hidden):
+        if not hidden:
+            return cls.HIDDEN
+        hidden = frozenset(hidden)
+        keys = cls._hidden_sets.get(hidden)
+        if keys is None:
+            keys = cls._hidden_sets[hidden] = cls.HIDDEN | hidden
+        return keys
+
+    def _rowKeys(self):
+        """The keys shown as key/value rows, in the order of the rows."""
+        return sorted(key for key in self._dict if key not in self._hidden)
+
+    def _keyRowCount(self):
+        hidden = self._hidden
+        return sum(1 for key in self._dict if key not in hidden)
+
+    def _keyRow(self, key):
+        """The row of the key, or the row where it would be inserted."""
+        hidden = self._hidden
+        return sum(1 for k in self._dict if k not in hidden and k < key)
+
+    def _keyRowAt(self, row):
+        item = KeyValueRowModelItem(self._rowKeys()[row])
+        item._model = self._model
+        item._parent = self
+        item._row = row
+        return item
 
-            self.insertChild(next_row, item, signalModel)
-        else:
-            self.appendChild(item, signalModel)
+    def hasChildren(self):
+        return len(self._children) > 0 or self._keyRowCount() > 0
 
     # Methods for MutableMapping
     def __len__(self):
@@ -274,9 +431,10 @@ class KeyValueModelItem(ModelItem, MutableMapping):
 
     def _emitDataChanged(self, key=None):
         if self.model() is not None:
-            if key is not None and key in self._items:
-                index_tl = self._items[key].index()
-                index_br = self._items[key].index(1)
+            if key is not None and key in self._dict and key not in self._hidden:
+                row = self._keyRow(key)
+                index_tl = self.model().createIndex(row, 0, self)
+                index_br = self.model().createIndex(row, 1, self)
             else:
                 index_tl = self.index()
                 index_br = self.index(1)
@@ -288,22 +446,33 @@ class KeyValueModelItem(ModelItem, MutableMapping):
                 value = value[0]
 
         if key not in self._dict:
+            key = _internKey(key)
+            insert_row = signalModel and self._model is not None and key not in self._hidden
+            if insert_row:
+                row = self._keyRow(key)
+                self._model.beginInsertRows(self.index(), row, row)
             self._dict[key] = value
-            if key not in self._hidden:
-                self._items[key] = KeyValueRowModelItem(key)
-                self.addChildSorted(self._items[key], signalModel=signalModel)
+            self._recordEdit({'op': 'set', 'key': key, 'value': value})
+            if insert_row:
+                self._model.endInsertRows()
             if signalModel:
                 self._emitDataChanged(key)
         elif self._dict[key] != value:
             self._dict[key] = value
+            self._recordEdit({'op': 'set', 'key': key, 'value': value})
             # TODO: Emit for hidden key/values?
             if signalModel:
                 self._emitDataChanged(key)
 
     def __delitem__(self, key):
+        remove_row = self._model is not None and key in self._dict and key not in self._hidden
+        if remove_row:
+            row = self._keyRow(key)
+            self._model.beginRemoveRows(self.index(), row, row)
         del self._dict[key]
-        if key in self._items:
-            self.deleteChild(self._items[key])
+        self._recordEdit({'op': 'del', 'key': key})
+        if remove_row:
+            self._model.endRemoveRows()
 
     def update(self, kvs):
         for key, value in kvs.items():
@@ -322,12 +491,23 @@ class KeyValueModelItem(ModelItem, MutableMapping):
         if None in res: del res[None]
         return res
 
+    def snapshot(self):
+        """
+        Like getAnnotations(), but only copies the containers and shares
+        the (immutable) values.  The model replaces values instead of
+        modifying them in place, so the result stays valid while editing
+        continues, e.g. while it is saved in a background thread.
+        """
+        res = dict(self._dict)
+        res.pop(None, None)
+        return res
+
     def isUnlabeled(self):
         return 'unlabeled' in self._dict and self._dict['unlabeled']
 
     def setUnlabeled(self, val):
         if val:
-            self._dict['unlabeled'] = val
+            self['unlabeled'] = val
         else:
             if 'unlabeled' in self._dict:
                 del self['unlabeled']
@@ -338,13 +518,28 @@ class KeyValueModelItem(ModelItem, MutableMapping):
 
     def setUnconfirmed(self, val):
         if val:
-            self._dict['unconfirmed'] = val
+            self['unconfirmed'] = val
         else:
             if 'unconfirmed' in self._dict:
                 del self['unconfirmed']
                 self._emitDataChanged('unconfirmed')
 
 
+def _snapshotChildren(item):
+    # Annotations which have not been loaded yet are copied as they are
+    return [child.snapshot() if isinstance(child, ModelItem) else dict(child)
+            for child in item._children
+            if not isinstance(child, ModelItem) or hasattr(child, 'snapshot')]
+
+
+def _snapshotFileInfo(fileinfo):
+    # Loading a video modifies its frame infos, so copy them as well
+    fileinfo = dict(fileinfo)
+    if 'frames' in fileinfo:
+        fileinfo['frames'] = [dict(frame) for frame in fileinfo['frames']]
+    return fileinfo
+
+
 class FileModelItem(KeyValueModelItem):
     def __init__(self, fileinfo, hidden=None):
         if not hidden:
@@ -354,7 +549,7 @@ class FileModelItem(KeyValueModelItem):
     def data(self, role=Qt.DisplayRole, column=0):
         if role == Qt.DisplayRole:
             if column == 0:
-                return os.path.basename(self['filename'])
+                return os.path.basename(self['filename'].replace('\\', '/'))
             elif column == 1 and self.isUnlabeled():
                 return '[unlabeled]'
         return ModelItem.data(self, role, column)
@@ -382,6 +577,14 @@ class ImageModelItem(ModelItem):
     def addAnnotation(self, ann, signalModel=True):
         self.addChildSorted(AnnotationModelItem(ann), signalModel=signalModel)
 
+    def addAnnotations(self, anns, signalModel=True):
+        """Append the annotations with a single row insert signal."""
+        self.appendChildren([AnnotationModelItem(ann) for ann in anns], signalModel)
+
+    def numAnnotations(self):
+        """The number of annotations, including the ones not loaded yet."""
+        return len(self._children)
+
     def annotations(self):
         for child in self._children:
             if isinstance(child, AnnotationModelItem):
@@ -400,22 +603,21 @@ class ImageModelItem(ModelItem):
 
 class ImageFileModelItem(FileModelItem, ImageModelItem):
     def __init__(self, fileinfo):
-        self._annotation_data = fileinfo.get("annotations", [])
+        annotations = fileinfo.get("annotations", [])
         if "annotations" in fileinfo:
             del fileinfo["annotations"]
         FileModelItem.__init__(self, fileinfo)
         ImageModelItem.__init__(self, [])
-        self._toload = []
-        for ann in self._annotation_data:
-            self._children.append(ann)
-            self._toload.append(ann)
+        # number of annotations which are not turned into items yet
+        self._pending = len(annotations)
+        self._children.extend(annotations)
         self._loaded = False
 
     def _load(self, index):
-        self._toload.remove(self._children[index])
         ann = AnnotationModelItem(self._children[index])
         self.replaceChild(index, ann)
-        if len(self._toload) == 0:
+        self._pending -= 1
+        if self._pending == 0:
             self._loaded = True
 
     def data(self, role=Qt.DisplayRole, column=0):
@@ -430,6 +632,11 @@ class ImageFileModelItem(FileModelItem, ImageModelItem):
                              if hasattr(child, 'getAnnotations')]
         return fi
 
+    def snapshot(self):
+        fi = KeyValueModelItem.snapshot(self)
+        fi['annotations'] = _snapshotChildren(self)
+        return fi
+
 
 class VideoFileModelItem(FileModelItem):
     def __init__(self, fileinfo):
@@ -447,6 +654,15 @@ class VideoFileModelItem(FileModelItem):
         fi['frames'] = [child.getAnnotations() for child in self.children()]
         return fi
 
+    def numAnnotations(self):
+        """The number of annotations of all frames."""
+        return sum(frame.numAnnotations() for frame in self.children())
+
+    def snapshot(self):
+        fi = KeyValueModelItem.snapshot(self)
+        fi['frames'] = [child.snapshot() for child in self._children if hasattr(child, 'snapshot')]
+        return fi
+
 
 class FrameModelItem(ImageModelItem, KeyValueModelItem):
     def __init__(self, frameinfo):
@@ -481,11 +697,42 @@ class FrameModelItem(ImageModelItem, KeyValueModelItem):
                              if hasattr(child, 'getAnnotations')]
         return fi
 
+    def snapshot(self):
+        fi = KeyValueModelItem.snapshot(self)
+        fi['annotations'] = _snapshotChildren(self)
+        return fi
+
 
 class AnnotationModelItem(KeyValueModelItem):
+    __slots__ = ()
+
     def __init__(self, annotation):
         KeyValueModelItem.__init__(self, properties=annotation)
 
+    def _attachedStatistics(self):
+        # Deleted items keep their model and parent, so check that we are
+        # still one of the children of our parent
+        parent = self._parent
+        if self._model is None or parent is None or parent._childIndex(self) is None:
+            return None
+        return self._statistics()
+
+    def __setitem__(self, key, value, signalModel=True):
+        statistics = self._attachedStatistics() if key in AnnotationStatistics.KEYS else None
+        if statistics is not None:
+            statistics.removeAnnotation(self)
+        KeyValueModelItem.__setitem__(self, key, value, signalModel)
+        if statistics is not None:
+            statistics.addAnnotation(self)
+
+    def __delitem__(self, key):
+        statistics = self._attachedStatistics() if key in AnnotationStatistics.KEYS else None
+        if statistics is not None:
+            statistics.removeAnnotation(self)
+        KeyValueModelItem.__delitem__(self, key)
+        if statistics is not None:
+            statistics.addAnnotation(self)
+
     # Delegated from QAbstractItemModel
     def data(self, role=Qt.DisplayRole, column=0):
         if role == Qt.DisplayRole:
@@ -510,6 +757,12 @@ class AnnotationModelItem(KeyValueModelItem):
 
 
 class KeyValueRowModelItem(ModelItem):
+    """
+    Key/value row of a KeyValueModelItem.  Rows are created when they are
+    accessed and not kept by their parent.
+    """
+    __slots__ = ('_key', '_read_only')
+
     def __init__(self, key, read_only=True):
         ModelItem.__init__(self)
         self._key = key
@@ -518,6 +771,9 @@ class KeyValueRowModelItem(ModelItem):
     def key(self):
         return self._key
 
+    def row(self):
+        return self._row
+
     def data(self, role=Qt.DisplayRole, column=0):
         if role == Qt.DisplayRole:
             if column == 0:
@@ -547,6 +803,137 @@ class KeyValueRowModelItem(ModelItem):
         return False
 
 
+class AnnotationStatistics:
+    """
+    Keeps track of the number of annotations of a model, in total and per
+    label class, and of the IDs used per label class.  The statistics are
+    updated while file items are added to the model and whenever
+    annotations are inserted, modified or deleted, so they never need to
+    be computed by iterating over the whole model.
+    """
+    KEYS = ('class', 'ID')
+
+    def __init__(self):
+        self._id_counts = {}
+        self._max_ids = {}
+        self._class_counts = {}
+        self._count = 0
+
+    @classmethod
+    def fromIDCounts(cls, id_counts, class_counts=None):
+        """
+        Create the statistics from a list of [class, ID, count] triples and
+        a list of [class, count] pairs, as stored by the ModelCache.  If the
+        class counts are not given, they are summed up from the ID counts,
+        which do not include annotations without a valid ID.
+        """
+        statistics = cls()
+        for label_class, idx, count in id_counts:
+            counts = statistics._id_counts.setdefault(label_class, {})
+            counts[idx] = counts.get(idx, 0) + count
+            if label_class not in statistics._max_ids or idx > statistics._max_ids[label_class]:
+                statistics._max_ids[label_class] = idx
+        if class_counts is None:
+            class_counts = [(label_class, sum(counts.values()))
+                            for label_class, counts in statistics._id_counts.items()]
+        for label_class, count in class_counts:
+            statistics._class_counts[label_class] = statistics._class_counts.get(label_class, 0) + count
+            statistics._count += count
+        return statistics
+
+    @staticmethod
+    def _classAndID(ann):
+        try:
+            return ann['class'], int(ann['ID'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def addAnnotation(self, ann):
+        label_class = ann.get('class')
+        self._class_counts[label_class] = self._class_counts.get(label_class, 0) + 1
+        self._count += 1
+        key = self._classAndID(ann)
+        if key is None:
+            return
+        label_class, idx = key
+        counts = self._id_counts.setdefault(label_class, {})
+        counts[idx] = counts.get(idx, 0) + 1
+        if label_class not in self._max_ids or idx > self._max_ids[label_class]:
+            self._max_ids[label_class] = idx
+
+    def removeAnnotation(self, ann):
+        label_class = ann.get('class')
+        count = self._class_counts.get(label_class, 0)
+        if count > 0:
+            if count == 1:
+                del self._class_counts[label_class]
+            else:
+                self._class_counts[label_class] = count - 1
+            self._count -= 1
+        key = self._classAndID(ann)
+        if key is None:
+            return
+        label_class, idx = key
+        counts = self._id_counts.get(label_class, {})
+        if idx not in counts:
+            return
+        counts[idx] -= 1
+        if counts[idx] == 0:
+            del counts[idx]
+            if not counts:
+                del self._id_counts[label_class]
+                del self._max_ids[label_class]
+            elif idx == self._max_ids[label_class]:
+                self._max_ids[label_class] = max(counts)
+
+    def addFileInfo(self, fileinfo):
+        """Add the annotations of a file item that is not loaded yet."""
+        for ann in fileinfo.get('annotations', []):
+            self.addAnnotation(ann)
+        for frame in fileinfo.get('frames', []):
+            for ann in frame.get('annotations', []):
+                self.addAnnotation(ann)
+
+    def addItem(self, item):
+        """Add all annotations below (and including) the model item."""
+        self._walk(item, self.addAnnotation)
+
+    def removeItem(self, item):
+        """Remove all annotations below (and including) the model item."""
+        self._walk(item, self.removeAnnotation)
+
+    def _walk(self, item, func):
+        if isinstance(item, AnnotationModelItem):
+            func(item)
+            return
+        for child in item._children:
+            if isinstance(child, ModelItem):
+                self._walk(child, func)
+            else:
+                # annotation which has not been loaded yet
+                func(child)
+
+    def maxID(self, label_class, default=0):
+        return self._max_ids.get(label_class, default)
+
+    def maxIDs(self):
+        return dict(self._max_ids)
+
+    def idCounts(self, label_class):
+        """Returns a dict mapping the IDs used for the label class to the number of annotations."""
+        return dict(self._id_counts.get(label_class, {}))
+
+    def numAnnotations(self, label_class=None):
+        """The number of annotations, or of the annotations of the label class."""
+        if label_class is None:
+            return self._count
+        return self._class_counts.get(label_class, 0)
+
+    def classCounts(self):
+        """Returns a dict mapping the label classes to their number of annotations."""
+        return dict(self._class_counts)
+
+
 class MultiAnnotationModel(QAbstractItemModel):
     # signals
     dirtyChanged = pyqtSignal(bool, name='dirtyChanged')
@@ -674,10 +1061,10 @@ class MultiAnnotationModel(QAbstractItemModel):
                 if predicate is None or predicate(item):
                     yield item
 
-            # Get next item
-            if item.rowCount() > 0 and level < maxlevels:
+            # Get next item, key/value rows are skipped
+            if len(item._children) > 0 and level < maxlevels:
                 level += 1
-                item = item.childAt(0)
+                item = item._childAt(0)
             else:
                 next_sibling = item.getNextSibling()
                 if next_sibling is not None:
@@ -735,22 +1122,167 @@ class AnnotationSortFilterProxyModel(QSortFilterProxyModel):
 #######################################################################################
 
 class RootModelItem(ModelItem):
-    def __init__(self, model, files):
+    # Number of file items pulled from a lazy source at once
+    FETCH_BATCH = 64
+
+    def __init__(self, model, files, statistics=None):
+        """
+        ``files`` is either a list of file infos or an iterator yielding
+        them (e.g. from AnnotationContainer.iterate()).  Iterators are
+        consumed lazily, only the first file info is read up front.
+        Sharded sources (see ShardedSource) provide random access; a
+        shard is read when one of its file infos is accessed.  The
+        AnnotationStatistics of a list of file infos can be passed in if
+        they are known already.
+        """
         ModelItem.__init__(self)
         self._model = model
-        self._toload = []
-        for f in files:
-            self._toload.append(f)
-            self._children.append(f)
+        # number of file infos which are not turned into items yet
+        self._pending = 0
+        self._source = None
+        self._shards = None
+        self._unread = set()
+        self._stats = AnnotationStatistics()
+        self._edits = None
+        if isinstance(files, (list, tuple)):
+            if statistics is not None:
+                self._stats = statistics
+            else:
+                for f in files:
+                    self._stats.addFileInfo(f)
+            self._pending += len(files)
+            self._children.extend(files)
+        elif hasattr(files, 'loadShard'):
+            # None marks the file infos of shards which were not read yet
+            self._shards = files
+            self._unread = set(range(files.numShards()))
+            self._children = [None] * len(files)
+        else:
+            self._source = iter(files)
+            self.fetchMore(1, signalModel=False)
         self._loaded = False
 
     def _load(self, index):
-        self._toload.remove(self._children[index])
+        if self._children[index] is None:
+            self._readShard(index // self._shards.shardSize())
         fi = FileModelItem.create(self._children[index])
         self.replaceChild(index, fi)
-        if len(self._toload) == 0:
+        self._pending -= 1
+        if self._pending == 0 and self._source is None and not self._unread:
             self._loaded = True
 
+    def _readShard(self, k):
+        first = k * self._shards.shardSize()
+        for i, f in enumerate(self._shards.loadShard(k)):
+            self._stats.addFileInfo(f)
+            self._pending += 1
+            self._children[first + i] = f
+        self._unread.discard(k)
+
+    def _readAllShards(self):
+        for k in sorted(self._unread):
+            self._readShard(k)
+
+    def fileInfoAt(self, row):
+        """
+        Returns the file item at ``row`` if it was created already, or its
+        file info otherwise, e.g. to look up the filename without creating
+        the file item.
+        """
+        child = self._children[row]
+        if child is None:
+            self._readShard(row // self._shards.shardSize())
+            child = self._children[row]
+        return child
+
+    def _ensureAllLoaded(self):
+        self.fetchMore(-1)
+        return ModelItem._ensureAllLoaded(self)
+
+    def hasUnreadFiles(self):
+        """
+        Returns True if there are file infos which were not read from a
+        lazy or sharded source yet.
+        """
+        return self._source is not None or bool(self._unread)
+
+    def unreadMaxID(self, label_class):
+        """
+        Returns the maximum ID of the label class in the shards which were
+        not read yet, as recorded in the manifest of a sharded file.
+        """
+        return max([self._shards.maxIDs(k).get(label_class, 0) for k in self._unread] or [0])
+
+    def statistics(self):
+        return self._stats
+
+    def journal(self):
+        """
+        Returns the list of edits recorded since the journal was started or
+        last taken, or None if no journal is kept.
+        """
+        return self._edits
+
+    def startJournal(self):
+        """
+        Start recording all edits of the model as small records (see
+        AnnotationContainer.appendEdits()).
+        """
+        self._edits = []
+
+    def takeJournal(self):
+        """Returns the recorded edits and starts a new journal."""
+        edits = self._edits
+        if edits is not None:
+            self._edits = []
+        return edits
+
+    def stopJournal(self):
+        self._edits = None
+
+    def canFetchMore(self):
+        return self._source is not None
+
+    def fetchMore(self, count=FETCH_BATCH, signalModel=True):
+        """
+        Pull up to ``count`` further file infos from the lazy source, or all
+        remaining ones if ``count`` is negative.  Returns the number of file
+        infos that were added.
+        """
+        if self._source is None:
+            return 0
+        if count < 0:
+            fetched = list(self._source)
+        else:
+            fetched = list(itertools.islice(self._source, count))
+        if count < 0 or len(fetched) < count:
+            self._source = None
+        if not fetched:
+            if self._source is None and self._pending == 0 and not self._unread:
+                self._loaded = True
+            return 0
+
+        first = len(self._children)
+        signalModel = signalModel and self._model is not None
+        if signalModel:
+            self._model._fetching = True
+            self._model.beginInsertRows(QModelIndex(), first, first + len(fetched) - 1)
+        for f in fetched:
+            self._stats.addFileInfo(f)
+            self._children.append(f)
+        self._pending += len(fetched)
+        self._loaded = False
+        if signalModel:
+            self._model.endInsertRows()
+            self._model._fetching = False
+        return len(fetched)
+
+    def _childAt(self, index):
+        missing = index + 1 - len(self._children)
+        if missing > 0 and self._source is not None:
+            self.fetchMore(max(missing, self.FETCH_BATCH))
+        return ModelItem._childAt(self, index)
+
     def childHasChildren(self, pos):
         if isinstance(self._children[pos], ModelItem):
             return self._children[pos].hasChildren()
@@ -786,30 +1318,112 @@ class RootModelItem(ModelItem):
         LOG.debug("Creation of ModelItems: %.2fs, addition to model: %.2fs" % (diff1, diff2))
 
     def numFiles(self):
-        return len(self.children())
+        """
+        The number of files read so far.  Like numAnnotations(), this does
+        not read a lazy source to its end; see countsComplete().
+        """
+        # the file items themselves need not be loaded
+        return len(self._children)
 
-    def numAnnotations(self):
-        count = 0
-        for ann in self._model.iterator(AnnotationModelItem):
-            count += 1
-        return count
+    def numAnnotations(self, label_class=None):
+        """
+        The number of annotations, or of the annotations of the label
+        class, taken from the statistics without creating any items.  Only
+        the file infos read so far, and the shards whose counts are
+        recorded in the manifest, are counted; see countsComplete().
+        """
+        if label_class is None:
+            return self._stats.numAnnotations() + sum(self._unreadClassCounts().values())
+        return self._stats.numAnnotations(label_class) + self._unreadClassCounts().get(label_class, 0)
+
+    def classCounts(self):
+        """
+        Returns a dict mapping the label classes to their number of
+        annotations, with the same restriction as numAnnotations().
+        """
+        counts = self._stats.classCounts()
+        for label_class, count in self._unreadClassCounts().items():
+            counts[label_class] = counts.get(label_class, 0) + count
+        return counts
+
+    def countsComplete(self):
+        """
+        Returns True if numFiles(), numAnnotations() and classCounts()
+        cover all files, or False if there are file infos left in a lazy
+        source, or shards whose manifest entry has no counts.
+        """
+        if self._source is not None:
+            return False
+        return all(self._shards.classCounts(k) is not None for k in self._unread)
+
+    def fetchAll(self):
+        """
+        Read all remaining file infos from a lazy or sharded source, without
+        creating the file items, so that the counts are complete.  This
+        reads the whole file, so it is meant for batch use (e.g. the stats
+        command) and not for the GUI thread.
+        """
+        self.fetchMore(-1)
+        self._readAllShards()
+
+    def _unreadClassCounts(self):
+        counts = {}
+        for k in self._unread:
+            # None for shards written before the manifest recorded the counts
+            for label_class, count in (self._shards.classCounts(k) or {}).items():
+                counts[label_class] = counts.get(label_class, 0) + count
+        return counts
+
+    def numAnnotationsAt(self, row):
+        """
+        The number of annotations of the file at ``row``, without creating
+        the file item.
+        """
+        child = self.fileInfoAt(row)
+        if isinstance(child, ModelItem):
+            return child.numAnnotations()
+        return len(child.get('annotations', [])) + \
+            sum(len(frame.get('annotations', [])) for frame in child.get('frames', []))
 
     def getAnnotations(self):
         return [child.getAnnotations() for child in self.children()
                 if hasattr(child, 'getAnnotations')]
 
+    def snapshot(self):
+        """
+        Returns a cheap copy of all annotations that can be serialized while
+        the model is modified.  Unlike getAnnotations(), file items which
+        have not been loaded yet are not created.
+        """
+        self.fetchAll()
+        return [child.snapshot() if isinstance(child, ModelItem) else _snapshotFileInfo(child)
+                for child in self._children]
+
+    def snapshotRows(self, rows):
+        """
+        Like snapshot(), but only for the file items in ``rows``.  Returns a
+        dict mapping the rows to the file items.
+        """
+        snapshot = {}
+        for row in rows:
+            child = self._children[row]
+            snapshot[row] = child.snapshot() if isinstance(child, ModelItem) else _snapshotFileInfo(child)
+        return snapshot
+
 
 class AnnotationModel(QAbstractItemModel):
     # signals
     dirtyChanged = pyqtSignal(bool, name='dirtyChanged')
 
-    def __init__(self, annotations, parent=None):
+    def __init__(self, annotations, parent=None, statistics=None):
         QAbstractItemModel.__init__(self, parent)
 
         start = time.time()
         self._annotations = annotations
         self._dirty = False
-        self._root = RootModelItem(self, annotations)
+        self._dirty_rows = set()
+        self._fetching = False
+        self._root = RootModelItem(self, annotations, statistics)
         diff = time.time() - start
         LOG.info("Created AnnotationModel in %.2fs" % (diff,))
 
@@ -827,6 +1441,15 @@ class AnnotationModel(QAbstractItemModel):
         parent = self.parentFromIndex(index)
         return parent.childHasChildren(index.row())
 
+    def canFetchMore(self, index=QModelIndex()):
+        if index.isValid():
+            return False
+        return self._root.canFetchMore()
+
+    def fetchMore(self, index=QModelIndex()):
+        if not index.isValid():
+            self._root.fetchMore()
+
     def columnCount(self, index=QModelIndex()):
         return 2
 
@@ -892,16 +1515,51 @@ class AnnotationModel(QAbstractItemModel):
     def root(self):
         return self._root
 
+    def statistics(self):
+        return self._root.statistics()
+
     def dirty(self):
         return self._dirty
 
     def setDirty(self, dirty=True):
+        if not dirty:
+            self._dirty_rows = set()
         if dirty != self._dirty:
             LOG.debug("Setting model state to dirty")
             self._dirty = dirty
             self.dirtyChanged.emit(self._dirty)
 
-    def onDataChanged(self, *args):
+    def setAllRowsDirty(self):
+        """
+        Mark the model as dirty as a whole, e.g. if saving the modified
+        rows failed.
+        """
+        self._dirty_rows = None
+        self.setDirty()
+
+    def dirtyRows(self):
+        """
+        Returns the sorted rows of the file items (images/videos) that have
+        been modified since the model was loaded or saved, or None if the
+        file items themselves were inserted or removed.
+        """
+        if self._dirty_rows is None:
+            return None
+        return sorted(self._dirty_rows)
+
+    def onDataChanged(self, index, *args):
+        # rows appended from a lazy source are not modifications
+        if self._fetching:
+            return
+        index = QModelIndex(index)
+        if self._dirty_rows is not None:
+            if index.isValid():
+                while index.parent().isValid():
+                    index = index.parent()
+                self._dirty_rows.add(index.row())
+            else:
+                # file items were added or removed, rows are not stable
+                self._dirty_rows = None
         self.setDirty()
 
     def itemFromIndex(self, index):
@@ -926,10 +1584,10 @@ class AnnotationModel(QAbstractItemModel):
                 if predicate is None or predicate(item):
                     yield item
 
-            # Get next item
-            if item.rowCount() > 0 and level < maxlevels:
+            # Get next item, key/value rows are skipped
+            if len(item._children) > 0 and level < maxlevels:
                 level += 1
-                item = item.childAt(0)
+                item = item._childAt(0)
             else:
                 next_sibling = item.getNextSibling()
                 if next_sibling is not None:
@@ -979,7 +1637,10 @@ class AnnotationTreeView(QTreeView):
 
     def rowsInserted(self, index, start, end):
         QTreeView.rowsInserted(self, index, start, end)
-        self.resizeColumns()
+        # resizing to the contents makes the view fetch further rows from
+        # a lazy source, which would read it to its end at once
+        if not getattr(self.model(), '_fetching', False):
+            self.resizeColumns()
 
     def setSelectedItems(self, items):
         # block = self.blockSignals(True)
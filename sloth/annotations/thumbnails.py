@@ -0,0 +1,285 @@
+"""
+Persistent thumbnails of the frames of a sequence.
+
+The thumbnails of all frames of one camera are stored in one file in the
+camera folder (see thumbnailFilename()), so that tens of thousands of
+frames can be scrubbed through without decoding the images.  A thumbnail
+file consists of
+
+* a header with the thumbnail size, the first frame number and the number
+  of frames,
+* an index with the offset and length of the thumbnail of each frame in
+  the file (an offset of 0 marks frames without a thumbnail), and
+* the thumbnails as small JPEG images, appended in the order in which they
+  were generated.
+
+Thumbnails are generated in a process pool by buildThumbnails(), which only
+generates the missing ones.  As the index entry of a thumbnail is written
+after the thumbnail itself is synced to disk, an interrupted build can be
+resumed at any time, and index entries pointing past the end of the file
+are treated as missing.  Only one builder writes to a thumbnail file at a
+time (see _lockFile()).  ThumbnailStore reads the thumbnails through a
+memory map, also while they are generated.
+"""
+import io
+import mmap
+import os
+import struct
+from sloth.annotations.manifest import sequenceImages
+from sloth.core.utils import process_pool_executor, replace_file
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'SLTHUMB1'
+# magic, thumbnail width and height, first frame number, number of frames
+HEADER = struct.Struct('<8sIIqI')
+HEADER_SIZE = 64
+# offset and length of a thumbnail
+ENTRY = struct.Struct('<QI')
+
+THUMBNAIL_FILENAME = '.sloth-thumbnails'
+
+
+def thumbnailFilename(image_dir):
+    """The thumbnail file of the camera folder ``image_dir``."""
+    return os.path.join(image_dir, THUMBNAIL_FILENAME)
+
+
+def _makeThumbnail(filename, size, quality=80):
+    """
+    Returns the JPEG encoded thumbnail of the image file, or None if the
+    image cannot be read.
+    """
+    from PIL import Image
+    try:
+        with Image.open(filename) as im:
+            # JPEG images are decoded at the lowest sufficient resolution
+            im.draft('RGB', size)
+            im = im.convert('RGB')
+            im.thumbnail(size)
+            buf = io.BytesIO()
+            im.save(buf, 'JPEG', quality=quality)
+            return buf.getvalue()
+    except (IOError, OSError) as e:
+        LOG.debug("Could not create thumbnail of %s (%s)" % (filename, e))
+        return None
+
+
+def _createFile(filename, size, start_frame, n_frames):
+    tmpname = "%s.%d.tmp" % (filename, os.getpid())
+    with open(tmpname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size[0], size[1], start_frame, n_frames).ljust(HEADER_SIZE, b'\0'))
+        f.write(b'\0' * (ENTRY.size * n_frames))
+    replace_file(tmpname, filename)
+
+
+def _lockFile(filename):
+    """
+    Take the lock of the builders of the thumbnail file, a separate lock
+    file next to it, which the system releases if the builder dies.
+    Returns the open lock file, or None if another builder holds the lock.
+    """
+    f = open(filename + '.lock', 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except (IOError, OSError):
+        f.close()
+        return None
+    return f
+
+
+def _readHeader(filename):
+    try:
+        with open(filename, 'rb') as f:
+            magic, width, height, start_frame, n_frames = HEADER.unpack(f.read(HEADER.size))
+    except (IOError, OSError, struct.error):
+        return None
+    if magic != MAGIC:
+        return None
+    return (width, height), start_frame, n_frames
+
+
+def openThumbnails(filename, n_frames, start_frame=0, size=(128, 80)):
+    """
+    Create the thumbnail file for ``n_frames`` frames, unless it exists
+    already with the same layout, and return the ThumbnailStore.
+    Thumbnail files with a different layout (e.g. if the frame range of
+    the sequence changed) are recreated, for which the stores of the old
+    file need to be closed on Windows (see replace_file()).
+    """
+    size = tuple(size)
+    if _readHeader(filename) != (size, start_frame, n_frames):
+        _createFile(filename, size, start_frame, n_frames)
+    return ThumbnailStore(filename)
+
+
+def buildThumbnails(filename, image_files, start_frame=0, size=(128, 80), workers=None,
+                    progress=None, cancelled=None, batch_size=256):
+    """
+    Generate the missing thumbnails of the images in ``image_files`` (one
+    per frame) in the thumbnail file, in a pool of ``workers`` processes.
+    Nothing is generated if another builder is writing to the file.
+
+    Parameters
+    ==========
+    progress: callable, optional
+        Called as progress(done, total) after each batch of thumbnails.
+    cancelled: callable, optional
+        Returns True if the build should stop, checked after each batch.
+
+    Returns
+    =======
+    The number of thumbnails which were generated.
+    """
+    lock = _lockFile(filename)
+    if lock is None:
+        LOG.info("Thumbnails in %s are generated by another process" % filename)
+        return 0
+    try:
+        store = openThumbnails(filename, len(image_files), start_frame, size)
+        todo = store.missing()
+        store.close()
+        if not todo:
+            return 0
+        generated = _appendThumbnails(filename, image_files, todo, size, workers, progress, cancelled, batch_size)
+    finally:
+        lock.close()
+    LOG.info("Generated %d thumbnails in %s" % (generated, filename))
+    return generated
+
+
+def _appendThumbnails(filename, image_files, todo, size, workers, progress, cancelled, batch_size):
+    generated = 0
+    with open(filename, 'r+b') as f, process_pool_executor(workers) as executor:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        for first in range(0, len(todo), batch_size):
+            if cancelled is not None and cancelled():
+                break
+            batch = todo[first:first + batch_size]
+            thumbnails = executor.map(_makeThumbnail, [image_files[i] for i in batch],
+                                      [size] * len(batch), chunksize=16)
+            entries = []
+            for i, data in zip(batch, thumbnails):
+                if data is None:
+                    continue
+                f.seek(end)
+                f.write(data)
+                entries.append((i, end, len(data)))
+                end += len(data)
+            # the thumbnails need to be on disk before they are indexed
+            f.flush()
+            os.fsync(f.fileno())
+            for i, offset, length in entries:
+                f.seek(HEADER_SIZE + i * ENTRY.size)
+                f.write(ENTRY.pack(offset, length))
+            f.flush()
+            generated += len(entries)
+            if progress is not None:
+                progress(first + len(batch), len(todo))
+        os.fsync(f.fileno())
+    return generated
+
+
+def buildSequenceThumbnails(seqinfo_filename, size=(128, 80), workers=None, progress=None, cancelled=None):
+    """
+    Generate the missing thumbnails of all cameras of the sequence described
+    by the seqinfo.json file.  Returns the list of thumbnail files.
+    """
+    start_frame, cameras = sequenceImages(seqinfo_filename)
+    filenames = []
+    for image_dir, image_files in cameras:
+        filename = thumbnailFilename(image_dir)
+        buildThumbnails(filename, image_files, start_frame, size, workers, progress, cancelled)
+        filenames.append(filename)
+    return filenames
+
+
+class ThumbnailStore:
+    """
+    Read access to a thumbnail file through a memory map.  Thumbnails which
+    are added to the file while it is open become visible.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        header = _readHeader(filename)
+        if header is None:
+            raise ValueError("%s is no thumbnail file" % filename)
+        self._size, self._start_frame, self._n_frames = header
+        self._file = open(filename, 'rb')
+        self._map = None
+        self._remap()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def filename(self):
+        return self._filename
+
+    def size(self):
+        """The maximum (width, height) of the thumbnails."""
+        return self._size
+
+    def startFrame(self):
+        return self._start_frame
+
+    def __len__(self):
+        return self._n_frames
+
+    def _entry(self, index):
+        if not 0 <= index < self._n_frames:
+            raise IndexError(index)
+        return ENTRY.unpack_from(self._map, HEADER_SIZE + index * ENTRY.size)
+
+    def _valid(self, offset, length):
+        if offset == 0:
+            return False
+        if offset + length > len(self._map):
+            # appended since the file was mapped
+            self._remap()
+        # entries pointing past the end were left by an interrupted write
+        return offset + length <= len(self._map)
+
+    def hasThumbnail(self, index):
+        return self._valid(*self._entry(index))
+
+    def thumbnail(self, index):
+        """
+        Returns the JPEG encoded thumbnail of the ``index``-th frame, or None
+        if it was not generated yet.
+        """
+        offset, length = self._entry(index)
+        if not self._valid(offset, length):
+            return None
+        return self._map[offset:offset + length]
+
+    def missing(self):
+        """The indices of the frames without a valid thumbnail."""
+        self._remap()
+        end = len(self._map)
+        index = memoryview(self._map)[HEADER_SIZE:HEADER_SIZE + self._n_frames * ENTRY.size]
+        try:
+            return [i for i, (offset, length) in enumerate(ENTRY.iter_unpack(index))
+                    if offset == 0 or offset + length > end]
+        finally:
+            index.release()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
@@ -120,15 +120,122 @@ HOTKEYS = (
 # annotation container classes.  The filename pattern can contain wildcards
 # such as * and ?.  The corresponding container is expected to either a python
 # class implementing the sloth container interface, or a module path pointing
-# to such a class.
+# to such a class.  Use sloth.annotations.container.CompactJsonContainer for
+# *.json to write smaller files faster, without indentation, or
+# sloth.annotations.container.JsonJournalContainer to only append the edits
+# since the last save to <file>.journal instead of rewriting the whole file.
 CONTAINERS = (
     ('*.json', 'sloth.annotations.container.JsonContainer'),
     ('*.msgpack', 'sloth.annotations.container.MsgpackContainer'),
+    ('*.npz', 'sloth.annotations.container.NpzContainer'),
+    ('*.sqlite', 'sloth.annotations.container.SqliteContainer'),
+    ('*.shards', 'sloth.annotations.container.ShardedJsonContainer'),
     ('*.yaml', 'sloth.annotations.container.YamlContainer'),
     ('*.pickle', 'sloth.annotations.container.PickleContainer'),
     ('*.sloth-init', 'sloth.annotations.container.FileNameListContainer'),
 )
 
+# ANNOTATION_EXTENSIONS
+#
+# File extensions of the per-camera annotation files of a sequence, in the
+# order in which they are looked for.  New annotation files are created with
+# the first extension.  Compressed variants of the CONTAINERS patterns can be
+# used, e.g. '.json.gz', '.json.zst' (needs the python module zstandard) or
+# '.msgpack.lz4' (needs the python module lz4), which reduces the amount of
+# data read and written considerably, e.g. on network file systems.
+ANNOTATION_EXTENSIONS = ('.json', '.json.gz', '.json.zst', '.msgpack.lz4')
+
+# STREAMING_LOAD
+#
+# If True, annotation files are decoded incrementally while the model is
+# populated, so that the first frame can be displayed before the whole
+# file has been read.  Containers which cannot decode their format
+# incrementally fall back to loading the whole file.
+STREAMING_LOAD = True
+
+# LOAD_WORKERS
+#
+# Maximum number of worker processes used to parse the annotation files
+# of the camera views in parallel if STREAMING_LOAD is disabled.  A value
+# of 1 loads the files one after another.  Starting the workers takes
+# about a second, and the parsed annotations are sent back to the label
+# tool, where unpickling them costs about half as much as parsing the
+# JSON.  So parallel loading only pays off for large files (hundreds of
+# MB per sequence) on machines with a core per view.  Measure it with
+# benchmarks/parallel_load_benchmark.py before raising this value.
+LOAD_WORKERS = 1
+
+# ASYNC_SAVE
+#
+# If True, saving the annotations of all views (Ctrl+S) writes a snapshot
+# of the annotations in a background thread, so that labeling can
+# continue while the files are written.
+ASYNC_SAVE = True
+
+# MODEL_CACHE_DIR
+#
+# Directory in which parsed annotation files are cached, so that reopening a
+# sequence does not need to parse the (unchanged) annotation files again.
+# The cache is validated by path, modification time, size and content hash
+# of the annotation files and rebuilt in the background if it is outdated.
+# Set to None to disable the cache.
+MODEL_CACHE_DIR = '~/.cache/sloth'
+
+# IMAGE_CACHE_MB
+#
+# Memory budget in MB for the decoded images, which are shared by all views.
+# The least recently used images are evicted when the budget is exceeded, so
+# that going back to a recently shown frame does not decode it again.  Set
+# to 0 to disable the cache.
+IMAGE_CACHE_MB = 512
+
+# MAX_DISPLAY_REDUCTION
+#
+# Images are decoded at a resolution reduced by a power of two up to this
+# factor if they are displayed smaller than their full resolution, e.g. in
+# the grid of the camera views.  JPEG images can be decoded at 1/2, 1/4 and
+# 1/8 of their resolution much faster.  When a view is zoomed in, the image
+# is reloaded at a higher resolution.  Annotations always use the
+# coordinates of the full resolution image.  Set to 1 to always decode
+# images at full resolution.
+MAX_DISPLAY_REDUCTION = 8
+
+# PLACEHOLDER_REDUCTION
+#
+# When switching to a frame whose images are not cached, JPEG images are
+# first shown as a placeholder decoded at a resolution reduced by this
+# factor (1, 2, 4 or 8), which is very fast.  The placeholder is replaced
+# when the image was decoded at the display resolution in the background.
+# Set to 0 to always wait for the images.
+PLACEHOLDER_REDUCTION = 8
+
+# PREFETCH_FRAMES
+#
+# Number of frames ahead of the current frame (in the direction the user is
+# moving) whose images are decoded into the image cache in the background
+# after each navigation, for all views.  A quarter as many frames are
+# prefetched in the opposite direction.  The prefetched images count against
+# IMAGE_CACHE_MB.  Set to 0 to disable prefetching.
+PREFETCH_FRAMES = 8
+
+# PREFETCH_WORKERS
+#
+# Number of threads decoding the prefetched images.
+PREFETCH_WORKERS = 2
+
+# THUMBNAIL_SIZE
+#
+# Maximum (width, height) of the thumbnails shown in the filmstrip.  The
+# thumbnails of each camera are stored in a file in the camera folder and
+# generated in the background when a sequence is opened; existing
+# thumbnails are reused.  Set to None to disable the thumbnails.
+THUMBNAIL_SIZE = (128, 80)
+
+# THUMBNAIL_WORKERS
+#
+# Number of worker processes generating thumbnails, None for one per CPU.
+THUMBNAIL_WORKERS = 2
+
 # PLUGINS
 #
 # A list/tuple of classes implementing the sloth plugin interface.  The
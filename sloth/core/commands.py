@@ -207,6 +207,61 @@ class MergeFilesCommand(BaseCommand):
         return an1
 
 
+class ThumbnailsCommand(BaseCommand):
+    """
+    Generates the missing thumbnails of all cameras of a sequence, which are
+    shown in the filmstrip.  Can be interrupted and run again.
+    """
+    args = '<seqinfo.json>'
+    help = __doc__.strip()
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--workers', type='int', default=None,
+            help='Number of worker processes (default: one per CPU).'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Expect exactly 1 argument.")
+
+        from sloth.annotations.thumbnails import buildSequenceThumbnails
+        from sloth.conf import config
+
+        def progress(done, total):
+            sys.stdout.write("\r%d / %d" % (done, total))
+            sys.stdout.flush()
+
+        filenames = buildSequenceThumbnails(args[0], config.THUMBNAIL_SIZE or (128, 80),
+                                            options['workers'], progress)
+        sys.stdout.write("\n")
+        for filename in filenames:
+            logger.info("Wrote %s" % filename)
+
+
+class StatisticsCommand(BaseCommand):
+    """
+    Prints the number of files and annotations of each view of a sequence,
+    in total and per label class.
+    """
+    args = '<seqinfo.json>'
+    help = __doc__.strip()
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("stats: Expecting exactly 1 argument.")
+
+        self.labeltool.loadAnnotations(args[0], handleErrors=False)
+        names = getattr(self.labeltool, 'camera_names', [])
+        for view, model in enumerate(self.labeltool.modelList()):
+            name = names[view] if view < len(names) else str(view)
+            # the counts of a lazy source only cover what was read so far
+            model.root().fetchAll()
+            print("%s: %d files, %d annotations" % (name, model.root().numFiles(),
+                                                    self.labeltool.numAnnotations(view)))
+            counts = self.labeltool.classCounts(view)
+            for label_class in sorted(counts, key=str):
+                print("    %-20s %d" % (label_class, counts[label_class]))
+
+
 def _make_writeable(filename):
     """
     Make sure that the file is writeable. Useful if our source is
@@ -240,3 +295,5 @@ register_command('createconfig', CreateConfigCommand())
 register_command('dumplabels', DumpLabelsCommand())
 register_command('appendfiles', AppendFilesCommand())
 register_command('mergefiles', MergeFilesCommand())
+register_command('thumbnails', ThumbnailsCommand())
+register_command('stats', StatisticsCommand())
@@ -4,6 +4,12 @@ This is the core labeltool module.
 import os
 import sys
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 # from PyQt4.QtGui import *
 # from PyQt4.QtCore import *
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QCheckBox
@@ -11,6 +17,10 @@ from PyQt5.Qt import *
 from PyQt5 import QtGui
 from sloth.annotations.model import *
 from sloth.annotations.container import AnnotationContainerFactory, AnnotationContainer
+from sloth.annotations.cache import ModelCache
+from sloth.annotations.imagecache import ImagePrefetcher
+from sloth.annotations.manifest import ImageManifest, sequenceImages
+from sloth.annotations.thumbnails import thumbnailFilename, openThumbnails, buildThumbnails
 from sloth.conf import config
 from sloth.core.cli import LaxOptionParser, BaseCommand
 from sloth.core.utils import import_callable
@@ -28,6 +38,47 @@ except ImportError:
     pass
 
 
+class MaxIDDict(MutableMapping):
+    """
+    Maps the configured label classes to the maximum ID used for them over
+    the annotation models of all views.  The values are taken from the
+    statistics the models maintain, values assigned explicitly (e.g. IDs
+    reserved by an inserter) are kept as lower bounds.
+    """
+
+    def __init__(self, labeltool):
+        self._labeltool = labeltool
+        self._reserved = {}
+
+    def _classes(self):
+        classes = [label['attributes']['class'] for label in config.LABELS
+                   if 'class' in label.get('attributes', {})]
+        return classes + [c for c in self._reserved if c not in classes]
+
+    def __getitem__(self, label_class):
+        if label_class not in self._classes():
+            raise KeyError(label_class)
+        return self._labeltool.maxID(label_class)
+
+    def __setitem__(self, label_class, value):
+        self._reserved[label_class] = value
+
+    def __delitem__(self, label_class):
+        del self._reserved[label_class]
+
+    def __iter__(self):
+        return iter(self._classes())
+
+    def __len__(self):
+        return len(self._classes())
+
+    def reserved(self, label_class):
+        return self._reserved.get(label_class, 0)
+
+    def reset(self):
+        self._reserved = {}
+
+
 class LabelTool(QObject):
     """
     This is the main label tool object.  It stores the state of the tool, i.e.
@@ -55,6 +106,8 @@ class LabelTool(QObject):
     # a derived class instead of a base class, i.e. ImageFileModelItem
     # instead of ModelItem
     currentImageChanged = pyqtSignal()
+    # Emitted with the models that could not be saved and a status message
+    saveFinished = pyqtSignal(object, str)
 
     # TODO clean up --> prefix all members with _
     def __init__(self, parent=None):
@@ -83,7 +136,7 @@ class LabelTool(QObject):
         self._current_image_list = [None] * self.n_view
 
         self.mulcam_mode = True
-        self.max_id_dict = {}
+        self.max_id_dict = MaxIDDict(self)
 
         self._img_width = 0
         self._img_height = 0
@@ -91,11 +144,20 @@ class LabelTool(QObject):
         self._cur_row = -1
 
         self._opened_file_name = None
+        self._save_executor = None
+        self._model_cache = None
+        self._prefetcher = None
+        self._prefetch_row = -1
+        self._decode_executor = None
+        self._thumbnail_stores = []
+        self._thumbnail_executor = None
+        self._thumbnail_cancelled = threading.Event()
+
+        self.saveFinished.connect(self.onSaveFinished)
 
     def updateAnnotations(self, anno, scene_id, factor=1.5):
         if not self._calib:
-            self._img_width = self._mainwindow.annotation_scenes[0]._pixmap.width()
-            self._img_height = self._mainwindow.annotation_scenes[0]._pixmap.height()
+            self._img_width, self._img_height = self._mainwindow.annotation_scenes[0].imageSize()
             self._calib = Calibration(self.n_view, self._img_width, self._img_height)
 
         for scene in self._mainwindow.annotation_scenes:
@@ -241,6 +303,11 @@ class LabelTool(QObject):
 
         # Instatiate container factory
         self._container_factory = AnnotationContainerFactory(config.CONTAINERS)
+        if config.MODEL_CACHE_DIR:
+            self._model_cache = ModelCache(config.MODEL_CACHE_DIR)
+        AnnotationContainer.image_cache.setBudget(config.IMAGE_CACHE_MB)
+        if config.PREFETCH_FRAMES > 0 and config.PREFETCH_WORKERS > 0:
+            self._prefetcher = ImagePrefetcher(config.PREFETCH_WORKERS)
 
     def loadPlugins(self, plugins):
         self._plugins = []
@@ -275,10 +342,13 @@ class LabelTool(QObject):
         anno_file_list = []
 
         for img_dir in img_dir_list:
-            anno_file = os.path.join(anno_dir, img_dir + '.json')
+            # use an existing annotation file in any of the formats
+            anno_files = [os.path.join(anno_dir, img_dir + ext) for ext in config.ANNOTATION_EXTENSIONS]
+            existing = [f for f in anno_files if os.path.isfile(f)]
+            anno_file = existing[0] if existing else anno_files[0]
             anno_file_list.append(anno_file)
 
-            if os.path.isfile(anno_file):
+            if existing:
                 continue
 
             anno_list = []
@@ -289,32 +359,48 @@ class LabelTool(QObject):
                 anno['filename'] = os.path.join('..', img_dir, img_fmt % f_id)
                 anno_list.append(anno)
 
-            with open(anno_file, 'w') as f:
-                json.dump(anno_list, f, indent=4, sort_keys=True)
+            self._container_factory.create(anno_file).save(anno_list, anno_file)
 
         self.camera_names = img_dir_list
 
         return anno_file_list
 
-    def createMaxIDDict(self, anno_file_list):
-        max_id_dict = {}
-        for label in config.LABELS:
-            max_id_dict[label['attributes']['class']] = 0
-
-        for anno_file in anno_file_list:
-            with open(anno_file, 'r') as f:
-                items = json.load(f)
-                for item in items:
-                    if not item['annotations']:
-                        continue
-                    for anno in item['annotations']:
-                        if 'class' in anno and 'ID' in anno:
-                            c = anno['class']
-                            idx = int(anno['ID'])
-                            if c in max_id_dict and idx > max_id_dict[c]:
-                                max_id_dict[c] = idx
+    def maxID(self, label_class, queryFiles=True):
+        """
+        Returns the maximum ID used for the label class in any view.  The
+        statistics of the models keep a running maximum over the annotations
+        read so far.  For the frames which were not read from a lazy source
+        yet, the maximum is looked up in the manifest of a sharded file, or
+        asked from the file if the container can answer it without reading
+        all frames.  Otherwise the rest of the source is read (without
+        creating items), as the maximum is used to assign new IDs.
+
+        If ``queryFiles`` is False, e.g. for display, the files are neither
+        asked nor read, and frames which were not read yet are not taken
+        into account, see maxIDExact().
+        """
+        max_id = self.max_id_dict.reserved(label_class)
+        for model, container in zip(self._model_list, self._container_list):
+            if model is None:
+                continue
+            root = model.root()
+            if queryFiles and root.canFetchMore():
+                if hasattr(container, 'maxID'):
+                    # ask the file for the frames which were not read yet
+                    max_id = max(max_id, container.maxID(label_class, root.rowCount()))
+                else:
+                    root.fetchMore(-1)
+            max_id = max(max_id, model.statistics().maxID(label_class), root.unreadMaxID(label_class))
+        return max_id
 
-        return max_id_dict
+    def maxIDExact(self, queryFiles=True):
+        """
+        Returns True if maxID() takes the annotations of all frames into
+        account, i.e. always if ``queryFiles`` is True, and otherwise only
+        once all frames were read from the lazy sources.
+        """
+        return queryFiles or not any(model.root().canFetchMore()
+                                     for model in self._model_list if model is not None)
 
     def loadAnnotations(self, f_name, handleErrors=True):
         f_name = str(f_name)  # convert from QString
@@ -326,19 +412,55 @@ class LabelTool(QObject):
             print('seq_info json file not exist: {}'.format(f_name))
             exit(0)
         try:
-            anno_file_list = self.createAnnotations(f_name)
-            self.max_id_dict = self.createMaxIDDict(anno_file_list)
+            anno_file_list = self.createAnnotations(f_name)[:self.n_view]
+            self.max_id_dict.reset()
+            missing = self.loadManifest(f_name)
+
+            containers = [self._container_factory.create(anno_file) for anno_file in anno_file_list]
+            cached = [self._loadCached(container, anno_file)
+                      for container, anno_file in zip(containers, anno_file_list)]
+            for i, hit in enumerate(cached):
+                if hit is not None:
+                    annotations, statistics = hit
+                    containers[i].setFilename(anno_file_list[i])
+                    self._container_list[i] = containers[i]
+                    self._model_list[i] = AnnotationModel(
+                        annotations, statistics=AnnotationStatistics.fromIDCounts(statistics['id_counts'],
+                                                                                  statistics['class_counts']))
+            uncached = [i for i, hit in enumerate(cached) if hit is None]
+
+            if config.STREAMING_LOAD:
+                for i in uncached:
+                    self._container_list[i] = containers[i]
+                    self._model_list[i] = AnnotationModel(containers[i].iterate(anno_file_list[i]))
+            else:
+                loaded = self._container_factory.loadAll([anno_file_list[i] for i in uncached], config.LOAD_WORKERS)
+                for i, (container, annotations) in zip(uncached, loaded):
+                    self._container_list[i] = container
+                    self._model_list[i] = AnnotationModel(annotations)
 
-            for i in range(self.n_view):
-                anno_file = anno_file_list[i]
-                self._container_list[i] = self._container_factory.create(anno_file)
-                self._model_list[i] = AnnotationModel(self._container_list[i].load(anno_file))
+            if self._model_cache is not None:
+                for i in uncached:
+                    if self._container_list[i].cacheable:
+                        self._model_cache.rebuild(self._container_list[i], anno_file_list[i])
+
+            for container, model in zip(self._container_list, self._model_list):
+                if container is not None and container.journaled:
+                    model.root().startJournal()
 
             self._container = self._container_list[0]
             self._model = self._model_list[0]
 
-            msg = "Successfully loaded %s (%d files, %d annotations)" % \
-                  (f_name, self._model.root().numFiles(), self._model.root().numAnnotations())
+            if cached[0] is not None:
+                msg = "Successfully loaded %s from cache (%d files, %d annotations)" % \
+                      (f_name, cached[0][1]['files'], cached[0][1]['annotations'])
+            elif self._model.root().hasUnreadFiles():
+                msg = "Successfully opened %s (loading annotations in the background)" % f_name
+            else:
+                msg = "Successfully loaded %s (%d files, %d annotations)" % \
+                      (f_name, self._model.root().numFiles(), self._model.root().numAnnotations())
+            if missing:
+                msg += ", %d image files are missing" % len(missing)
         except Exception as e:
             if handleErrors:
                 msg = "Error: Loading failed (%s)" % str(e)
@@ -348,6 +470,87 @@ class LabelTool(QObject):
         self.statusMessage.emit(msg)
         self.annotationsLoaded.emit()
 
+    def loadManifest(self, seqinfo_filename):
+        """
+        Scan the camera folders of the sequence once for the image files,
+        so that loading the images needs not check each file (see
+        ImageManifest).  Returns the list of missing image files, which are
+        also logged.
+        """
+        AnnotationContainer.image_manifest.clear()
+        try:
+            manifest, missing = ImageManifest.fromSequence(seqinfo_filename, self.n_view)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            LOG.warning("Could not scan the image files of %s (%s)" % (seqinfo_filename, e))
+            return []
+        AnnotationContainer.image_manifest = manifest
+        if missing:
+            shown = "\n  ".join(missing[:50]) + ("\n  ..." if len(missing) > 50 else "")
+            LOG.warning("%d image files of %s are missing:\n  %s" % (len(missing), seqinfo_filename, shown))
+        return missing
+
+    def _loadCached(self, container, filename):
+        if self._model_cache is None or not container.cacheable:
+            return None
+        return self._model_cache.load(filename)
+
+    def _storeCached(self, filename, annotations):
+        # the annotations were saved anyway, so only log failures
+        try:
+            self._model_cache.store(filename, annotations)
+        except Exception as e:
+            LOG.warning("Could not update the cache of %s (%s)" % (filename, e))
+
+    def loadThumbnails(self):
+        """
+        Open the thumbnail files of the cameras of the current sequence and
+        generate the missing thumbnails in the background.
+        """
+        self.stopThumbnails()
+        for store in self._thumbnail_stores:
+            store.close()
+        self._thumbnail_stores = []
+        if not config.THUMBNAIL_SIZE or self._opened_file_name is None:
+            return
+        try:
+            start_frame, cameras = sequenceImages(self._opened_file_name)
+            cameras = cameras[:self.n_view]
+            for image_dir, image_files in cameras:
+                self._thumbnail_stores.append(openThumbnails(thumbnailFilename(image_dir), len(image_files),
+                                                             start_frame, config.THUMBNAIL_SIZE))
+        except (IOError, OSError, ValueError, KeyError) as e:
+            LOG.warning("Could not open the thumbnails of %s (%s)" % (self._opened_file_name, e))
+            self._thumbnail_stores = []
+            return
+
+        self._thumbnail_cancelled = cancelled = threading.Event()
+        if self._thumbnail_executor is None:
+            self._thumbnail_executor = ThreadPoolExecutor(max_workers=1)
+        self._thumbnail_executor.submit(self._buildThumbnails, cameras, start_frame, cancelled)
+
+    def _buildThumbnails(self, cameras, start_frame, cancelled):
+        for image_dir, image_files in cameras:
+            try:
+                buildThumbnails(thumbnailFilename(image_dir), image_files, start_frame, config.THUMBNAIL_SIZE,
+                                config.THUMBNAIL_WORKERS, cancelled=cancelled.is_set)
+            except Exception as e:
+                LOG.warning("Could not generate the thumbnails of %s (%s)" % (image_dir, e))
+            if cancelled.is_set():
+                return
+
+    def stopThumbnails(self):
+        """Stop generating thumbnails after the current batch."""
+        self._thumbnail_cancelled.set()
+
+    def thumbnailStore(self, view=0):
+        """
+        Returns the ThumbnailStore of the camera of the view, or None if
+        there are no thumbnails.
+        """
+        if view < len(self._thumbnail_stores):
+            return self._thumbnail_stores[view]
+        return None
+
     def annotations(self):
         if self._model is None:
             return None
@@ -363,12 +566,27 @@ class LabelTool(QObject):
 
         step = 400
         row_start = int(row / 400) * 400
-        row_end = min(row_start + 400, self._model_list[0].rowCount() - 1)
+        # make sure the whole stamp is available from a lazy source
+        model = self._model_list[0]
+        model.root().fetchMore(max(row_start + 401 - model.rowCount(), 0))
+        row_end = min(row_start + 400, model.rowCount() - 1)
 
         print('start:', row_start, 'end:', row_end)
 
         try:
+            containers = self._container_list[:self.n_view]
+            if any(hasattr(c, 'renameID') for c in containers):
+                # the IDs are changed in the files, which are reloaded below
+                if not self.saveAnnotationList([c.filename() for c in containers], asynchronous=False):
+                    return False
+
             for i in range(self.n_view):
+                if hasattr(self._container_list[i], 'renameID'):
+                    self._container_list[i].renameID(id_orig, id_new, row_start, row_end)
+                    msg = "Successfully saved files."
+                    success = True
+                    continue
+
                 # create new container if the filename is different
                 fname = self._container_list[i].filename()
 
@@ -407,6 +625,9 @@ class LabelTool(QObject):
     def gotoStampIndex(self, idx_stamp):
         step = 400
         row = idx_stamp * 400
+        for model in self._model_list:
+            # make sure frames from a lazy source are available up to the stamp
+            model.root().fetchMore(max(row + 1 - model.rowCount(), 0))
         if row > self._model_list[0].rowCount():
             row = 0
         for i in range(self.n_view):
@@ -416,7 +637,9 @@ class LabelTool(QObject):
     def gotoNextStamp(self):
         step = 400
         cur_row = self._mainwindow.treeview_list[0].currentIndex().row()
-        row = (cur_row / 400 + 1) * 400
+        row = (cur_row // 400 + 1) * 400
+        for model in self._model_list:
+            model.root().fetchMore(max(int(row) + 1 - model.rowCount(), 0))
         if row > self._model_list[0].rowCount():
             row = 0
         for i in range(self.n_view):
@@ -426,10 +649,13 @@ class LabelTool(QObject):
     def gotoPreviousStamp(self):
         step = 400
         cur_row = self._mainwindow.treeview_list[0].currentIndex().row()
-        row = (cur_row - 1) / 400 * 400
+        row = (cur_row - 1) // 400 * 400
         if row < 0:
+            # wrap around to the last stamp of the whole file
+            for model in self._model_list:
+                model.root().fetchMore(-1)
             row = int(max(self._model_list[0].rowCount() - 1, 0))
-            row = row / 400 * 400
+            row = row // 400 * 400
         for i in range(self.n_view):
             self._mainwindow.treeview_list[i].setCurrentIndex(self._model_list[i].index(row, 0))
         self._cur_row = self._mainwindow.treeview_list[0].currentIndex().row()
@@ -442,7 +668,7 @@ class LabelTool(QObject):
                 self._container = self._container_factory.create(fname)
 
             # Get annotations dict
-            ann = self._model.root().getAnnotations()
+            ann = self._model.root().snapshot()
 
             self._container.save(ann, fname)
             # self._model.writeback() # write back changes that are cached in the model itself, e.g. mask updates
@@ -456,30 +682,94 @@ class LabelTool(QObject):
         self.statusMessage.emit(msg)
         return success
 
-    def saveAnnotationList(self, filelist):
-        success = False
+    def saveAnnotationList(self, filelist, asynchronous=None):
+        """
+        Save the annotations of all views.  Only views which were modified
+        or are saved under a new filename are written.  If ``asynchronous``
+        is True (default: the ASYNC_SAVE setting), a snapshot of the models
+        is written in a background thread and the result is reported via
+        statusMessage when done.  For journaled containers only the edits
+        since the last save are appended to the journal, containers which
+        support partial saves only write the modified file items.
+        """
+        if asynchronous is None:
+            asynchronous = config.ASYNC_SAVE
 
+        jobs = []
         try:
             for i, fname in enumerate(filelist):
+                model = self._model_list[i]
+                root = model.root()
                 # create new container if the filename is different
-                if fname != self._container_list[i].filename():
+                new_file = fname != self._container_list[i].filename()
+                if new_file:
                     self._container_list[i] = self._container_factory.create(fname)
-
-                # Get annotations dict
-                ann = self._model_list[i].root().getAnnotations()
-
-                self._container_list[i].save(ann, fname)
-                # self._model.writeback() # write back changes that are cached in the model itself, e.g. mask updates
-                # msg = "Successfully saved %s (%d files, %d annotations)" % \
-                #     (fname, self._model.root().numFiles(), self._model.root().numAnnotations())
-                msg = "Successfully saved files."
-                success = True
-                self._model_list[i].setDirty(False)
+                    root.stopJournal()
+                elif not model.dirty():
+                    # the file already contains the annotations of this view
+                    continue
+
+                container = self._container_list[i]
+                edits = root.takeJournal()
+                rows = model.dirtyRows() if container.partial and not new_file else None
+                if edits is not None and os.path.exists(fname):
+                    jobs.append((model, container, edits, fname, 'journal'))
+                elif rows is not None and os.path.exists(fname):
+                    jobs.append((model, container, root.snapshotRows(rows), fname, 'rows'))
+                else:
+                    # Edits after the snapshot make the model dirty again
+                    ann = root.snapshot()
+                    jobs.append((model, container, ann, fname, 'full'))
+                    if container.journaled:
+                        root.startJournal()
+                model.setDirty(False)
         except Exception as e:
-            msg = "Error: Saving failed (%s)" % str(e)
-
+            self.onSaveFinished([job[0] for job in jobs], "Error: Saving failed (%s)" % str(e))
+            return False
+
+        if not jobs:
+            self.statusMessage.emit("No changes to save.")
+            return True
+
+        if asynchronous:
+            if self._save_executor is None:
+                # a single thread, so that saves of the same file cannot overlap
+                self._save_executor = ThreadPoolExecutor(max_workers=1)
+            self._save_executor.submit(self._writeSnapshots, jobs, len(filelist))
+            self.statusMessage.emit("Saving %d of %d files in the background..." % (len(jobs), len(filelist)))
+            return True
+        return self._writeSnapshots(jobs, len(filelist))
+
+    def _writeSnapshots(self, jobs, n_files):
+        failed = []
+        errors = []
+        for model, container, ann, fname, mode in jobs:
+            try:
+                if mode == 'journal':
+                    container.appendEdits(ann, fname)
+                elif mode == 'rows':
+                    container.saveRows(ann, fname)
+                else:
+                    container.save(ann, fname)
+                    if self._model_cache is not None and container.cacheable:
+                        self._storeCached(fname, ann)
+            except Exception as e:
+                failed.append(model)
+                errors.append("%s: %s" % (os.path.basename(fname), str(e)))
+
+        if failed:
+            msg = "Error: Saving failed (%s)" % ", ".join(errors)
+        else:
+            msg = "Successfully saved %d of %d files." % (len(jobs), n_files)
+        self.saveFinished.emit(failed, msg)
+        return not failed
+
+    def onSaveFinished(self, failed_models, msg):
+        for model in failed_models:
+            # the journal might be incomplete now, so write the whole file next time
+            model.root().stopJournal()
+            model.setAllRowsDirty()
         self.statusMessage.emit(msg)
-        return success
 
     def clearAnnotations(self):
         self._model = AnnotationModel([])
@@ -506,6 +796,39 @@ class LabelTool(QObject):
     def modelList(self):
         return self._model_list
 
+    def numAnnotations(self, view=None, label_class=None):
+        """
+        The number of annotations (of the label class) of the view, or of
+        all views.  Taken from the statistics which the models keep up to
+        date, without creating any model items.  Annotations which were not
+        read from a lazy source yet are not counted, see countsComplete().
+        """
+        models = self._model_list if view is None else [self._model_list[view]]
+        return sum(model.root().numAnnotations(label_class) for model in models if model is not None)
+
+    def classCounts(self, view=None):
+        """
+        Returns a dict mapping the label classes to their number of
+        annotations in the view, or in all views.
+        """
+        counts = {}
+        models = self._model_list if view is None else [self._model_list[view]]
+        for model in models:
+            if model is None:
+                continue
+            for label_class, count in model.root().classCounts().items():
+                counts[label_class] = counts.get(label_class, 0) + count
+        return counts
+
+    def countsComplete(self, view=None):
+        """
+        Returns True if numAnnotations() and classCounts() of the view, or
+        of all views, cover all annotations, and False while they are still
+        being read from a lazy source.
+        """
+        models = self._model_list if view is None else [self._model_list[view]]
+        return all(model.root().countsComplete() for model in models if model is not None)
+
     def gotoIndexList(self, idx):
         next_image_list = []
 
@@ -595,6 +918,9 @@ class LabelTool(QObject):
             column = image_list.column()
             image_list = []
             for model in self._model_list:
+                # the views fetch from their lazy sources independently, so
+                # the row may not be available in the other views yet
+                model.root().fetchMore(max(row + 1 - model.rowCount(), 0))
                 index = model.index(row, column)
                 item = model.itemFromIndex(index)
                 image_list.append(item)
@@ -611,14 +937,110 @@ class LabelTool(QObject):
             if new_image != self._current_image_list[i]:
                 self._current_image_list[i] = new_image
 
+        # the current images are decoded first, without competing prefetches
+        if self._prefetcher is not None:
+            self._prefetcher.cancel()
         self.currentImageChanged.emit()
+        self.prefetchImages()
+
+    def prefetchImages(self):
+        """
+        Decode the images of the frames around the current one into the
+        image cache in the background, for all views.  PREFETCH_FRAMES
+        frames are prefetched in the direction in which the user moved
+        last, and a quarter as many in the opposite direction.
+        """
+        current = self._current_image_list[0]
+        if self._prefetcher is None or current is None or not isinstance(current.parent(), RootModelItem):
+            return
+        row = current.row()
+        step = -1 if row < self._prefetch_row else 1
+        self._prefetch_row = row
 
-    def getImage(self, item):
+        # the images are prefetched at the resolution they are displayed at
+        if self._mainwindow is not None:
+            reductions = [scene.displayReduction() for scene in self._mainwindow.annotation_scenes]
+        else:
+            reductions = [1] * self.n_view
+
+        ahead = [row + step * k for k in range(1, config.PREFETCH_FRAMES + 1)]
+        behind = [row - step * k for k in range(1, max(1, config.PREFETCH_FRAMES // 4) + 1)]
+        jobs = []
+        for r in ahead + behind:
+            for i in range(self.n_view):
+                root = self._model_list[i].root()
+                # frames which were not fetched from a lazy source yet are skipped
+                if not 0 <= r < root.rowCount():
+                    continue
+                fileinfo = root.fileInfoAt(r)
+                # resolved like in getImage()
+                if fileinfo['class'] == 'image':
+                    jobs.append((self._container, fileinfo['filename'], reductions[i]))
+        self._prefetcher.prefetch(jobs)
+
+    def getImage(self, item, reduce=1):
+        """
+        Returns the image of the item.  Images (but not frames of videos) may
+        be returned at a resolution reduced by up to ``reduce``, see
+        AnnotationContainer.loadImage().
+        """
         if item['class'] == 'frame':
             video = item.parent()
             return self._container.loadFrame(video['filename'], item['num'])
         else:
-            return self._container.loadImage(item['filename'])
+            return self._container.loadImage(item['filename'], reduce)
+
+    def getImageSize(self, item):
+        """
+        Returns the full resolution (width, height) of the image of the item,
+        or None if it is not known without decoding the image.
+        """
+        if item['class'] == 'frame':
+            return None
+        return self._container.imageSize(item['filename'])
+
+    def getImageAsync(self, item, reduce=1):
+        """
+        Like getImage(), but decodes the image in a background thread.
+        Returns a concurrent.futures.Future of the image.  Frames of videos
+        must be loaded with getImage().
+        """
+        if self._decode_executor is None:
+            self._decode_executor = ThreadPoolExecutor(max_workers=max(1, self.n_view),
+                                                       thread_name_prefix="decode")
+        return self._decode_executor.submit(self.getImage, item, reduce)
+
+    def isImageCached(self, item, reduce=1):
+        """
+        Whether the image of the item is available without decoding it
+        (at a resolution reduced by up to ``reduce``).
+        """
+        if item['class'] == 'frame':
+            return False
+        return self._container.isImageCached(item['filename'], reduce)
+
+    def canDraftImage(self, item):
+        """
+        Whether the image of the item can be decoded at a reduced resolution
+        much faster than at full resolution.
+        """
+        return item['class'] != 'frame' and self._container.canDraft(item['filename'])
+
+    def getImages(self, items, reductions=None):
+        """
+        Returns the images of the items, e.g. of the current images of all
+        views, reduced by up to the factors in ``reductions``.  Images are
+        decoded concurrently, frames of videos one after another.  The images
+        of items which are None are None.
+        """
+        if reductions is None:
+            reductions = [1] * len(items)
+        futures = [self.getImageAsync(item, reduce)
+                   if item is not None and item['class'] != 'frame' else None
+                   for item, reduce in zip(items, reductions)]
+        return [future.result() if future is not None else
+                self.getImage(item) if item is not None else None
+                for item, future in zip(items, futures)]
 
     def getImageList(self, item):
         for container in self._container_list:
@@ -1,4 +1,9 @@
+import gc
 import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from sloth.core import exceptions
 
 
@@ -20,3 +25,36 @@ def import_callable(module_path_name):
         raise exceptions.ImproperlyConfigured('Module "%s" does not define a "%s" callable' % (module_path, name))
 
     return item_callable
+
+
+def process_pool_executor(max_workers=None):
+    """
+    Create a ProcessPoolExecutor whose worker processes are started with
+    the ``spawn`` method.  Forking the label tool, which runs threads of its
+    own (e.g. the image prefetcher and the asynchronous saving), can copy a
+    lock held by one of them into the child, where it is never released.
+    The work function must be defined at module level, and it and its
+    arguments must be picklable.  The workers import the main module of
+    the program, so scripts need an ``if __name__ == '__main__'`` guard.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def replace_file(src, dst, attempts=5, delay=0.05):
+    """
+    Rename ``src`` to ``dst`` with os.replace(), replacing ``dst``.  On
+    Windows this fails with PermissionError while ``dst`` is open or
+    memory-mapped, also in another process (e.g. a virus scanner).  The
+    rename is retried a few times then, after collecting the garbage to
+    release maps which are no longer referenced, before the error is
+    raised.
+    """
+    for attempt in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            gc.collect()
+            time.sleep(delay * 2 ** attempt)
@@ -2,7 +2,7 @@
 from sloth.items import *
 from sloth.core.exceptions import InvalidArgumentException
 from sloth.annotations.model import AnnotationModelItem
-from sloth.utils import toQImage
+from sloth.utils import toQPixmap
 from sloth.conf import config
 import logging
 
@@ -11,6 +11,8 @@ LOG = logging.getLogger(__name__)
 
 class AnnotationScene(QGraphicsScene):
     mousePositionChanged = pyqtSignal(float, float)
+    # emitted from a background thread when an image was decoded
+    imageLoaded = pyqtSignal(object, object, int)
 
     def __init__(self, labeltool, items=None, inserters=None, parent=None):
         super(AnnotationScene, self).__init__(parent)
@@ -19,12 +21,19 @@ class AnnotationScene(QGraphicsScene):
         self._image_item = None
         self._inserter = None
         self._scene_item = None
+        self._image = None
+        self._pixmap = None
+        self._image_size = None
+        self._reduce = 1
+        self._pending = None
+        self._pending_reduce = 1
         self._message = ""
         self._labeltool = labeltool
         self._index = -1
 
         self._itemfactory = Factory(items)
         self._inserterfactory = Factory(inserters)
+        self.imageLoaded.connect(self.onImageLoaded)
 
         try:
             self.setBackgroundBrush(config.SCENE_BACKGROUND)
@@ -72,19 +81,107 @@ class AnnotationScene(QGraphicsScene):
     def sceneItem(self):
         return self._scene_item
 
-    def setCurrentImage(self, current_image, keepAnnos=False):
+    def currentImage(self):
+        return self._image_item
+
+    def image(self):
+        """
+        The displayed image, which may have a reduced resolution (see
+        displayReduction()).
+        """
+        return self._image
+
+    def imageSize(self):
+        """The full resolution (width, height) of the current image."""
+        return self._image_size
+
+    def displayReduction(self):
+        """
+        Returns the largest power of two (up to MAX_DISPLAY_REDUCTION) by
+        which the image can be reduced without losing detail in the views
+        of the scene at their current zoom.
+        """
+        scale = max([view.getScale() * view.devicePixelRatioF() for view in self.views()] or [1])
+        reduce = 1
+        while reduce * 2 <= config.MAX_DISPLAY_REDUCTION and reduce * 2 * scale <= 1:
+            reduce *= 2
+        return reduce
+
+    def updateResolution(self, scale=None):
+        """
+        Reload the current image at a higher resolution in the background if
+        the displayed image has a lower resolution than the views need, e.g.
+        if it is a placeholder or a view was zoomed in.  The annotations can
+        be edited meanwhile, the pixmap is replaced when the image was
+        decoded.
+        """
+        if self._image_item is None or self._reduce == 1:
+            return
+        reduce = self.displayReduction()
+        if reduce >= self._reduce or (self._pending is not None and self._pending_reduce <= reduce):
+            return
+        if self._image_item['class'] == 'frame':
+            self._setImage(self._labeltool.getImage(self._image_item, reduce))
+            return
+        self._cancelPendingImage()
+        item = self._image_item
+        self._pending = self._labeltool.getImageAsync(item, reduce)
+        self._pending_reduce = reduce
+        self._pending.add_done_callback(lambda future: self._emitImageLoaded(item, reduce, future))
+
+    def _emitImageLoaded(self, item, reduce, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            LOG.warning("Could not load image %s (%s)" % (item['filename'], error))
+            return
+        self.imageLoaded.emit(item, future.result(), reduce)
+
+    def onImageLoaded(self, item, image, reduce):
+        if item is not self._image_item or reduce != self._pending_reduce:
+            return
+        self._pending = None
+        if image is not None and reduce < self._reduce:
+            self._setImage(image)
+
+    def _cancelPendingImage(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def _setImage(self, image):
+        # The pixmap item is scaled to the full resolution of the image, so
+        # that the scene coordinates are image coordinates at full resolution
+        self._image = image
+        self._pixmap = toQPixmap(image)
+        self._scene_item.setPixmap(self._pixmap)
+        width, height = self._pixmap.width(), self._pixmap.height()
+        size = self._labeltool.getImageSize(self._image_item)
+        if size is None or width == 0 or height == 0:
+            size = width, height
+        self._image_size = size
+        self._reduce = max(1, int(round(float(size[0]) / width))) if width else 1
+        self._scene_item.setTransform(QTransform.fromScale(float(size[0]) / width, float(size[1]) / height)
+                                      if self._reduce > 1 else QTransform())
+
+    def setCurrentImage(self, current_image, keepAnnos=False, image=None):
         """
         Set the index of the model which denotes the current image to be
         displayed by the scene.  This can be either the index to a frame in a
-        video, or to an image.
+        video, or to an image.  The decoded ``image`` can be passed in if it
+        was loaded already, otherwise it is loaded through the labeltool.
         """
         if current_image == self._image_item:
             return
-        elif current_image is None:
+        self._cancelPendingImage()
+        if current_image is None:
             self.clear()
             self._image_item = None
             self._image = None
             self._pixmap = None
+            self._image_size = None
+            self._reduce = 1
         else:
             self.clear()
 
@@ -96,11 +193,12 @@ class AnnotationScene(QGraphicsScene):
 
             self._image_item = current_image
             # assert self._image_item.model() == self._model
-            self._image = self._labeltool.getImage(self._image_item)
-            self._pixmap = QPixmap(toQImage(self._image))
-            self._scene_item = QGraphicsPixmapItem(self._pixmap)
+            if image is None:
+                image = self._labeltool.getImage(self._image_item, self.displayReduction())
+            self._scene_item = QGraphicsPixmapItem()
             self._scene_item.setZValue(-1)
-            self.setSceneRect(0, 0, self._pixmap.width(), self._pixmap.height())
+            self._setImage(image)
+            self.setSceneRect(0, 0, self._image_size[0], self._image_size[1])
             self.addItem(self._scene_item)
 
             if keepAnnos and confirmed:
@@ -108,10 +206,10 @@ class AnnotationScene(QGraphicsScene):
                 # self.onInsertionModeStarted(label_class = 'Vehicle')
 
                 if cur_annos is not None and len(cur_annos) == 0 and last_anns is not None and len(last_anns) > 0:
-                    for ann in last_anns:
-                        self._image_item.addAnnotation(ann)
-                        # self._inserter.insertRect(ann, self._image_item)
+                    self._image_item.addAnnotations(last_anns)
+                    # self._inserter.insertRect(ann, self._image_item)
                 elif cur_annos is not None and len(cur_annos) > 0 and last_anns is not None and len(last_anns) > 0:
+                    new_anns = []
                     for ann in last_anns:
                         flag = True
                         for ann_cur in cur_annos:
@@ -119,12 +217,13 @@ class AnnotationScene(QGraphicsScene):
                                 flag = False
                                 break
                         if flag:
-                            self._image_item.addAnnotation(ann)
+                            new_anns.append(ann)
                             # self._inserter.insertRect(ann, self._image_item)
 
                             # self.onInserterFinished()
+                    self._image_item.addAnnotations(new_anns)
 
-            self.insertItems(0, len(self._image_item.children()) - 1)
+            self.insertItems(0, self._image_item.rowCount() - 1)
             self.update()
 
     def updateAnnotations(self, anno):
@@ -171,8 +270,14 @@ class AnnotationScene(QGraphicsScene):
         # therefore we need to determine the unique set of model items first
         # must use a dict for hashing instead of a set, because objects are not hashable
         modelitems_to_delete = dict((id(item.modelItem()), item.modelItem()) for item in self.selectedItems())
+        # delete the items of each parent at once
+        children = {}
         for item in modelitems_to_delete.values():
-            item.delete()
+            if item.parent() is None:
+                raise RuntimeError("Trying to delete orphan")
+            children.setdefault(id(item.parent()), (item.parent(), []))[1].append(item)
+        for parent, items in children.values():
+            parent.deleteChildren(items)
 
     def deleteItemsByID(self, idx):
         return
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.Qt import *
+
+
+class Filmstrip(QWidget):
+    """
+    Horizontal strip of the thumbnails of the frames of a sequence, read
+    from a ThumbnailStore.  Clicking a thumbnail emits rowClicked with the
+    row of the frame.  Thumbnails which are still being generated are
+    shown as soon as they are available.
+    """
+    rowClicked = pyqtSignal(int)
+
+    SPACING = 4
+    # Number of decoded thumbnails kept in memory
+    CACHE_SIZE = 1024
+
+    def __init__(self, parent=None):
+        QWidget.__init__(self, parent)
+        self._store = None
+        self._current = -1
+        self._pixmaps = OrderedDict()
+        self._incomplete = False
+
+        self._scrollbar = QScrollBar(Qt.Horizontal, self)
+        self._scrollbar.valueChanged.connect(self.update)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addStretch()
+        layout.addWidget(self._scrollbar)
+        self.setLayout(layout)
+        self.setMinimumHeight(60)
+
+        # repaint while visible thumbnails are missing
+        self._timer = QTimer(self)
+        self._timer.setInterval(1000)
+        self._timer.timeout.connect(self.update)
+
+    def setStore(self, store):
+        self._store = store
+        self._pixmaps.clear()
+        self._current = -1
+        self._scrollbar.setValue(0)
+        self._updateScrollbar()
+        self.update()
+
+    def store(self):
+        return self._store
+
+    def setCurrentRow(self, row):
+        """Highlight the thumbnail of ``row`` and scroll to it if it is not visible."""
+        self._current = row
+        first = self._scrollbar.value()
+        visible = self._visibleCount()
+        if not first <= row < first + visible:
+            self._scrollbar.setValue(row - visible // 2)
+        self.update()
+
+    def _cellSize(self):
+        # thumbnails are scaled to the height of the strip
+        height = max(1, self.height() - self._scrollbar.height() - 2 * self.SPACING)
+        width, thumb_height = self._store.size()
+        return int(width * float(height) / thumb_height) + self.SPACING, height
+
+    def _visibleCount(self):
+        if self._store is None:
+            return 0
+        return max(1, self.width() // self._cellSize()[0])
+
+    def _updateScrollbar(self):
+        count = len(self._store) if self._store is not None else 0
+        visible = self._visibleCount()
+        self._scrollbar.setRange(0, max(0, count - visible))
+        self._scrollbar.setPageStep(visible)
+
+    def _pixmap(self, row):
+        pixmap = self._pixmaps.get(row)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(row)
+            return pixmap
+        data = self._store.thumbnail(row)
+        if data is None:
+            return None
+        pixmap = QPixmap()
+        pixmap.loadFromData(bytes(data), 'JPEG')
+        self._pixmaps[row] = pixmap
+        if len(self._pixmaps) > self.CACHE_SIZE:
+            self._pixmaps.popitem(last=False)
+        return pixmap
+
+    def rowAt(self, x):
+        if self._store is None:
+            return -1
+        row = self._scrollbar.value() + x // self._cellSize()[0]
+        return row if row < len(self._store) else -1
+
+    def paintEvent(self, event):
+        if self._store is None:
+            return
+        painter = QPainter(self)
+        cell_width, height = self._cellSize()
+        first = self._scrollbar.value()
+        self._incomplete = False
+        for k in range(self._visibleCount() + 1):
+            row = first + k
+            if row >= len(self._store):
+                break
+            rect = QRect(k * cell_width, self.SPACING, cell_width - self.SPACING, height)
+            pixmap = self._pixmap(row)
+            if pixmap is None:
+                self._incomplete = True
+                painter.fillRect(rect, Qt.darkGray)
+                painter.drawText(rect, Qt.AlignCenter, str(self._store.startFrame() + row))
+            else:
+                scaled = pixmap.size().scaled(rect.size(), Qt.KeepAspectRatio)
+                target = QRect(QPoint(0, 0), scaled)
+                target.moveCenter(rect.center())
+                painter.drawPixmap(target, pixmap)
+            if row == self._current:
+                painter.setPen(QPen(Qt.red, 3))
+                painter.drawRect(rect)
+        painter.end()
+        if self._incomplete and not self._timer.isActive():
+            self._timer.start()
+        elif not self._incomplete:
+            self._timer.stop()
+
+    def resizeEvent(self, event):
+        self._updateScrollbar()
+        QWidget.resizeEvent(self, event)
+
+    def mousePressEvent(self, event):
+        row = self.rowAt(event.x())
+        if event.button() == Qt.LeftButton and row >= 0:
+            self.rowClicked.emit(row)
+            event.accept()
+        else:
+            QWidget.mousePressEvent(self, event)
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() // 120 or event.angleDelta().x() // 120
+        self._scrollbar.setValue(self._scrollbar.value() - steps * max(1, self._visibleCount() // 2))
+        event.accept()
@@ -173,6 +173,7 @@ class SingleFrameViewer(FrameViewer):
         self.scene = annotation_scene
         self.scene_view = GraphicsView()
         self.scene_view.setScene(self.scene)
+        self.scene_view.scaleChanged.connect(self.scene.updateResolution)
         self.scene_view.activate()
         self.layout = QHBoxLayout(self)
         self.layout.addWidget(self.scene_view)
@@ -193,6 +194,7 @@ class MultiFrameEqualViewer(FrameViewer):
             scene_view = GraphicsView()
             scene_view.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
             scene_view.setScene(scene)
+            scene_view.scaleChanged.connect(scene.updateResolution)
             scene_view.focusIn.connect(self.activateFocusedSceneView)
             self.scene_views.append(scene_view)
         n_rows = math.ceil(math.sqrt(len(self.scene_views)))
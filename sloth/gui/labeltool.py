@@ -12,7 +12,7 @@ import math
 
 from PyQt5.QtWidgets import QMainWindow, QSizePolicy, QWidget, QVBoxLayout, QGridLayout, QAction, QKeySequenceEdit, \
     QLabel, QItemDelegate, QMessageBox, QFileDialog, QFrame, QDockWidget, QProgressBar
-from PyQt5.QtCore import QSettings, QSize, QPoint, QVariant, QFileInfo, QTimer, pyqtSignal, QObject
+from PyQt5.QtCore import Qt, QSettings, QSize, QPoint, QVariant, QFileInfo, QTimer, pyqtSignal, QObject
 from PyQt5.Qt import QItemSelectionModel, QKeySequence
 import PyQt5.uic as uic
 
@@ -21,6 +21,7 @@ from sloth.gui.propertyeditor import PropertyEditor
 from sloth.gui.annotationscene import AnnotationScene
 from sloth.gui.frameviewer import GraphicsView, MultiFrameEqualViewer
 from sloth.gui.controlbuttons import ControlButtonWidget
+from sloth.gui.filmstrip import Filmstrip
 from sloth.conf import config
 from sloth.core.utils import import_callable
 from sloth.annotations.model import AnnotationTreeView, FrameModelItem, ImageFileModelItem
@@ -35,10 +36,17 @@ LOG = logging.getLogger(__name__)
 class BackgroundLoader(QObject):
     finished = pyqtSignal()
 
-    def __init__(self, model, statusbar, progress):
+    def __init__(self, models, statusbar, progress):
+        """
+        The file infos of all ``models`` which are read from a lazy source
+        are fetched first, a batch per call of load(), so that their
+        statistics are complete.  Then the items of the first model are
+        created level by level.
+        """
         QObject.__init__(self)
         self._max_levels = 3
-        self._model = model
+        self._models = [model for model in models if model is not None]
+        self._model = self._models[0]
         self._statusbar = statusbar
         self._message_displayed = False
         self._progress = progress
@@ -47,15 +55,27 @@ class BackgroundLoader(QObject):
         self._progress.setMaximumWidth(150)
 
         self._level = 1
-        self._iterator = self._model.iterator(maxlevels=self._level)
+        self._iterator = None
         self._pos = 0
-        self._rows = self._model.root().rowCount() + 1
+        self._rows = 0
         self._next_rows = 0
 
+    def _fetch(self):
+        for model in self._models:
+            if model.root().canFetchMore():
+                model.root().fetchMore()
+                return True
+        return False
+
     def load(self):
         if not self._message_displayed:
             self._statusbar.showMessage("Loading annotations...", 5000)
             self._message_displayed = True
+        if self._fetch():
+            return
+        if self._iterator is None:
+            self._iterator = self._model.iterator(maxlevels=self._level)
+            self._rows = self._model.root().rowCount() + 1
         if self._level <= self._max_levels and self._rows > 0:
             try:
                 item = next(self._iterator)
@@ -127,7 +147,11 @@ class MainWindow(QMainWindow):
         repeated_id = list(set(repeated_id))
 
         id_str = 'Current ID: ' + str(id_list)[1:-1] + '. ' + \
-                 'Max ID: ' + str(self.labeltool.max_id_dict['Vehicle']) + '.'
+                 'Max ID: ' + str(self.labeltool.maxID('Vehicle', queryFiles=False))
+        if not self.labeltool.maxIDExact(queryFiles=False):
+            # frames are still being read in the background
+            id_str += ' (loading)'
+        id_str += '.'
         if repeated_id:
             id_str += ' Repeated ID: ' + str(repeated_id)[1:-1] + '.'
 
@@ -135,7 +159,7 @@ class MainWindow(QMainWindow):
 
     def startBackgroundLoading(self):
         self.stopBackgroundLoading(forced=True)
-        self.loader = BackgroundLoader(self.labeltool.model(), self.statusBar(), self.sb_progress)
+        self.loader = BackgroundLoader(self.labeltool.modelList(), self.statusBar(), self.sb_progress)
         self.idletimer.timeout.connect(self.loader.load)
         self.loader.finished.connect(self.stopBackgroundLoading)
         self.statusBar().addWidget(self.sb_progress)
@@ -172,20 +196,37 @@ class MainWindow(QMainWindow):
             self.annotation_scenes[i].setModel(model)
         self.startBackgroundLoading()
 
+        self.labeltool.loadThumbnails()
+        self.filmstrip.setStore(self.labeltool.thumbnailStore())
+
         self.updateStatusBar()
 
     def onCurrentImageListChanged(self):
         new_image_list = self.labeltool.currentImageList()
 
+        # decode the images of all views at once, except the unchanged ones,
+        # at the resolution they are displayed at.  Images which are not
+        # cached are shown as a quickly decoded placeholder first, and
+        # replaced when they were decoded in the background.
+        items = [new_image if new_image != scene.currentImage() else None
+                 for scene, new_image in zip(self.annotation_scenes, new_image_list)]
+        reductions = [scene.displayReduction() for scene in self.annotation_scenes]
+        for i, item in enumerate(items):
+            if item is not None and config.PLACEHOLDER_REDUCTION > reductions[i] \
+                    and not self.labeltool.isImageCached(item, reductions[i]) \
+                    and self.labeltool.canDraftImage(item):
+                reductions[i] = config.PLACEHOLDER_REDUCTION
+        images = self.labeltool.getImages(items, reductions)
         for i, new_image in enumerate(new_image_list):
-            self.annotation_scenes[i].setCurrentImage(new_image, self.labeltool._keepAnnos)
+            self.annotation_scenes[i].setCurrentImage(new_image, self.labeltool._keepAnnos, images[i])
+            self.annotation_scenes[i].updateResolution()
 
         self.onFitToWindowModeChanged()
 
         index = self.view.active_scene_view
         self.treeview.scrollTo(new_image_list[index].index())
 
-        img = self.labeltool.getImageList(new_image_list[0])
+        img = self.annotation_scenes[0].image()
 
         if img is None:
             self.controls.setFilename("")
@@ -193,8 +234,7 @@ class MainWindow(QMainWindow):
                                                 QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows)
             return
 
-        h = img.shape[0]
-        w = img.shape[1]
+        w, h = self.annotation_scenes[0].imageSize()
         self.image_resolution.setText("%dx%d" % (w, h))
         self.labeltool._img_width = w
         self.labeltool._img_height = h
@@ -208,9 +248,19 @@ class MainWindow(QMainWindow):
 
         self.selectionmodel.setCurrentIndex(new_image.index(),
                                             QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows)
+        if isinstance(new_image, ImageFileModelItem):
+            self.filmstrip.setCurrentRow(new_image.row())
 
         self.updateStatusBar()
 
+    def onFilmstripRowClicked(self, row):
+        models = self.labeltool.modelList()
+        for model in models:
+            # make sure frames from a lazy source are available up to the row
+            model.root().fetchMore(max(row + 1 - model.rowCount(), 0))
+        if row < models[0].rowCount():
+            self.labeltool.setCurrentImageList(models[0].index(row, 0))
+
     def onFitToWindowModeChanged(self):
         if self.options["Fit-to-window mode"].isChecked():
             for view in self.view.scene_views:
@@ -311,6 +361,14 @@ class MainWindow(QMainWindow):
         self.treeview = self.treeview_list[0]
         self.ui.dockAnnotations.setWidget(self.treeview)
 
+        # Filmstrip of the first view
+        self.filmstrip = Filmstrip()
+        self.filmstrip.rowClicked.connect(self.onFilmstripRowClicked)
+        self.dockFilmstrip = QDockWidget("Filmstrip", self)
+        self.dockFilmstrip.setObjectName("dockFilmstrip")
+        self.dockFilmstrip.setWidget(self.filmstrip)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.dockFilmstrip)
+
         self.idinfo = QLabel()
         self.idinfo.setFrameStyle(QFrame.StyledPanel)
         self.statusBar().addPermanentWidget(self.idinfo)
@@ -338,6 +396,7 @@ class MainWindow(QMainWindow):
         # View menu
         self.ui.menu_Views.addAction(self.ui.dockProperties.toggleViewAction())
         self.ui.menu_Views.addAction(self.ui.dockAnnotations.toggleViewAction())
+        self.ui.menu_Views.addAction(self.dockFilmstrip.toggleViewAction())
 
         # Show the UI.  It is important that this comes *after* the above 
         # adding of custom widgets, especially the central widget.  Otherwise the
@@ -519,6 +578,7 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         if self.okToContinue():
             self.saveApplicationSettings()
+            self.labeltool.stopThumbnails()
         else:
             event.ignore()
 
@@ -7,30 +7,75 @@ from PyQt5.Qt import *
 from sloth.core.exceptions import NotImplementedException
 
 
-gray_color_table = [qRgb(i, i, i) for i in range(256)]
-
-
-def toQImage(im, copy=False):
-    if im is None:
-        return QImage()
+def _qimageFormat(im):
+    """
+    Returns the image (converted to 8 bit if Qt cannot represent its bit
+    depth) and the QImage format matching its memory layout.
+    """
+    if im.dtype == np.uint16:
+        if len(im.shape) == 2 and hasattr(QImage, 'Format_Grayscale16'):
+            return im, QImage.Format_Grayscale16
+        # keep the 8 most significant bits
+        im = (im >> 8).astype(np.uint8)
 
     if im.dtype == np.uint8:
         if len(im.shape) == 2:
-            qim = QImage(im.data, im.shape[1], im.shape[0], im.strides[0], QImage.Format_Indexed8)
-            qim.setColorTable(gray_color_table)
-            return qim.copy() if copy else qim
-
+            return im, QImage.Format_Grayscale8
         elif len(im.shape) == 3:
+            if im.shape[2] == 1:
+                return im[:, :, 0], QImage.Format_Grayscale8
             if im.shape[2] == 3:
-                qim = QImage(im.data, im.shape[1], im.shape[0], im.strides[0], QImage.Format_RGB888)
-                return qim.copy() if copy else qim
+                return im, QImage.Format_RGB888
             elif im.shape[2] == 4:
-                qim = QImage(im.data, im.shape[1], im.shape[0], im.strides[0], QImage.Format_ARGB32)
-                return qim.copy() if copy else qim
+                # bytes in memory are R, G, B, A, independent of the byte order
+                return im, QImage.Format_RGBA8888
     raise NotImplementedException('no conversion to QImage implemented for given image type (depth: %s, shape: %s)' %
                                   (im.dtype, im.shape))
 
 
+def toQImage(im, copy=False):
+    """
+    Convert a numpy image (gray, RGB or RGBA with 8 or 16 bit per channel)
+    into a QImage.
+
+    Unless ``copy`` is True, the QImage uses the memory of the numpy array
+    (or of its 8 bit version), which is kept alive as long as the returned
+    QImage object.  Copies of the QImage made by Qt (e.g. when it is
+    assigned in C++) do not keep the array alive, so ``copy`` should be
+    True if the QImage is kept around.
+    """
+    if im is None:
+        return QImage()
+
+    im, fmt = _qimageFormat(im)
+    # QImage needs contiguous pixels in each row
+    im = np.ascontiguousarray(im)
+    qim = QImage(im.data, im.shape[1], im.shape[0], im.strides[0], fmt)
+    if copy:
+        return qim.copy()
+    qim.ndarray = im
+    return qim
+
+
+def toQPixmap(im):
+    """
+    Convert a numpy image (see toQImage()) into a QPixmap.  The pixels are
+    converted into the pixmap's format directly from the memory of the
+    array, without intermediate copies, and the pixmap never refers to the
+    memory of the array.
+    """
+    if im is None:
+        return QPixmap()
+    qim = toQImage(im)
+    pixmap = QPixmap.fromImage(qim)
+    # Pixmaps may share the memory of images which are in their native
+    # format already, which would be freed with the array
+    bits = pixmap.toImage().constBits()
+    if bits is not None and int(bits) == qim.ndarray.ctypes.data:
+        pixmap = QPixmap.fromImage(qim.copy())
+    return pixmap
+
+
 def gen_colors(s=0.99, v=0.99, h=None, color_space='rgb', _golden_ratio_conjugate=0.618033988749895):
     """A generator for random colors such that adjacent colors are as distinct as possible.
 
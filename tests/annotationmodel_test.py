@@ -0,0 +1,303 @@
+from sloth.annotations.model import *
+
+
+def someFiles(n):
+    return [{'class': 'image',
+             'filename': 'dir\\frame%05d.jpg' % i,
+             'annotations': [{'class': 'Vehicle', 'ID': i, 'x': 10, 'y': 20,
+                              'width': 30, 'height': 40}]}
+            for i in range(n)]
+
+
+def test_lazy_source():
+    consumed = []
+
+    def source():
+        for fi in someFiles(200):
+            consumed.append(fi)
+            yield fi
+
+    model = AnnotationModel(source())
+    root = model.root()
+    assert len(consumed) == 1
+    assert root.canFetchMore()
+    assert root.childAt(0)['filename'] == 'dir\\frame00000.jpg'
+    assert root.childAt(0).data(Qt.DisplayRole, 0) == 'frame00000.jpg'
+
+    root.childAt(100)
+    assert 101 <= len(consumed) < 200
+    assert not model.dirty()
+
+    # counting does not read the rest of the source
+    n_files = root.numFiles()
+    assert 101 <= n_files < 200 and len(consumed) == n_files
+    assert root.numAnnotations() == n_files
+    assert not root.countsComplete()
+
+    root.fetchAll()
+    assert not root.canFetchMore()
+    assert root.countsComplete()
+    assert root.numFiles() == 200
+    assert root.numAnnotations() == 200
+    assert not model.dirty()
+
+
+def test_lazy_source_matches_list():
+    model1 = AnnotationModel(iter(someFiles(10)))
+    model2 = AnnotationModel(someFiles(10))
+    assert model1.root().getAnnotations() == model2.root().getAnnotations()
+
+
+def test_statistics():
+    files = someFiles(5)
+    files[3]['annotations'].append({'class': 'Pedestrian', 'ID': 7})
+    model = AnnotationModel(iter(files))
+    statistics = model.statistics()
+    assert statistics.maxID('Vehicle') == 0
+    model.root().fetchMore(-1)
+    assert statistics.maxID('Vehicle') == 4
+    assert statistics.maxID('Pedestrian') == 7
+    assert statistics.maxID('Cyclist') == 0
+
+    image = model.root().childAt(1)
+    image.addAnnotation({'class': 'Vehicle', 'ID': 12})
+    assert statistics.maxID('Vehicle') == 12
+
+    ann = list(image.annotations())[-1]
+    ann['ID'] = 9
+    assert statistics.maxID('Vehicle') == 9
+    assert statistics.idCounts('Vehicle') == {0: 1, 1: 1, 2: 1, 3: 1, 4: 1, 9: 1}
+
+    ann.delete()
+    assert statistics.maxID('Vehicle') == 4
+    ann['ID'] = 20
+    assert statistics.maxID('Vehicle') == 4
+
+    model.root().childAt(3).deleteAllChildren()
+    assert statistics.maxID('Pedestrian', None) is None
+    model.root().deleteChild(4)
+    assert statistics.maxID('Vehicle') == 2
+
+
+def test_dirty_rows():
+    model = AnnotationModel(someFiles(10))
+    assert not model.dirty()
+    assert model.dirtyRows() == []
+
+    ann = model.root().childAt(3).childAt(0)
+    ann['x'] = 11
+    model.root().childAt(7).addAnnotation({'class': 'Vehicle', 'ID': 99})
+    assert model.dirty()
+    assert model.dirtyRows() == [3, 7]
+
+    model.setDirty(False)
+    assert model.dirtyRows() == []
+    model.root().appendFileItem({'class': 'image', 'filename': 'new.jpg', 'annotations': []})
+    assert model.dirtyRows() is None
+
+
+def test_snapshot():
+    model = AnnotationModel(iter(someFiles(10)))
+    model.root().childAt(2).childAt(0)
+    snapshot = model.root().snapshot()
+    assert snapshot == someFiles(10)
+    assert not model.root().canFetchMore()
+
+    model.root().childAt(2).childAt(0)['x'] = 99
+    assert snapshot == someFiles(10)
+    assert model.root().snapshot() == model.root().getAnnotations()
+
+
+def test_journal():
+    from sloth.annotations.container import _replayEdits
+    model = AnnotationModel(iter(someFiles(5)))
+    root = model.root()
+    root.startJournal()
+
+    image = root.childAt(2)
+    image.addAnnotation({'class': 'Pedestrian', 'ID': 3})
+    image.childAt(0)['x'] = 11
+    image.setUnlabeled(True)
+    del root.childAt(1).childAt(0)['width']
+    root.childAt(4).childAt(0).delete()
+    root.childAt(3).delete()
+
+    edits = root.takeJournal()
+    assert [edit['op'] for edit in edits] == ['insert', 'set', 'set', 'del', 'remove', 'remove']
+    assert root.journal() == []
+
+    annotations = someFiles(5)
+    _replayEdits(annotations, edits)
+    assert annotations == root.snapshot()
+
+
+def test_sharded_source(tmpdir):
+    import os
+    from sloth.annotations.container import ShardedJsonContainer
+    filename = os.path.join(str(tmpdir), "sharded.shards")
+    files = someFiles(1000)
+    files[999]['annotations'][0]['ID'] = 5000
+    ShardedJsonContainer().save(files, filename)
+
+    model = AnnotationModel(ShardedJsonContainer().iterate(filename))
+    root = model.root()
+    assert model.rowCount() == 1000
+    assert root.hasUnreadFiles()
+    assert root.unreadMaxID('Vehicle') == 5000
+
+    assert root.childAt(450)['filename'] == files[450]['filename']
+    assert root._unread == set([0, 2])
+    assert model.statistics().maxID('Vehicle') == 799
+    assert root.numFiles() == 1000
+    assert root._unread == set([0, 2])
+    # looking up a file info reads its shard, but does not create the item
+    assert root.fileInfoAt(10) is root._children[10]
+    assert root.fileInfoAt(10)['filename'] == files[10]['filename']
+    assert root._unread == set([2])
+
+    root.childAt(450).childAt(0)['ID'] = 1
+    assert model.dirtyRows() == [450]
+    assert root.snapshot() == [dict(f, annotations=[dict(f['annotations'][0], ID=1)]) if i == 450 else f
+                               for i, f in enumerate(files)]
+    assert not root.hasUnreadFiles()
+
+
+def test_statistics_fromIDCounts():
+    from sloth.annotations.cache import fileStatistics
+    files = someFiles(5)
+    statistics = AnnotationStatistics.fromIDCounts(fileStatistics(files)['id_counts'])
+    model = AnnotationModel(files, statistics=statistics)
+    assert model.statistics() is statistics
+    assert statistics.maxIDs() == AnnotationModel(files).statistics().maxIDs()
+
+    model.root().childAt(4).childAt(0).delete()
+    assert statistics.maxID('Vehicle') == 3
+
+
+def test_compact_items():
+    model = AnnotationModel(someFiles(2))
+    file_item = model.root().childAt(1)
+    ann = file_item.childAt(0)
+    row = ann.childAt(0)
+    assert not hasattr(ann, '__dict__') and not hasattr(row, '__dict__')
+    assert [ann.childAt(i).key() for i in range(ann.rowCount())] == ['ID', 'height', 'width', 'x', 'y']
+
+    # hidden keys and the keys themselves are shared between items
+    other = model.root().childAt(0).childAt(0)
+    assert ann._hidden is other._hidden is KeyValueModelItem.HIDDEN
+    assert 'filename' in file_item._hidden and 'filename' not in ann._hidden
+    key = ''.join(['hei', 'ght'])
+    ann[key] = 50
+    assert all(k is other_k for k, other_k in zip(sorted(ann, key=str), sorted(other, key=str)))
+    assert ann.getAnnotations() == {'class': 'Vehicle', 'ID': 1, 'x': 10, 'y': 20, 'width': 30, 'height': 50}
+
+
+def test_lazy_loading_out_of_order():
+    files = someFiles(50)
+    files[10]['annotations'] *= 3
+    model = AnnotationModel(files)
+    root = model.root()
+    for row in (30, 0, 49, 10):
+        root.childAt(row)
+    assert root._pending == 46 and not root._loaded
+
+    # equal annotations are separate items
+    image = root.childAt(10)
+    image.childAt(2)
+    assert image._pending == 2
+    assert len(set(id(ann) for ann in image.children())) == 3
+    assert image._loaded and image._pending == 0
+
+    assert len(root.children()) == 50
+    assert root._loaded and root._pending == 0
+    assert root.numAnnotations() == 52
+
+
+def test_bulk_insert_and_delete():
+    import random
+    from sloth.annotations.container import _replayEdits
+    model = AnnotationModel(someFiles(3))
+    root = model.root()
+    image = root.childAt(1)
+    image.addAnnotations([{'class': 'Vehicle', 'ID': i} for i in range(2, 20)])
+    root.startJournal()
+    removed = []
+    model.rowsAboutToBeRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    # one signal per contiguous range
+    image.deleteChildren([image.childAt(row) for row in (3, 4, 5, 9, 10)] + [0])
+    assert removed == [(9, 10), (3, 5), (0, 0)]
+    assert [ann['ID'] for ann in image.children()] == [2, 3, 7, 8, 9] + list(range(12, 20))
+
+    rnd = random.Random(1)
+    for i in range(100):
+        if rnd.random() < 0.5 and image.rowCount() > 0:
+            image.deleteChildren(rnd.sample(range(image.rowCount()), min(3, image.rowCount())))
+        else:
+            pos = rnd.randint(0, image.rowCount())
+            image.insertChildren(pos, [AnnotationModelItem({'class': 'Vehicle', 'ID': 100 + i})])
+        row = rnd.randrange(image.rowCount()) if image.rowCount() else 0
+        if image.rowCount():
+            assert image.childAt(row).row() == row
+    assert [ann.row() for ann in image.children()] == list(range(image.rowCount()))
+
+    annotations = someFiles(3)
+    annotations[1]['annotations'] += [{'class': 'Vehicle', 'ID': i} for i in range(2, 20)]
+    _replayEdits(annotations, root.takeJournal())
+    assert annotations == root.snapshot()
+
+
+def someCountedFiles():
+    files = someFiles(5)
+    files[3]['annotations'].append({'class': 'Pedestrian', 'ID': 7})
+    files[4]['annotations'].append({'class': 'Pedestrian'})
+    return files
+
+
+def test_annotation_counts():
+    model = AnnotationModel(someCountedFiles())
+    root = model.root()
+    statistics = model.statistics()
+    # no items are created for counting
+    assert root.numAnnotations() == 7 and statistics.numAnnotations() == 7
+    assert root.classCounts() == {'Vehicle': 5, 'Pedestrian': 2}
+    assert root.numAnnotationsAt(3) == 2
+    assert not any(isinstance(child, ModelItem) for child in root._children)
+
+    image = root.childAt(3)
+    assert image.numAnnotations() == 2
+    image.addAnnotations([{'class': 'Vehicle', 'ID': 12}, {'class': 'Cyclist', 'ID': 1}])
+    assert root.numAnnotationsAt(3) == image.numAnnotations() == 4
+    image.childAt(0)['class'] = 'Cyclist'
+    assert statistics.classCounts() == {'Vehicle': 5, 'Pedestrian': 2, 'Cyclist': 2}
+    image.deleteChildren([0, 2])
+    root.deleteChild(4)
+    assert root.numAnnotations() == 5
+    assert root.numAnnotations('Pedestrian') == 1
+    assert statistics.classCounts() == {'Vehicle': 3, 'Pedestrian': 1, 'Cyclist': 1}
+    assert root.numAnnotations() == sum(1 for _ in model.iterator(AnnotationModelItem))
+
+    # from the cache
+    from sloth.annotations.cache import fileStatistics
+    cached = fileStatistics(someCountedFiles())
+    statistics = AnnotationStatistics.fromIDCounts(cached['id_counts'], cached['class_counts'])
+    assert statistics.classCounts() == {'Vehicle': 5, 'Pedestrian': 2}
+    assert AnnotationStatistics.fromIDCounts(cached['id_counts']).numAnnotations() == 6
+
+
+def test_sharded_annotation_counts(tmpdir):
+    import os
+    from sloth.annotations.container import ShardedJsonContainer
+    filename = os.path.join(str(tmpdir), "sharded.shards")
+    files = someFiles(1000)
+    files[999]['annotations'].append({'class': 'Pedestrian', 'ID': 1})
+    ShardedJsonContainer().save(files, filename)
+
+    root = AnnotationModel(ShardedJsonContainer().iterate(filename)).root()
+    # counted from the manifest
+    assert root.numAnnotations() == 1001
+    assert root.classCounts() == {'Vehicle': 1000, 'Pedestrian': 1}
+    assert root._unread == set([0, 1, 2])
+    assert root.countsComplete()
+    root.childAt(10).childAt(0).delete()
+    assert root.numAnnotations() == 1000 and root._unread == set([1, 2])
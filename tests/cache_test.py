@@ -0,0 +1,50 @@
+import os
+from sloth.annotations.cache import *
+from sloth.annotations.container import JsonContainer
+
+
+def someAnnotations():
+    return [{'class': 'image', 'filename': 'frame%05d.jpg' % i,
+             'annotations': [{'class': 'Vehicle', 'ID': i % 3, 'x': 1.5},
+                             {'class': 'Pedestrian', 'ID': 7}][:i % 3]}
+            for i in range(10)]
+
+
+def test_fileStatistics():
+    statistics = fileStatistics(someAnnotations())
+    assert statistics['files'] == 10
+    assert statistics['annotations'] == 9
+    assert statistics['boxes_per_frame'] == [0, 1, 2, 0, 1, 2, 0, 1, 2, 0]
+    assert sorted(statistics['class_counts']) == [['Pedestrian', 3], ['Vehicle', 6]]
+    assert sorted(statistics['id_counts']) == [['Pedestrian', 7, 3], ['Vehicle', 1, 3], ['Vehicle', 2, 3]]
+
+
+def test_ModelCache(tmpdir):
+    filename = os.path.join(str(tmpdir), "anns.json")
+    JsonContainer().save(someAnnotations(), filename)
+    cache = ModelCache(os.path.join(str(tmpdir), "cache"))
+    assert cache.load(filename) is None
+
+    cache.store(filename, someAnnotations())
+    annotations, statistics = cache.load(filename)
+    assert annotations == someAnnotations()
+    assert statistics == fileStatistics(someAnnotations())
+
+    # same size and modification time, but different contents
+    st = os.stat(filename)
+    with open(filename, "r+") as f:
+        f.write(" ")
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.load(filename) is None
+
+    JsonContainer().save(someAnnotations()[1:], filename)
+    assert cache.load(filename) is None
+
+
+def test_ModelCache_rebuild(tmpdir):
+    filename = os.path.join(str(tmpdir), "anns.json")
+    JsonContainer().save(someAnnotations(), filename)
+    cache = ModelCache(os.path.join(str(tmpdir), "cache"))
+    cache.rebuild(JsonContainer(), filename)
+    assert cache._pending[filename].result()
+    assert cache.load(filename)[0] == someAnnotations()
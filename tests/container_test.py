@@ -1,3 +1,4 @@
+import pytest
 from sloth.annotations.container import *
 
 
@@ -64,3 +65,333 @@ def test_YamlContainer(tmpdir):
     filename = os.path.join(str(tmpdir), "test_YamlContainer.yaml")
     container = YamlContainer()
     common_container_test(filename, container)
+
+
+def test_MsgpackContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_MsgpackContainer.msgpack")
+    container = MsgpackContainer()
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+
+    # files are plain Msgpack arrays
+    import msgpack
+    with open(filename, "rb") as f:
+        assert msgpack.unpackb(f.read(), raw=False) == someAnnotations()
+
+    it = MsgpackContainer().iterate(filename)
+    assert next(it) == someAnnotations()[0]
+    assert list(it) == someAnnotations()[1:]
+
+
+def test_JsonContainer_iterate(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_JsonContainer_iterate.json")
+    container = JsonContainer()
+    original_anns = someAnnotations()
+    container.save(original_anns, filename)
+
+    container.clear()
+    it = container.iterate(filename)
+    assert container.filename() == filename
+    assert next(it) == original_anns[0]
+    assert list(it) == original_anns[1:]
+
+
+def test_JsonContainer_iterate_small_chunks(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_JsonContainer_chunks.json")
+    original_anns = someAnnotations() + [1, 2.5, "x", None, [3, 4]]
+    JsonContainer().save(original_anns, filename)
+
+    from sloth.annotations.container import _iterJsonList
+    with open(filename) as f:
+        assert list(_iterJsonList(f, chunk_size=3)) == original_anns
+
+
+def test_loadAll(tmpdir):
+    filenames = [os.path.join(str(tmpdir), "view%d.json" % i) for i in range(3)]
+    for i, filename in enumerate(filenames):
+        JsonContainer().save(someAnnotations()[i:], filename)
+
+    factory = AnnotationContainerFactory((('*.json', JsonContainer),))
+    for max_workers in (1, 3):
+        loaded = factory.loadAll(filenames, max_workers)
+        assert len(loaded) == 3
+        for i, (container, annotations) in enumerate(loaded):
+            assert isinstance(container, JsonContainer)
+            assert container.filename() == filenames[i]
+            assert annotations == someAnnotations()[i:]
+
+
+def test_CompactJsonContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_CompactJsonContainer.json")
+    container = CompactJsonContainer()
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+    assert '\n' not in open(filename).read().strip()
+
+
+def test_save_is_atomic(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_atomic.json")
+    container = JsonContainer()
+    container.save(someAnnotations(), filename)
+    assert os.listdir(str(tmpdir)) == ["test_atomic.json"]
+
+    # a failing serialization must leave the old file untouched
+    try:
+        container.save([object()], filename)
+    except TypeError:
+        pass
+    assert os.listdir(str(tmpdir)) == ["test_atomic.json"]
+    assert container.load(filename) == someAnnotations()
+
+
+def test_JsonJournalContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_journal.json")
+    container = JsonJournalContainer()
+    container.save(someAnnotations(), filename)
+
+    edits = [{'op': 'set', 'path': [0, 0], 'key': 'x', 'value': 42},
+             {'op': 'del', 'path': [0], 'key': 'filename'},
+             {'op': 'insert', 'path': [1], 'row': 0, 'item': {'class': 'rect', 'x': 1}},
+             {'op': 'remove', 'path': [], 'row': 2}]
+    container.appendEdits(edits[:2])
+    container.appendEdits(edits[2:])
+    assert os.path.exists(filename + ".journal")
+
+    expected = someAnnotations()
+    expected[0]['annotations'][0]['x'] = 42
+    del expected[0]['filename']
+    expected[1]['annotations'].insert(0, {'class': 'rect', 'x': 1})
+    del expected[2]
+    assert JsonJournalContainer().load(filename) == expected
+    assert list(JsonJournalContainer().iterate(filename)) == expected
+
+    # a journal with a truncated last record is replayed up to that record
+    with open(filename + ".journal", "a") as f:
+        f.write('{"op": "clear", "pa')
+    assert JsonJournalContainer().load(filename) == expected
+
+    container.compact(filename)
+    assert not os.path.exists(filename + ".journal")
+    assert JsonContainer().load(filename) == expected
+
+
+def test_JsonJournalContainer_stale_journal(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_stale.json")
+    container = JsonJournalContainer()
+    container.save(someAnnotations(), filename)
+    container.appendEdits([{'op': 'clear', 'path': [0]}])
+
+    # the annotation file is replaced behind the journal's back
+    JsonContainer().save(someAnnotations()[1:], filename)
+    assert JsonJournalContainer().load(filename) == someAnnotations()[1:]
+    assert not os.path.exists(filename + ".journal")
+
+
+def test_NpzContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_NpzContainer.npz")
+    container = NpzContainer()
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+
+
+def test_NpzContainer_roundtrip_json(tmpdir):
+    json_filename = os.path.join(str(tmpdir), "test_roundtrip.json")
+    npz_filename = os.path.join(str(tmpdir), "test_roundtrip.npz")
+    original_anns = someAnnotations()
+    original_anns[0]['annotations'][0].update({'ID': 2 ** 60, 'flag': True, 'score': 0.5,
+                                               'points': [[1, 2], [3, 4]], 'note': None})
+    original_anns[1]['annotations'].append({})
+    original_anns[2]['unlabeled'] = True
+    original_anns.append({'class': 'video', 'filename': 'a.avi',
+                          'frames': [{'num': 1, 'annotations': [{'type': 'rect', 'x': 1}]}]})
+    original_anns.append({'class': 'image', 'filename': 'b.png'})
+    JsonContainer().save(original_anns, json_filename)
+
+    NpzContainer().save(JsonContainer().load(json_filename), npz_filename)
+    loaded = NpzContainer().load(npz_filename)
+    assert loaded == original_anns
+    assert type(loaded[0]['annotations'][0]['x']) is int
+    assert type(loaded[0]['annotations'][0]['flag']) is bool
+
+    JsonContainer().save(loaded, json_filename)
+    assert JsonContainer().load(json_filename) == original_anns
+
+
+def test_NpzContainer_mmap(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_mmap.npz")
+    NpzContainer().save(someAnnotations(), filename)
+
+    from sloth.annotations.container import _mmapNpz
+    arrays = _mmapNpz(filename)
+    with np.load(filename) as npz:
+        assert sorted(arrays) == sorted(npz.files)
+        for name in npz.files:
+            assert np.array_equal(arrays[name], npz[name])
+    assert not arrays['value_0'].flags.owndata
+    assert not arrays['value_0'].flags.writeable
+
+    it = NpzContainer().iterate(filename)
+    assert next(it) == someAnnotations()[0]
+    del arrays
+
+    # the map is released with the iterator, so the file can be replaced
+    if os.path.exists('/proc/self/maps'):
+        def mapped():
+            with open('/proc/self/maps') as f:
+                return filename in f.read()
+        assert mapped()
+        it.close()
+        assert not mapped()
+    NpzContainer().save(someAnnotations()[:2], filename)
+    assert NpzContainer().load(filename) == someAnnotations()[:2]
+
+
+def test_SqliteContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_SqliteContainer.sqlite")
+    container = SqliteContainer()
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+
+    original_anns = someAnnotations() * 100
+    original_anns[0]['annotations'][0].update({'class': 'Vehicle', 'ID': 5, 'flag': None})
+    original_anns[1]['annotations'][0].update({'class': None, 'ID': '7'})
+    original_anns.append({'class': 'image', 'filename': 'b.png'})
+    container.save(original_anns, filename)
+    assert container.load(filename) == original_anns
+
+    it = SqliteContainer().iterate(filename)
+    assert next(it) == original_anns[0]
+
+
+def test_SqliteContainer_saveRows(tmpdir):
+    import sqlite3
+    filename = os.path.join(str(tmpdir), "test_saveRows.sqlite")
+    container = SqliteContainer()
+    anns = someAnnotations()
+    container.save(anns, filename)
+
+    anns[1]['annotations'][0]['x'] = 99
+    anns[2]['annotations'].append({'type': 'point', 'x': 1, 'y': 2})
+    del anns[3]['annotations'][1:]
+    anns[4]['filename'] = 'renamed.png'
+    container.saveRows(dict((row, anns[row]) for row in (1, 2, 3, 4)))
+    assert container.load(filename) == anns
+
+    conn = sqlite3.connect(filename)
+    changes = conn.total_changes
+    container.saveRows({0: anns[0], 1: anns[1]})
+    assert conn.total_changes == changes
+    conn.close()
+
+    with pytest.raises(InvalidArgumentException):
+        container.saveRows({10: anns[0]})
+
+
+def test_SqliteContainer_ids(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_ids.sqlite")
+    anns = [{'class': 'image', 'filename': '%d.png' % i,
+             'annotations': [{'class': 'Vehicle', 'ID': i}, {'class': 'Pedestrian', 'ID': 2 * i}]}
+            for i in range(10)]
+    container = SqliteContainer()
+    container.save(anns, filename)
+    assert container.maxID('Vehicle') == 9
+    assert container.maxID('Pedestrian') == 18
+    assert container.maxID('Pedestrian', first_frame=5) == 18
+    assert container.maxID('Cyclist') == 0
+
+    assert container.renameID(4, 40, 0, 4) == 1
+    assert container.renameID(4, 41) == 1
+    loaded = container.load(filename)
+    assert loaded[2]['annotations'][1]['ID'] == 40
+    assert loaded[4]['annotations'][0]['ID'] == 41
+    assert container.maxID('Pedestrian') == 40
+
+
+@pytest.mark.parametrize("ext", [".json.gz", ".json.bz2", ".json.xz", ".json.zst", ".msgpack.lz4",
+                                 ".msgpack.gz", ".pickle.gz"])
+def test_compressed_containers(tmpdir, ext):
+    if ext.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    if ext.endswith(".lz4"):
+        pytest.importorskip("lz4.frame")
+    from sloth.conf import default_config
+    filename = os.path.join(str(tmpdir), "test_compressed" + ext)
+    factory = AnnotationContainerFactory(default_config.CONTAINERS)
+    container = factory.create(filename)
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+    assert os.listdir(str(tmpdir)) == ["test_compressed" + ext]
+
+    # the file is actually compressed
+    from sloth.annotations.container import _openFile
+    with open(filename, "rb") as f:
+        assert f.read(1) not in (b"[", b"\x95")
+    with _openFile(filename, "rb") as f:
+        assert f.read(1) in (b"[", b"\x95", b"\x80")
+
+    it = factory.create(filename).iterate(filename)
+    assert next(it) == someAnnotations()[0]
+
+
+def test_compressed_containers_factory():
+    factory = AnnotationContainerFactory((('*.json', JsonContainer), ('*.npz', NpzContainer)))
+    assert isinstance(factory.create("a.json.gz"), JsonContainer)
+    with pytest.raises(ImproperlyConfigured):
+        factory.create("a.npz.gz")
+    with pytest.raises(ImproperlyConfigured):
+        factory.create("a.txt.gz")
+
+
+def test_compressed_write_error(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_error.json.gz")
+    container = JsonContainer()
+    container.save(someAnnotations(), filename)
+    with pytest.raises(TypeError):
+        container.save(someAnnotations() + [object()], filename)
+    assert container.load(filename) == someAnnotations()
+
+
+def someFrames(n):
+    return [{'class': 'image', 'filename': 'frame%05d.jpg' % i,
+             'annotations': [{'class': 'Vehicle', 'ID': i % 7, 'x': i}]}
+            for i in range(n)]
+
+
+def test_ShardedJsonContainer(tmpdir):
+    filename = os.path.join(str(tmpdir), "test_sharded.shards")
+    container = ShardedJsonContainer()
+    common_container_test(filename, container)
+    assert container.load(filename) == someAnnotations()
+
+    anns = someFrames(1000)
+    container.save(anns, filename)
+    assert sorted(os.listdir(filename + ".d")) == ["shard-00000.json", "shard-00001.json", "shard-00002.json"]
+    assert container.load(filename) == anns
+
+    source = ShardedJsonContainer().iterate(filename)
+    assert len(source) == 1000
+    assert source.numShards() == 3
+    assert source.maxIDs(2) == {'Vehicle': 6}
+    assert source.loadShard(2) == anns[800:]
+
+    # only the shard containing the modified frame is written
+    mtimes = [os.stat(os.path.join(filename + ".d", f)).st_mtime_ns for f in sorted(os.listdir(filename + ".d"))]
+    anns[450]['annotations'][0]['ID'] = 100
+    time.sleep(0.01)
+    container.saveRows({450: anns[450]})
+    new_mtimes = [os.stat(os.path.join(filename + ".d", f)).st_mtime_ns for f in sorted(os.listdir(filename + ".d"))]
+    assert new_mtimes[0] == mtimes[0] and new_mtimes[2] == mtimes[2]
+    assert new_mtimes[1] != mtimes[1]
+    assert container.load(filename) == anns
+    assert container.iterate(filename).maxIDs(1) == {'Vehicle': 100}
+
+    assert container.renameID(100, 5, 400, 800) == 1
+    assert container.renameID(3, 4, 0, 10) == 1
+    anns[450]['annotations'][0]['ID'] = 5
+    anns[3]['annotations'][0]['ID'] = 4
+    assert container.load(filename) == anns
+
+    # shrinking removes the shards which are not needed anymore
+    container.save(anns[:10], filename)
+    assert os.listdir(filename + ".d") == ["shard-00000.json"]
+    assert container.load(filename) == anns[:10]
@@ -0,0 +1,147 @@
+import os
+import threading
+import numpy as np
+from PIL import Image
+from sloth.annotations.imagecache import *
+from sloth.annotations.container import JsonContainer, AnnotationContainer
+
+
+def image(nbytes):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+
+def test_ImageCache_lru():
+    cache = ImageCache(budget_mb=3 / 1024.)  # 3 KB
+    for name in "abc":
+        cache.put(name, image(1024))
+    assert len(cache) == 3 and cache.nbytes() == 3072
+    assert cache.get("a") is not None  # a is now the most recently used
+    cache.put("d", image(1024))
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache and "d" in cache
+
+    # replacing an image updates the size
+    cache.put("a", image(2048))
+    assert cache.nbytes() == 3072
+    assert "c" not in cache
+
+    # images larger than the budget are not cached
+    cache.put("e", image(4096))
+    assert "e" not in cache and len(cache) == 2
+
+    assert cache.get("d") is not None
+    assert cache.get("e") is None
+    assert cache.statistics() == {'hits': 2, 'misses': 1, 'images': 2, 'bytes': 3072, 'budget': 3072}
+
+    cache.setBudget(1 / 1024.)
+    assert list(cache._images) == ["d"]
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 0 and cache.misses == 0
+
+
+def test_ImageCache_readonly():
+    cache = ImageCache()
+    im = image(10)
+    cache.put("a", im)
+    assert not cache.get("a").flags.writeable
+
+
+def test_ImageCache_threads():
+    cache = ImageCache(budget_mb=64 / 1024.)
+
+    def work(k):
+        for i in range(1000):
+            key = (k * i) % 100
+            if cache.get(key) is None:
+                cache.put(key, image(1024))
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(1, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.nbytes() == len(cache) * 1024 <= 64 * 1024
+    assert cache.hits + cache.misses == 4000
+
+
+def test_loadImage_cached(tmpdir, monkeypatch):
+    monkeypatch.setattr(AnnotationContainer, "image_cache", ImageCache())
+    Image.fromarray(np.full((12, 16, 3), 7, dtype=np.uint8)).save(os.path.join(str(tmpdir), "frame.png"))
+    container = JsonContainer()
+    container.setFilename(os.path.join(str(tmpdir), "cam0.json"))
+    im = container.loadImage("frame.png")
+    assert im.shape == (12, 16, 3) and im[0, 0, 0] == 7
+    assert container.image_cache.misses == 1
+
+    # the cache is shared by all containers and keyed by the full path
+    other = JsonContainer()
+    other.setFilename(os.path.join(str(tmpdir), "sub", "..", "cam1.json"))
+    assert other.loadImage("frame.png") is im
+    assert container.image_cache.hits == 1
+
+    assert container.loadImage("missing.png") is None
+
+
+class SlowContainer:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.prefetched = []
+
+    def prefetchImage(self, filename, reduce):
+        self.started.set()
+        self.release.wait(5)
+        self.prefetched.append(filename)
+        return True
+
+
+def test_ImagePrefetcher():
+    prefetcher = ImagePrefetcher(workers=1)
+    container = SlowContainer()
+    prefetcher.prefetch([(container, "a", 1), (container, "b", 1), (container, "c", 1)])
+    assert container.started.wait(5)
+
+    # new work cancels the work which has not started yet
+    prefetcher.prefetch([(container, "d", 1)])
+    container.release.set()
+    prefetcher.wait()
+    prefetcher.shutdown()
+    assert container.prefetched == ["a", "d"]
+
+
+def test_prefetchImage(tmpdir, monkeypatch):
+    monkeypatch.setattr(AnnotationContainer, "image_cache", ImageCache())
+    Image.fromarray(np.zeros((4, 4), dtype=np.uint8)).save(os.path.join(str(tmpdir), "frame.png"))
+    container = JsonContainer()
+    container.setFilename(os.path.join(str(tmpdir), "cam0.json"))
+    assert container.prefetchImage("frame.png")
+    assert not container.prefetchImage("frame.png")
+    assert container.loadImage("frame.png").shape == (4, 4)
+    assert container.image_cache.statistics()['hits'] == 1
+
+
+def test_loadImage_reduced(tmpdir, monkeypatch):
+    monkeypatch.setattr(AnnotationContainer, "image_cache", ImageCache())
+    im = (np.arange(64 * 48 * 3) % 251).astype(np.uint8).reshape((48, 64, 3))
+    Image.fromarray(im).save(os.path.join(str(tmpdir), "frame.jpg"))
+    Image.fromarray(im).save(os.path.join(str(tmpdir), "frame.png"))
+    container = JsonContainer()
+    container.setFilename(os.path.join(str(tmpdir), "cam0.json"))
+
+    # JPEGs are decoded at the reduced resolution, other images are not
+    # reduced, as they need to be decoded at full resolution anyway
+    assert container.loadImage("frame.jpg", 4).shape == (12, 16, 3)
+    assert container.loadImage("frame.png", 2).shape == (48, 64, 3)
+    assert container.isImageCached("frame.png")
+    assert container.imageSize("frame.jpg") == (64, 48)
+    assert container.prefetchImage("frame.jpg", 2)
+    assert not container.prefetchImage("frame.jpg", 4)
+    assert container.isImageCached("frame.jpg", 2)
+    assert not container.isImageCached("frame.jpg", 8)
+    assert container.canDraft("frame.jpg") and not container.canDraft("frame.png")
+
+    # once the full resolution image is loaded, it is used for all reductions
+    assert container.loadImage("frame.jpg").shape == (48, 64, 3)
+    assert container.loadImage("frame.jpg", 2).shape == (48, 64, 3)
+    assert not container.prefetchImage("frame.png", 4)
+    assert container.imageSize("missing.png") is None
@@ -0,0 +1,45 @@
+import json
+import os
+from sloth.conf import config
+from sloth.core.labeltool import LabelTool
+
+
+def someStreamedSequence(tmpdir, n_frames=500):
+    seq_dir = str(tmpdir)
+    os.makedirs(os.path.join(seq_dir, "annotations-3"))
+    for cam in ("cam0", "cam1"):
+        anns = [{'class': 'image', 'filename': '..\\%s\\frame%05d.jpg' % (cam, f),
+                 'annotations': [{'class': 'Pedestrian', 'ID': f % 50 + 1}]}
+                for f in range(n_frames)]
+        # the largest ID is in the last frame of the second camera
+        if cam == "cam1":
+            anns[-1]['annotations'].append({'class': 'Pedestrian', 'ID': 1000})
+        with open(os.path.join(seq_dir, "annotations-3", cam + ".json"), "w") as f:
+            json.dump(anns, f, indent=4)
+    seqinfo = os.path.join(seq_dir, "seqinfo.json")
+    with open(seqinfo, "w") as f:
+        json.dump({"ID": 3, "img_dir": "cam0,cam1", "img_format": "frame%05d.jpg",
+                   "start_frame": 0, "end_frame": n_frames - 1}, f)
+    return seqinfo
+
+
+def test_maxID_streaming(tmpdir, monkeypatch):
+    seqinfo = someStreamedSequence(tmpdir)
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(config, "STREAMING_LOAD", True)
+    monkeypatch.setattr(config, "MODEL_CACHE_DIR", None)
+    monkeypatch.setattr(config, "PREFETCH_WORKERS", 0)
+    monkeypatch.setattr(config, "VIEWS", config.VIEWS[:2])
+    labeltool = LabelTool()
+    labeltool.init_from_config()
+    labeltool.loadAnnotations(seqinfo, handleErrors=False)
+    roots = [model.root() for model in labeltool.modelList()]
+    assert all(root.canFetchMore() for root in roots)
+
+    # not read yet, so only a lower bound for display
+    assert labeltool.maxID('Pedestrian', queryFiles=False) < 1000
+    assert not labeltool.maxIDExact(queryFiles=False)
+
+    # IDs handed out must not collide with IDs in frames not read yet
+    assert labeltool.max_id_dict['Pedestrian'] == 1000
+    assert labeltool.maxIDExact(queryFiles=False)
@@ -0,0 +1,91 @@
+import json
+import os
+import numpy as np
+from PIL import Image
+from sloth.annotations.manifest import *
+from sloth.annotations.container import AnnotationContainer
+
+
+def someSequence(tmpdir, n_frames=6):
+    seq_dir = str(tmpdir)
+    for cam, shape in (("cam0", (60, 80, 3)), ("cam1", (30, 40, 3))):
+        os.makedirs(os.path.join(seq_dir, cam))
+        for i in range(n_frames):
+            Image.fromarray(np.zeros(shape, dtype=np.uint8)).save(os.path.join(seq_dir, cam, "frame%05d.jpg" % i))
+    seqinfo = os.path.join(seq_dir, "seqinfo.json")
+    with open(seqinfo, "w") as f:
+        json.dump({"ID": 1, "img_dir": "cam0,cam1", "img_format": "frame%05d.jpg",
+                   "start_frame": 0, "end_frame": n_frames + 1}, f)
+    return seqinfo
+
+
+def test_fromSequence(tmpdir):
+    seqinfo = someSequence(tmpdir)
+    seq_dir = str(tmpdir)
+    manifest, missing = ImageManifest.fromSequence(seqinfo)
+    assert sorted(os.path.relpath(f, seq_dir) for f in missing) == [
+        os.path.join(cam, "frame%05d.jpg" % i) for cam in ("cam0", "cam1") for i in (6, 7)]
+
+    frame = os.path.join(seq_dir, "cam1", "frame00003.jpg")
+    assert manifest.exists(frame) is True
+    assert manifest.imageSize(frame) == (40, 30)
+    assert manifest.imageSize(os.path.join(seq_dir, "cam0", "frame00000.jpg")) == (80, 60)
+    assert manifest.exists(os.path.join(seq_dir, "cam1", "frame00007.jpg")) is False
+    assert manifest.imageSize(os.path.join(seq_dir, "cam1", "frame00007.jpg")) is None
+    # folders which were not scanned are unknown
+    assert manifest.exists(seqinfo) is None
+
+    # only the first cameras are scanned
+    manifest, missing = ImageManifest.fromSequence(seqinfo, 1)
+    assert len(missing) == 2
+    assert manifest.exists(frame) is None
+
+
+def test_scanDirectory_noStat(tmpdir, monkeypatch):
+    someSequence(tmpdir, 3)
+    cam0 = os.path.join(str(tmpdir), "cam0")
+
+    def noStat(self, **kwargs):
+        raise AssertionError("stat of %s" % self.path)
+
+    # only the names are taken from the listing
+    monkeypatch.setattr(type(next(os.scandir(cam0))), "stat", noStat, raising=False)
+    assert ImageManifest().scanDirectory(cam0) == set("frame%05d.jpg" % i for i in range(3))
+
+
+def test_scanError(tmpdir, monkeypatch):
+    seqinfo = someSequence(tmpdir)
+    cam1 = os.path.join(str(tmpdir), "cam1")
+    scandir = os.scandir
+
+    def failingScandir(path):
+        if path == cam1:
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", failingScandir)
+    manifest, missing = ImageManifest.fromSequence(seqinfo)
+    # the frames of the folder which could not be scanned are unknown
+    assert all(os.path.dirname(f) != cam1 for f in missing) and len(missing) == 2
+    assert manifest.exists(os.path.join(cam1, "frame00003.jpg")) is None
+    assert manifest.exists(os.path.join(str(tmpdir), "cam0", "frame00003.jpg")) is True
+
+
+def test_loadImage(tmpdir, monkeypatch):
+    seqinfo = someSequence(tmpdir)
+    manifest, _ = ImageManifest.fromSequence(seqinfo)
+    monkeypatch.setattr(AnnotationContainer, "image_manifest", manifest)
+    monkeypatch.setattr(AnnotationContainer, "image_cache", type(AnnotationContainer.image_cache)())
+
+    def noStat(path):
+        raise AssertionError("stat of %s" % path)
+
+    container = AnnotationContainer()
+    container._filename = seqinfo
+    frame = os.path.join(str(tmpdir), "cam0", "frame00002.jpg")
+    # the manifest answers without touching the file system
+    monkeypatch.setattr(os.path, "exists", noStat)
+    assert container.imageSize(frame) == (80, 60)
+    assert container.loadImage(frame).shape == (60, 80, 3)
+    assert container.loadImage(os.path.join(str(tmpdir), "cam0", "frame00007.jpg")) is None
+    monkeypatch.undo()
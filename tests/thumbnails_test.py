@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import numpy as np
+from PIL import Image
+from sloth.annotations.thumbnails import *
+from sloth.annotations.thumbnails import _lockFile
+
+
+def someSequence(tmpdir, n_frames=10):
+    seq_dir = str(tmpdir)
+    for cam in ("cam0", "cam1"):
+        os.makedirs(os.path.join(seq_dir, cam))
+        for i in range(n_frames):
+            im = np.full((60, 80, 3), i * 10, dtype=np.uint8)
+            Image.fromarray(im).save(os.path.join(seq_dir, cam, "frame%05d.jpg" % (i + 5)))
+    seqinfo = os.path.join(seq_dir, "seqinfo.json")
+    with open(seqinfo, "w") as f:
+        json.dump({"ID": 1, "img_dir": "cam0,cam1", "img_format": "frame%05d.jpg",
+                   "start_frame": 5, "end_frame": n_frames + 4}, f)
+    return seqinfo
+
+
+def test_buildThumbnails(tmpdir):
+    seqinfo = someSequence(tmpdir)
+    start_frame, cameras = sequenceImages(seqinfo)
+    assert start_frame == 5
+    assert [os.path.basename(d) for d, _ in cameras] == ["cam0", "cam1"]
+    image_dir, image_files = cameras[0]
+    filename = thumbnailFilename(image_dir)
+
+    # an interrupted build is resumed
+    batches = []
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1, batch_size=4,
+                           cancelled=lambda: len(batches) > 0, progress=lambda *args: batches.append(args)) == 4
+    store = ThumbnailStore(filename)
+    assert len(store) == 10 and store.size() == (16, 16) and store.startFrame() == 5
+    assert store.missing() == list(range(4, 10))
+    assert store.thumbnail(5) is None
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1, batch_size=4) == 6
+
+    # thumbnails added while the store is open become visible
+    assert store.missing() == []
+    im = Image.open(io.BytesIO(store.thumbnail(7)))
+    assert im.size == (16, 12)
+    assert abs(int(np.asarray(im)[5, 5, 0]) - 70) < 5
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1) == 0
+    store.close()
+
+    # frames without image are skipped
+    os.remove(image_files[2])
+    assert buildThumbnails(filename, image_files, start_frame, (32, 32), workers=1) == 9
+    store = openThumbnails(filename, 10, start_frame, (32, 32))
+    assert store.missing() == [2]
+    store.close()
+
+    assert buildSequenceThumbnails(seqinfo, (32, 32), workers=1) == [thumbnailFilename(d) for d, _ in cameras]
+    store = ThumbnailStore(thumbnailFilename(cameras[1][0]))
+    assert store.missing() == []
+    store.close()
+
+
+def test_interruptedThumbnails(tmpdir):
+    seqinfo = someSequence(tmpdir, 4)
+    start_frame, cameras = sequenceImages(seqinfo)
+    image_dir, image_files = cameras[0]
+    filename = thumbnailFilename(image_dir)
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1) == 4
+
+    # an index entry written before its thumbnail reached the disk
+    store = ThumbnailStore(filename)
+    end = os.path.getsize(filename)
+    with open(filename, 'r+b') as f:
+        f.seek(HEADER_SIZE + 2 * ENTRY.size)
+        f.write(ENTRY.pack(end, 100))
+    assert store.missing() == [2]
+    assert store.thumbnail(2) is None and not store.hasThumbnail(2)
+    store.close()
+
+    # only one builder writes to the file
+    lock = _lockFile(filename)
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1) == 0
+    lock.close()
+    assert buildThumbnails(filename, image_files, start_frame, (16, 16), workers=1) == 1
+    store = ThumbnailStore(filename)
+    assert store.missing() == [] and store.thumbnail(2) is not None
+    store.close()
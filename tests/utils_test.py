@@ -0,0 +1,50 @@
+import gc
+import numpy as np
+import pytest
+from PyQt5.QtGui import QImage, QColor
+from sloth.utils import toQImage
+
+
+def pixel(qim, x=0, y=0):
+    return QColor.fromRgba(qim.pixel(x, y)).getRgb()
+
+
+def test_toQImage_formats():
+    rgba = np.zeros((4, 6, 4), np.uint8)
+    rgba[...] = (255, 20, 10, 128)
+    qim = toQImage(rgba)
+    assert qim.format() == QImage.Format_RGBA8888
+    assert (qim.width(), qim.height()) == (6, 4)
+    assert pixel(qim) == (255, 20, 10, 128)
+
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    assert pixel(toQImage(rgb)) == (255, 20, 10, 255)
+    # 16 bit images keep the 8 most significant bits
+    assert pixel(toQImage(rgb.astype(np.uint16) << 8 | 0xff)) == (255, 20, 10, 255)
+    # rows need not be contiguous
+    strided = rgb[:, ::2]
+    assert toQImage(strided).width() == 3 and pixel(toQImage(strided), 2, 3) == (255, 20, 10, 255)
+
+    gray = np.arange(24, dtype=np.uint8).reshape((4, 6))
+    assert pixel(toQImage(gray), 5, 1) == (11, 11, 11, 255)
+    assert pixel(toQImage(gray.astype(np.uint16) << 8), 5, 1) == (11, 11, 11, 255)
+
+    assert toQImage(None).isNull()
+    with pytest.raises(Exception):
+        toQImage(np.zeros((4, 6), np.float32))
+
+
+def test_toQImage_buffer():
+    im = np.full((4, 6, 3), 7, np.uint8)
+    qim = toQImage(im)
+    im[0, 0] = 9
+    assert pixel(qim) == (9, 9, 9, 255)
+
+    # the array is kept alive by the QImage
+    qim = toQImage(np.full((4, 6, 3), 5, np.uint8))
+    gc.collect()
+    assert pixel(qim, 5, 3) == (5, 5, 5, 255)
+
+    copied = toQImage(im, copy=True)
+    im[0, 0] = 1
+    assert pixel(copied) == (9, 9, 9, 255)